@@ -0,0 +1,264 @@
+#!/usr/bin/env python3
+
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this program.  If not, see <http://www.gnu.org/licenses/>.
+
+"""
+Deterministic generators of large input files for benchmarks.
+
+The same `count` and `seed` always produce the same text.
+"""
+
+import sys
+import math
+import random
+import argparse
+
+
+
+PAGE_WIDTH = 210
+PAGE_HEIGHT = 297
+
+KICAD_LAYERS = ("F.Cu", "B.Cu")
+
+
+
+def svg_path_d(rng):
+    """Return a path `d` attribute mixing lines, curves and arcs."""
+
+    def point():
+        return (rng.uniform(0, PAGE_WIDTH), rng.uniform(0, PAGE_HEIGHT))
+
+    def xy(p):
+        return "%0.3f,%0.3f" % p
+
+    current = point()
+    command_list = ["M " + xy(current)]
+    for _i in range(rng.randint(2, 8)):
+        command = rng.choice("LCQA")
+        if command == "L":
+            current = point()
+            command_list.append("L " + xy(current))
+        elif command == "C":
+            current = point()
+            command_list.append(
+                " ".join(["C", xy(point()), xy(point()), xy(current)]))
+        elif command == "Q":
+            current = point()
+            command_list.append(" ".join(["Q", xy(point()), xy(current)]))
+        else:
+            # Keep the end within reach of the arc's diameter.
+            radius = rng.uniform(5, 50)
+            angle = rng.uniform(0, 2 * math.pi)
+            distance = rng.uniform(0.1, 1.9) * radius
+            current = (current[0] + distance * math.cos(angle),
+                       current[1] + distance * math.sin(angle))
+            command_list.append("A %0.3f,%0.3f 0 %d %d %s" % (
+                radius, radius, rng.randint(0, 1), rng.randint(0, 1),
+                xy(current)))
+    if rng.random() < 0.3:
+        command_list.append("Z")
+    return " ".join(command_list)
+
+
+
+def svg_transform(rng):
+    kind = rng.choice(("translate", "rotate", "scale", "matrix"))
+    if kind == "translate":
+        return "translate(%0.3f,%0.3f)" % (
+            rng.uniform(-10, 10), rng.uniform(-10, 10))
+    if kind == "rotate":
+        return "rotate(%0.3f)" % rng.uniform(-10, 10)
+    if kind == "scale":
+        return "scale(%0.3f)" % rng.uniform(0.9, 1.1)
+    angle = math.radians(rng.uniform(-10, 10))
+    return "matrix(%0.6f,%0.6f,%0.6f,%0.6f,%0.3f,%0.3f)" % (
+        math.cos(angle), math.sin(angle), -math.sin(angle), math.cos(angle),
+        rng.uniform(-10, 10), rng.uniform(-10, 10))
+
+
+
+def generate_svg(count, seed=0, layers=4, depth=3):
+    """
+    Return an Inkscape SVG with `count` paths and circles spread over
+    `layers` layers, each inside `depth` nested transformed groups.
+    """
+
+    rng = random.Random(seed)
+
+    part_list = [f"""\
+<?xml version="1.0" encoding="UTF-8" standalone="no"?>
+<svg
+   xmlns="http://www.w3.org/2000/svg"
+   xmlns:inkscape="http://www.inkscape.org/namespaces/inkscape"
+   width="{PAGE_WIDTH}mm"
+   height="{PAGE_HEIGHT}mm"
+   viewBox="0 0 {PAGE_WIDTH} {PAGE_HEIGHT}"
+   version="1.1">
+"""]
+
+    for layer in range(layers):
+        part_list.append(
+            f'  <g inkscape:groupmode="layer" inkscape:label="Layer {layer}"'
+            f' transform="{svg_transform(rng)}">\n')
+        for _i in range(depth):
+            part_list.append(f'  <g transform="{svg_transform(rng)}">\n')
+
+        for i in range(count // layers + (layer < count % layers)):
+            if rng.random() < 0.1:
+                part_list.append(
+                    '    <circle cx="%0.3f" cy="%0.3f" r="%0.3f" />\n' % (
+                        rng.uniform(0, PAGE_WIDTH),
+                        rng.uniform(0, PAGE_HEIGHT),
+                        rng.uniform(1, 20)))
+            else:
+                part_list.append(
+                    f'    <path d="{svg_path_d(rng)}" '
+                    f'style="fill:none;stroke:#000000" />\n')
+
+        part_list.append("  </g>\n" * depth)
+        part_list.append("  </g>\n")
+
+    part_list.append("</svg>\n")
+    return "".join(part_list)
+
+
+
+def generate_kicad(count, seed=0, nets=8):
+    """
+    Return a KiCad board with about `count` trace segments, split
+    between `nets` nets. Each net is a set of branching random walks.
+    """
+
+    rng = random.Random(seed)
+
+    part_list = ["""\
+(kicad_pcb (version 20171130) (host pcbnew 5.0.0)
+
+  (general
+    (thickness 1.6)
+  )
+
+  (page A4)
+  (layers
+    (0 F.Cu signal)
+    (31 B.Cu signal)
+  )
+
+  (setup
+    (grid_origin 50.8 76.2)
+  )
+
+  (net 0 "")
+"""]
+    for net in range(1, nets + 1):
+        part_list.append(f'  (net {net} "Net-{net}")\n')
+    part_list.append("\n")
+
+    for net in range(1, nets + 1):
+        layer = KICAD_LAYERS[net % len(KICAD_LAYERS)]
+        point_list = []
+        for i in range(count // nets + (net - 1 < count % nets)):
+            if not point_list or rng.random() < 0.05:
+                # Start a new walk, or branch from an earlier point.
+                if point_list and rng.random() < 0.5:
+                    point_list.append(rng.choice(point_list))
+                else:
+                    point_list.append((
+                        round(rng.uniform(0, 297), 2),
+                        round(rng.uniform(0, 210), 2)))
+            start = point_list[-1]
+            angle = rng.choice(range(0, 360, 45))
+            length = rng.uniform(0.5, 5)
+            end = (
+                round(start[0] + length * math.cos(math.radians(angle)), 2),
+                round(start[1] + length * math.sin(math.radians(angle)), 2),
+            )
+            point_list.append(end)
+            part_list.append(
+                "  (segment (start %s %s) (end %s %s) (width 0.25) "
+                "(layer %s) (net %d))\n" % (start + end + (layer, net)))
+
+    part_list.append("\n)\n")
+    return "".join(part_list)
+
+
+
+def generate_obj(count, seed=0):
+    """
+    Return a Wavefront OBJ of a triangulated, jittered grid with about
+    `count` faces. Inner edges are shared by two faces.
+    """
+
+    rng = random.Random(seed)
+
+    columns = max(1, int(math.sqrt(count / 2)))
+    rows = max(1, math.ceil(count / 2 / columns))
+
+    part_list = []
+    for y in range(rows + 1):
+        for x in range(columns + 1):
+            part_list.append("v %0.4f %0.4f 0\n" % (
+                x + rng.uniform(-0.2, 0.2), y + rng.uniform(-0.2, 0.2)))
+
+    face_count = 0
+    for y in range(rows):
+        for x in range(columns):
+            a = y * (columns + 1) + x + 1
+            b = a + 1
+            c = a + columns + 1
+            d = c + 1
+            for face in ((a, b, d), (a, d, c)):
+                if face_count == count:
+                    break
+                part_list.append("f %d %d %d\n" % face)
+                face_count += 1
+
+    return "".join(part_list)
+
+
+
+GENERATORS = {
+    "svg": generate_svg,
+    "kicad": generate_kicad,
+    "obj": generate_obj,
+}
+
+
+
+def main():
+    parser = argparse.ArgumentParser(
+        description="Write a deterministic benchmark input file "
+        "to standard output.")
+    parser.add_argument(
+        "kind",
+        choices=sorted(GENERATORS),
+        help="Type of file to generate.")
+    parser.add_argument(
+        "count",
+        type=int,
+        help="Number of paths, segments or faces.")
+    parser.add_argument(
+        "--seed", "-s",
+        type=int,
+        default=0,
+        help="Random seed. Default: 0.")
+
+    args = parser.parse_args()
+
+    sys.stdout.write(GENERATORS[args.kind](args.count, seed=args.seed))
+
+
+
+if __name__ == "__main__":
+    main()
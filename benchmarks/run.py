@@ -0,0 +1,425 @@
+#!/usr/bin/env python3
+
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this program.  If not, see <http://www.gnu.org/licenses/>.
+
+"""
+Benchmark the converters and their main stages on generated inputs.
+
+Each benchmark and size tier runs in a fresh process, so that peak
+memory use is measured for that benchmark alone.
+"""
+
+import io
+import os
+import sys
+import json
+import time
+import logging
+import platform
+import argparse
+import resource
+import tempfile
+import subprocess
+from pathlib import Path
+
+BENCHMARK_PATH = Path(__file__).parent.resolve()
+
+sys.path.insert(0, str(BENCHMARK_PATH.parent))
+
+from generate import GENERATORS
+
+
+
+LOG = logging.getLogger("benchmark")
+
+RESULT_VERSION = 1
+
+# Number of paths, segments or faces in each tier.
+TIERS = {
+    "small": 1000,
+    "medium": 10000,
+    "large": 100000,
+}
+
+DEFAULT_TIERS = ("small", "medium")
+
+# Relative slow-down or memory growth reported as a regression.
+DEFAULT_THRESHOLD = 0.2
+
+GCODE_CONF = {
+    "unit": "mm",
+    "feedrate": 1000,
+    "z-safety-direction": 1,
+    "z-safety-distance": 5,
+    "z-material-thickness": 3,
+    "z-layer-depth": 1,
+}
+
+
+
+class NullWriter:
+    """Text sink that counts the characters written to it."""
+
+    def __init__(self):
+        self.count = 0
+
+
+    def write(self, text):
+        self.count += len(text)
+
+
+
+def named_input(text, name):
+    stream = io.StringIO(text)
+    stream.name = name
+    return stream
+
+
+
+def vertex_count(paths):
+    return sum(len(v) for v in paths)
+
+
+
+# Each benchmark takes the input text and returns a function that runs
+# once and returns the number of vertices it handled.
+
+def bench_svg2paths(text):
+    from geotk.svg import svg2paths
+
+    def run():
+        return vertex_count(svg2paths(named_input(text, "bench.svg")))
+    return run
+
+
+
+def bench_iter_svg_paths(text):
+    from geotk.svg import iter_svg_paths
+
+    def run():
+        return vertex_count(iter_svg_paths(named_input(text, "bench.svg")))
+    return run
+
+
+
+def bench_svg2gcode(text):
+    from geotk.svg2gcode import svg2gcode
+
+    def run():
+        svg2gcode(NullWriter(), named_input(text, "bench.svg"), GCODE_CONF)
+    return run
+
+
+
+def bench_write_paths_gcode(text):
+    from geotk.svg import svg2paths
+    from geotk.svg2gcode import write_paths_gcode
+
+    paths = svg2paths(named_input(text, "bench.svg"))
+
+    def run():
+        write_paths_gcode(NullWriter(), paths, GCODE_CONF)
+        return vertex_count(paths)
+    return run
+
+
+
+def bench_svg2obj(text):
+    from geotk.svg2obj import svg2obj
+
+    def run():
+        svg2obj(NullWriter(), named_input(text, "bench.svg"))
+    return run
+
+
+
+def bench_parse_sexp(text):
+    from geotk.kicad2svg import parse_sexp
+
+    def run():
+        parse_sexp(text)
+    return run
+
+
+
+def bench_join_segment_list(text):
+    from geotk.kicad2svg import load_board, join_segment_list
+
+    segment_list = load_board(text).segments
+
+    def run():
+        return vertex_count(join_segment_list(segment_list))
+    return run
+
+
+
+def bench_kicad2svg(text):
+    from geotk.kicad2svg import kicad2svg
+
+    def run():
+        kicad2svg(NullWriter(), named_input(text, "bench.kicad_pcb"))
+    return run
+
+
+
+def bench_remove_backtracks(text):
+    from geotk.obj2svg import read_obj_data, remove_backtracks
+
+    (_vertices, faces, offsets) = read_obj_data(text.encode("utf-8"))
+    faces = faces.tolist()
+    face_list = [faces[start:end] for start, end in zip(
+        offsets[:-1].tolist(), offsets[1:].tolist())]
+
+    def run():
+        return vertex_count(remove_backtracks(face_list))
+    return run
+
+
+
+def bench_obj2svg(text):
+    from geotk.obj2svg import obj2svg
+
+    def run():
+        obj2svg(NullWriter(), named_input(text, "bench.obj"))
+    return run
+
+
+
+BENCHMARKS = {
+    "svg2paths": ("svg", bench_svg2paths),
+    "iter_svg_paths": ("svg", bench_iter_svg_paths),
+    "write_paths_gcode": ("svg", bench_write_paths_gcode),
+    "svg2gcode": ("svg", bench_svg2gcode),
+    "svg2obj": ("svg", bench_svg2obj),
+    "parse_sexp": ("kicad", bench_parse_sexp),
+    "join_segment_list": ("kicad", bench_join_segment_list),
+    "kicad2svg": ("kicad", bench_kicad2svg),
+    "remove_backtracks": ("obj", bench_remove_backtracks),
+    "obj2svg": ("obj", bench_obj2svg),
+}
+
+
+
+def run_child(name, input_path, repeat):
+    """
+    Run one benchmark in this process and return its result dict.
+
+    Whole converters report the vertices of their input paths, counted
+    by a separate parse that is not timed.
+    """
+
+    (kind, bench) = BENCHMARKS[name]
+    text = Path(input_path).read_text(encoding="utf-8")
+    run = bench(text)
+
+    # Let the first run import modules and warm caches.
+    vertices = run()
+    if vertices is None:
+        vertices = input_vertex_count(kind, text)
+
+    time_list = []
+    for _i in range(repeat):
+        start = time.perf_counter()
+        run()
+        time_list.append(time.perf_counter() - start)
+
+    seconds = min(time_list)
+    size = len(text.encode("utf-8"))
+
+    # `ru_maxrss` is in kilobytes on Linux and bytes on macOS.
+    rss = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    if sys.platform != "darwin":
+        rss *= 1024
+
+    return {
+        "seconds": seconds,
+        "vertices": vertices,
+        "bytes": size,
+        "vertices-per-second": vertices / seconds if seconds else None,
+        "mb-per-second": size / 1e6 / seconds if seconds else None,
+        "peak-rss-mb": rss / 1e6,
+    }
+
+
+
+def input_vertex_count(kind, text):
+    if kind == "svg":
+        return bench_iter_svg_paths(text)()
+    if kind == "kicad":
+        return bench_join_segment_list(text)()
+    return bench_remove_backtracks(text)()
+
+
+
+def run_benchmarks(name_list, tier_list, repeat=3, seed=0):
+    """
+    Return a results dict for each benchmark in `name_list` at each tier
+    in `tier_list`, keyed by "{name}/{tier}".
+    """
+
+    result_dict = {}
+    with tempfile.TemporaryDirectory(prefix="geotk-benchmark-") as directory:
+        input_path = {}
+        for tier in tier_list:
+            for kind in sorted({BENCHMARKS[v][0] for v in name_list}):
+                path = os.path.join(directory, f"{tier}.{kind}")
+                with open(path, "w", encoding="utf-8") as out:
+                    out.write(GENERATORS[kind](TIERS[tier], seed=seed))
+                input_path[(tier, kind)] = path
+
+        for tier in tier_list:
+            for name in name_list:
+                key = f"{name}/{tier}"
+                LOG.info("Running %s", key)
+                process = subprocess.run([
+                    sys.executable, __file__, "--child", name,
+                    input_path[(tier, BENCHMARKS[name][0])],
+                    "--repeat", str(repeat),
+                ], stdout=subprocess.PIPE, check=True)
+                result_dict[key] = json.loads(process.stdout)
+
+    return {
+        "version": RESULT_VERSION,
+        "python": platform.python_version(),
+        "machine": platform.machine(),
+        "results": result_dict,
+    }
+
+
+
+def compare_results(results, baseline, threshold=DEFAULT_THRESHOLD):
+    """
+    Return a list of `(key, metric, ratio)` for results that are slower
+    or use more memory than `baseline` by more than `threshold`.
+    """
+
+    regression_list = []
+    for key, result in results["results"].items():
+        known = baseline["results"].get(key, None)
+        if known is None:
+            continue
+        for metric in ("seconds", "peak-rss-mb"):
+            if not known.get(metric, None):
+                continue
+            ratio = result[metric] / known[metric]
+            if ratio > 1 + threshold:
+                regression_list.append((key, metric, ratio))
+    return regression_list
+
+
+
+def format_results(results, baseline=None):
+    baseline_results = baseline["results"] if baseline else {}
+
+    line_list = ["%-28s %10s %14s %10s %10s %8s" % (
+        "Benchmark", "Seconds", "Vertices/s", "MB/s", "RSS MB", "Change")]
+    for key, result in results["results"].items():
+        change = ""
+        known = baseline_results.get(key, None)
+        if known and known.get("seconds", None):
+            change = "%+0.0f%%" % (
+                100 * (result["seconds"] / known["seconds"] - 1))
+        line_list.append("%-28s %10.4f %14.0f %10.2f %10.1f %8s" % (
+            key, result["seconds"], result["vertices-per-second"] or 0,
+            result["mb-per-second"] or 0, result["peak-rss-mb"], change))
+    return "\n".join(line_list) + "\n"
+
+
+
+def main():
+    parser = argparse.ArgumentParser(
+        description="Benchmark geotk converters on generated inputs.")
+
+    parser.add_argument(
+        "--verbose", "-v",
+        action="count", default=0,
+        help="Print verbose information for debugging.")
+    parser.add_argument(
+        "--benchmark", "-b",
+        action="append",
+        choices=sorted(BENCHMARKS),
+        help="Benchmark to run. May be repeated. Default: all.")
+    parser.add_argument(
+        "--tier", "-t",
+        action="append",
+        choices=list(TIERS),
+        help="Size tier to run. May be repeated. "
+        f"Default: {', '.join(DEFAULT_TIERS)}.")
+    parser.add_argument(
+        "--repeat", "-r",
+        type=int, default=3,
+        help="Number of timed runs. The fastest is reported. Default: 3.")
+    parser.add_argument(
+        "--seed", "-s",
+        type=int, default=0,
+        help="Random seed for generated inputs. Default: 0.")
+    parser.add_argument(
+        "--baseline",
+        metavar="JSON",
+        help="Compare with results saved by `--save` and exit with "
+        "status 1 on regressions.")
+    parser.add_argument(
+        "--threshold",
+        type=float, default=DEFAULT_THRESHOLD,
+        help="Relative increase in time or memory reported as a "
+        f"regression. Default: {DEFAULT_THRESHOLD}.")
+    parser.add_argument(
+        "--save",
+        metavar="JSON",
+        help="Save results to this file.")
+    parser.add_argument(
+        "--child",
+        nargs=2,
+        metavar=("BENCHMARK", "INPUT"),
+        help=argparse.SUPPRESS)
+
+    args = parser.parse_args()
+
+    logging.basicConfig(
+        level=logging.INFO if args.verbose else logging.WARNING,
+        format="%(message)s")
+
+    if args.child:
+        json.dump(run_child(*args.child, repeat=args.repeat), sys.stdout)
+        return
+
+    results = run_benchmarks(
+        args.benchmark or list(BENCHMARKS),
+        args.tier or list(DEFAULT_TIERS),
+        repeat=args.repeat, seed=args.seed)
+
+    baseline = None
+    if args.baseline:
+        with open(args.baseline) as fp:
+            baseline = json.load(fp)
+
+    sys.stdout.write(format_results(results, baseline))
+
+    if args.save:
+        with open(args.save, "w") as out:
+            json.dump(results, out, indent=2)
+            out.write("\n")
+
+    if baseline:
+        regression_list = compare_results(results, baseline, args.threshold)
+        for key, metric, ratio in regression_list:
+            LOG.error("Regression in %s %s: %0.2f times baseline.",
+                      key, metric, ratio)
+        if regression_list:
+            sys.exit(1)
+
+
+
+if __name__ == "__main__":
+    main()
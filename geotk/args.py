@@ -16,6 +16,7 @@
 import argparse
 
 from geotk.version import __version__
+from geotk.profiling import PROFILE_FORMATS
 
 
 
@@ -31,6 +32,24 @@ def base_parser():
         action="count", default=0,
         help="Suppress warnings.")
 
+    parser.add_argument(
+        "--profile",
+        action="store_true",
+        help="Print the time spent in each conversion stage, counts of "
+        "elements, segments and vertices, and peak memory use to "
+        "standard error. Also enabled by setting “$GEOTK_PROFILE”.")
+    parser.add_argument(
+        "--profile-format",
+        action="store",
+        choices=PROFILE_FORMATS,
+        help="Format of the `--profile` report, which it implies. "
+        "Default: “text”, or the value of “$GEOTK_PROFILE”.")
+    parser.add_argument(
+        "--cprofile",
+        action="store",
+        metavar="FILE",
+        help="Write `cProfile` statistics to FILE. Implies `--profile`.")
+
     parser.add_argument(
         "--version", "-V",
         action="version",
@@ -58,5 +77,43 @@ def svg_input_parser():
         action="store",
         type=float,
         help="Target segment distance for linearization of curved paths.")
+    parser.add_argument(
+        "--simplify", "-S",
+        action="store",
+        type=float,
+        metavar="TOLERANCE",
+        help="Remove vertices that deviate less than TOLERANCE "
+        "from a simplified path, in mm.")
+    parser.add_argument(
+        "--jobs", "-j",
+        action="store",
+        type=int,
+        help="Number of processes for linearizing paths. "
+        "Use 0 for one per CPU.")
+    parser.add_argument(
+        "--cache", "-C",
+        action="store_true",
+        help="Reuse converted paths from earlier runs with the same SVG "
+        "and options.")
+    parser.add_argument(
+        "--cache-dir",
+        action="store",
+        metavar="DIR",
+        help="Directory for `--cache`, which it implies. "
+        "Default: “$GEOTK_CACHE_DIR” or “~/.cache/geotk”.")
+
+    return parser
+
+
+
+def output_parser():
+    parser = argparse.ArgumentParser(add_help=False)
+
+    parser.add_argument(
+        "--precision", "-p",
+        action="store",
+        type=int,
+        help="Round output coordinates to this many decimal places. "
+        "By default coordinates are written in full.")
 
     return parser
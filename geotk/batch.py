@@ -0,0 +1,397 @@
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this program.  If not, see <http://www.gnu.org/licenses/>.
+
+"""
+Convert many SVG files to G-code in one process.
+
+A job is a dict of:
+
+input:           Path to the SVG file.
+output:          Path to write G-code to. Without it, the G-code is
+                 returned in the result's "gcode" value.
+conf:            Path to a configuration file in JSON format, or the
+                 configuration itself.
+distance-step, angle-step, minimum-step, simplify, order:
+                 As for `svg2gcode`. Optional.
+summary:         If true, return the `summarize_moves` dict of the job
+                 in the result's "summary" value.
+id:              Optional. Copied to the result.
+
+Each job returns a result dict with "input", "output", "seconds" and
+"error", which is `None` on success.
+"""
+
+import io
+import os
+import json
+import time
+import glob
+import stat
+import shutil
+import logging
+import threading
+from tempfile import NamedTemporaryFile
+
+from geotk.svg2gcode import svg2gcode, resolve_conf
+
+
+
+LOG = logging.getLogger("batch")
+
+JOB_OPTIONS = {
+    "distance-step": "step_dist",
+    "angle-step": "step_angle",
+    "minimum-step": "step_min",
+    "simplify": "simplify",
+    "order": "order",
+}
+
+JOB_KEYS = {"input", "output", "conf", "summary", "id"} | set(JOB_OPTIONS)
+
+
+
+class JobError(Exception):
+    pass
+
+
+
+class ConfCache:
+    """
+    Validated `GcodeConf` configurations loaded from JSON files, keyed by
+    path and kept until the file changes.
+    """
+
+    def __init__(self):
+        self.confs = {}
+
+
+    def get(self, conf):
+        """
+        Return the `GcodeConf` for `conf`, a path or a configuration
+        dict.
+        """
+
+        if isinstance(conf, dict):
+            return resolve_conf(conf)
+        if not isinstance(conf, str):
+            raise JobError("Job `conf` must be a path or an object.")
+
+        mtime = os.stat(conf).st_mtime_ns
+        (cached_mtime, value) = self.confs.get(conf, (None, None))
+        if cached_mtime != mtime:
+            with open(conf) as conf_file:
+                value = resolve_conf(json.load(conf_file))
+            self.confs[conf] = (mtime, value)
+        return value
+
+
+
+def glob_base(pattern):
+    """Return the leading directories of `pattern` without wildcards."""
+
+    base = pattern
+    while glob.has_magic(base):
+        base = os.path.dirname(base)
+    return base
+
+
+
+def glob_jobs(patterns, output_dir=None):
+    """
+    Yield a job for each SVG file matching any of `patterns`, writing
+    G-code beside each SVG file with a `.gcode` suffix.
+
+    With `output_dir`, G-code is written there instead, in the same
+    directories relative to the part of the pattern before any
+    wildcards, which are created as needed. Files that would be written
+    to the same path are yielded as error strings.
+    """
+
+    inputs = set()
+    outputs = {}
+    for pattern in patterns:
+        base = glob_base(pattern)
+        for path in sorted(glob.glob(pattern, recursive=True)):
+            if path in inputs:
+                continue
+            inputs.add(path)
+
+            (stem, _suffix) = os.path.splitext(os.path.basename(path))
+            directory = os.path.dirname(path)
+            if output_dir is not None:
+                directory = os.path.normpath(os.path.join(
+                    output_dir, os.path.relpath(directory, base or ".")))
+            output = os.path.join(directory, stem + ".gcode")
+
+            if output in outputs:
+                yield f"{path}: Output {output} is also written by " \
+                    f"{outputs[output]}."
+                continue
+            outputs[output] = path
+
+            if output_dir is not None:
+                os.makedirs(directory, exist_ok=True)
+            yield {
+                "input": path,
+                "output": output,
+            }
+
+
+
+def read_jobs(lines):
+    """
+    Yield jobs from lines of JSON, skipping blank lines. Lines that are
+    not valid jobs are yielded as error strings.
+    """
+
+    for n, line in enumerate(lines, 1):
+        if not line.strip():
+            continue
+        try:
+            job = json.loads(line)
+        except ValueError as e:
+            yield f"Line {n}: {e}"
+            continue
+        if not isinstance(job, dict):
+            yield f"Line {n}: Job must be an object."
+            continue
+        yield job
+
+
+
+def run_job(job, conf_cache, defaults=None, cache=None):
+    """
+    Convert one job and return its result dict. Errors are returned in
+    the result rather than raised.
+
+    defaults:  Dict of job values, eg. "conf", used where `job` does not
+               set them.
+    cache:     `PathCache` for converted paths.
+    """
+
+    start = time.perf_counter()
+    result = {
+        "input": None,
+        "output": None,
+    }
+
+    try:
+        if isinstance(job, str):
+            raise JobError(job)
+
+        job = {**(defaults or {}), **job}
+        if "id" in job:
+            result["id"] = job["id"]
+        result["input"] = job.get("input", None)
+        result["output"] = job.get("output", None)
+
+        unknown = set(job) - JOB_KEYS
+        if unknown:
+            raise JobError("Unknown job keys: %s." % ", ".join(
+                sorted(unknown)))
+        for key in ("input", "conf"):
+            if key not in job:
+                raise JobError(f"Job has no `{key}`.")
+
+        conf = conf_cache.get(job["conf"])
+        kwargs = {JOB_OPTIONS[k]: v for k, v in job.items()
+                  if k in JOB_OPTIONS}
+
+        def convert(out):
+            with open(job["input"], "r", encoding="utf-8") as svg:
+                return svg2gcode(
+                    out, svg, conf=conf,
+                    summary=bool(job.get("summary", False)), cache=cache,
+                    **kwargs
+                )
+
+        output = job.get("output", None)
+        if output:
+            with NamedTemporaryFile(
+                    "w", encoding="utf-8", delete=False,
+                    dir=os.path.dirname(output) or None) as out:
+                os.fchmod(out.fileno(), os.stat(job["input"]).st_mode)
+                try:
+                    summary = convert(out)
+                except BaseException:
+                    out.close()
+                    os.remove(out.name)
+                    raise
+            shutil.move(out.name, output)
+        else:
+            out = io.StringIO()
+            summary = convert(out)
+            result["gcode"] = out.getvalue()
+
+        if summary:
+            result["summary"] = summary
+
+        result["error"] = None
+    except Exception as e:
+        LOG.error("%s: %s", result["input"] or "Job", e)
+        result["error"] = str(e) or type(e).__name__
+
+    result["seconds"] = time.perf_counter() - start
+    return result
+
+
+
+# Per-process state of pool workers.
+_worker = {}
+
+
+
+def init_worker(defaults, cache):
+    _worker["conf_cache"] = ConfCache()
+    _worker["defaults"] = defaults
+    _worker["cache"] = cache
+
+
+
+def run_worker_job(job):
+    return run_job(job, _worker["conf_cache"],
+                   defaults=_worker["defaults"], cache=_worker["cache"])
+
+
+
+class BatchRunner:
+    """
+    Run jobs in this process, or in a pool of `jobs` worker processes
+    that stay warm between batches. Use as a context manager to close
+    the pool.
+
+    Each process keeps its own `ConfCache`, so a configuration file is
+    read once per process however many jobs use it.
+
+    `run` may be called from several threads. Without a pool, jobs then
+    run one at a time.
+    """
+
+    def __init__(self, jobs=None, defaults=None, cache=None):
+        if jobs is not None and jobs < 1:
+            jobs = os.cpu_count()
+
+        self.defaults = defaults
+        self.cache = cache
+        self.conf_cache = ConfCache()
+        self.lock = threading.Lock()
+        self.pool = None
+        if jobs and jobs > 1:
+            import multiprocessing
+
+            LOG.info("Starting %d worker processes.", jobs)
+            self.pool = multiprocessing.Pool(
+                jobs, initializer=init_worker, initargs=(defaults, cache))
+
+
+    def __enter__(self):
+        return self
+
+
+    def __exit__(self, *exc):
+        self.close()
+        return False
+
+
+    def close(self):
+        if self.pool is not None:
+            self.pool.close()
+            self.pool.join()
+            self.pool = None
+
+
+    def run(self, job):
+        """Return the result of one job."""
+
+        if self.pool is not None:
+            return self.pool.apply(run_worker_job, (job, ))
+        # The conf cache and profiling stages are not thread-safe.
+        with self.lock:
+            return run_job(job, self.conf_cache,
+                           defaults=self.defaults, cache=self.cache)
+
+
+    def run_all(self, jobs):
+        """
+        Yield the results of an iterable of jobs in the same order.
+        Jobs are read from `jobs` as workers become free.
+        """
+
+        if self.pool is not None:
+            yield from self.pool.imap(run_worker_job, jobs)
+            return
+        for job in jobs:
+            yield self.run(job)
+
+
+
+def write_results(out, results):
+    """
+    Write each result as a line of JSON, flushing after each. Return the
+    number of failed jobs.
+    """
+
+    failed = 0
+    for result in results:
+        if result["error"] is not None:
+            failed += 1
+        out.write(json.dumps(result) + "\n")
+        out.flush()
+    return failed
+
+
+
+def serve_socket(path, runner):
+    """
+    Accept connections on a Unix socket at `path` until interrupted.
+
+    Each connection sends jobs as lines of JSON and receives a line of
+    JSON with the result of each, in order. Connections are served in
+    threads calling `runner.run`.
+
+    A socket left at `path` by an earlier server is replaced. Raise
+    `FileExistsError` if anything else is there.
+    """
+
+    import socketserver
+
+    class Handler(socketserver.StreamRequestHandler):
+        def handle(self):
+            out = io.TextIOWrapper(self.wfile, encoding="utf-8")
+            lines = io.TextIOWrapper(self.rfile, encoding="utf-8")
+            write_results(out, (
+                runner.run(v) for v in read_jobs(lines)))
+            out.detach()
+            lines.detach()
+
+    class Server(socketserver.ThreadingMixIn,
+                 socketserver.UnixStreamServer):
+        daemon_threads = True
+
+    try:
+        mode = os.stat(path).st_mode
+    except FileNotFoundError:
+        pass
+    else:
+        if not stat.S_ISSOCK(mode):
+            raise FileExistsError(f"{path} exists and is not a socket.")
+        os.remove(path)
+
+    with Server(path, Handler) as server:
+        LOG.info("Listening on %s", path)
+        try:
+            server.serve_forever()
+        except KeyboardInterrupt:
+            pass
+        finally:
+            os.remove(path)
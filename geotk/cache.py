@@ -0,0 +1,193 @@
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this program.  If not, see <http://www.gnu.org/licenses/>.
+
+import io
+import os
+import json
+import hashlib
+import logging
+import zipfile
+from tempfile import NamedTemporaryFile
+
+import numpy as np
+
+from geotk import profiling
+from geotk.geometry import PathSet
+
+
+
+LOG = logging.getLogger("cache")
+
+# Change when the cached geometry would differ for the same input.
+CACHE_VERSION = 1
+
+DEFAULT_CACHE_SIZE = 256 << 20
+
+HASH_CHUNK_SIZE = 1 << 20
+
+
+
+def default_cache_dir():
+    """
+    Return `$GEOTK_CACHE_DIR`, or `geotk` in the user's cache directory.
+    """
+
+    directory = os.environ.get("GEOTK_CACHE_DIR", None)
+    if directory:
+        return directory
+
+    base = (os.environ.get("XDG_CACHE_HOME", None) or
+            os.path.join(os.path.expanduser("~"), ".cache"))
+    return os.path.join(base, "geotk")
+
+
+
+def content_digest(in_file):
+    """
+    Return `(digest, in_file)` with the SHA-256 hex digest of the rest
+    of `in_file`.
+
+    The returned file is `in_file` moved back to where it was, or a copy
+    in memory if it cannot seek.
+    """
+
+    digest = hashlib.sha256()
+
+    def update(chunk):
+        digest.update(chunk.encode("utf-8") if isinstance(chunk, str)
+                      else chunk)
+
+    if in_file.seekable():
+        position = in_file.tell()
+        while True:
+            chunk = in_file.read(HASH_CHUNK_SIZE)
+            if not chunk:
+                break
+            update(chunk)
+        in_file.seek(position)
+        return digest.hexdigest(), in_file
+
+    data = in_file.read()
+    update(data)
+    copy = io.StringIO(data) if isinstance(data, str) else io.BytesIO(data)
+    copy.name = getattr(in_file, "name", None)
+    return digest.hexdigest(), copy
+
+
+
+class PathCache:
+    """
+    Store `PathSet` objects as `.npz` files in `directory`, keyed by
+    input content and conversion options.
+
+    Files are evicted least recently used first once their total size
+    exceeds `max_size` bytes. Loading a file counts as using it.
+    """
+
+    def __init__(self, directory=None, max_size=None):
+        self.directory = directory or default_cache_dir()
+        self.max_size = DEFAULT_CACHE_SIZE if max_size is None else max_size
+
+
+    def key(self, digest, options):
+        """Return the key for content `digest` converted with `options`."""
+
+        text = json.dumps({
+            "version": CACHE_VERSION,
+            "digest": digest,
+            "options": options,
+        }, sort_keys=True)
+        return hashlib.sha256(text.encode("utf-8")).hexdigest()
+
+
+    def path(self, key):
+        return os.path.join(self.directory, key + ".npz")
+
+
+    def load(self, key):
+        """Return the cached `PathSet` for `key`, or `None`."""
+
+        path = self.path(key)
+        try:
+            with profiling.stage("cache"), \
+                    np.load(path, allow_pickle=False) as data:
+                pathset = PathSet(
+                    data["coords"], data["offsets"],
+                    layer=[tuple(v) for v in json.loads(str(data["layer"]))],
+                    net=json.loads(str(data["net"])),
+                )
+        except FileNotFoundError:
+            profiling.count("cache-misses")
+            return None
+        except (OSError, ValueError, KeyError, zipfile.BadZipFile) as e:
+            LOG.warning("Ignoring unreadable cache file %s: %s", path, e)
+            profiling.count("cache-misses")
+            return None
+
+        try:
+            os.utime(path)
+        except OSError:
+            pass
+
+        LOG.debug("Loaded %s from cache.", key)
+        profiling.count("cache-hits")
+        return pathset
+
+
+    def store(self, key, pathset):
+        """Save `pathset` under `key`, then evict old files if needed."""
+
+        os.makedirs(self.directory, exist_ok=True)
+
+        # Write to a temporary file first so that readers never see a
+        # partial file.
+        with profiling.stage("cache"):
+            with NamedTemporaryFile(
+                    "wb", dir=self.directory, suffix=".tmp",
+                    delete=False) as out:
+                np.savez(
+                    out,
+                    coords=pathset.coords,
+                    offsets=pathset.offsets,
+                    layer=np.array(
+                        json.dumps([list(v) for v in pathset.layer])),
+                    net=np.array(json.dumps(pathset.net)),
+                )
+            os.replace(out.name, self.path(key))
+
+            LOG.debug("Stored %s in cache.", key)
+            self.evict()
+
+
+    def evict(self):
+        """Remove least recently used files until within `max_size`."""
+
+        entry_list = []
+        for entry in os.scandir(self.directory):
+            if not entry.name.endswith(".npz"):
+                continue
+            try:
+                stat = entry.stat()
+            except FileNotFoundError:
+                continue
+            entry_list.append((stat.st_mtime, stat.st_size, entry.path))
+
+        total = sum(v[1] for v in entry_list)
+        for _mtime, size, path in sorted(entry_list):
+            if total <= self.max_size:
+                break
+            try:
+                os.remove(path)
+            except FileNotFoundError:
+                pass
+            total -= size
@@ -12,25 +12,19 @@
 # along with this program.  If not, see <http://www.gnu.org/licenses/>.
 
 import re
+import logging
 
 
 
-def color_log(log):
-    color_red = '\033[91m'
-    color_green = '\033[92m'
-    color_yellow = '\033[93m'
-    color_blue = '\033[94m'
-    color_end = '\033[0m'
+ORDER_METHODS = ("document", "nearest", "2opt")
 
-    level_colors = (
-        ("error", color_red),
-        ("warning", color_yellow),
-        ("info", color_green),
-        ("debug", color_blue),
-    )
 
-    safe = None
-    color = None
+
+def message_args(msg, args):
+    """
+    Return `(msg, args)` for a log call, allowing `print`-style calls
+    such as `LOG.info("Value", value)` as well as format strings.
+    """
 
     def xor(a, b):
         return bool(a) ^ bool(b)
@@ -40,32 +34,41 @@ def color_log(log):
             return "%0.3f"
         return "%s"
 
-    def message_args(args):
-        if not args:
-            return "", []
-        if (
-                not isinstance(args[0], str) or
-                xor(len(args) > 1, "%" in args[0])
-        ):
-            return " ".join([_format(v) for v in args]), args
-        return args[0], args[1:]
-
-    def _message(args, color):
-        message, args = message_args(args)
-        return "".join([color, message, color_end])
-
-    def _args(args):
-        args = message_args(args)[1]
-        return args
-
-    def build_lambda(safe, color):
-        return lambda *args, **kwargs: getattr(log, safe)(
-            _message(args, color), *_args(args), **kwargs)
-
-    for (level, color) in level_colors:
-        safe = "%s_" % level
-        setattr(log, safe, getattr(log, level))
-        setattr(log, level, build_lambda(safe, color))
+    if isinstance(args, dict):
+        return msg, args
+
+    args = (msg, ) + tuple(args or ())
+    if (
+            not isinstance(args[0], str) or
+            xor(len(args) > 1, "%" in args[0])
+    ):
+        return " ".join([_format(v) for v in args]), args
+    return args[0], args[1:]
+
+
+
+class ColorFormatter(logging.Formatter):
+    """
+    Format log messages in a terminal color for their level.
+    """
+
+    COLOR_END = "\033[0m"
+    LEVEL_COLORS = {
+        logging.ERROR: "\033[91m",
+        logging.WARNING: "\033[93m",
+        logging.INFO: "\033[92m",
+        logging.DEBUG: "\033[94m",
+    }
+
+
+    def format(self, record):
+        record = logging.makeLogRecord(record.__dict__)
+        (record.msg, record.args) = message_args(record.msg, record.args)
+        text = super().format(record)
+        color = self.LEVEL_COLORS.get(record.levelno, None)
+        if color is None:
+            return text
+        return "".join([color, text, self.COLOR_END])
 
 
 
@@ -0,0 +1,354 @@
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this program.  If not, see <http://www.gnu.org/licenses/>.
+
+import re
+
+import numpy as np
+
+
+
+# Move kinds.
+RAPID = 0
+LINEAR = 1
+ARC_CW = 2
+ARC_CCW = 3
+
+REGEX = {
+    "comment": re.compile(r"\([^)]*\)|;.*"),
+    "word": re.compile(
+        r"([A-Za-z])\s*([-+]?(?:\d+\.?\d*|\.\d+)(?:[eE][-+]?\d+)?)"),
+}
+
+
+
+class ParseError(Exception):
+    pass
+
+
+
+class Moves:
+    """
+    A sequence of machine moves stored as arrays.
+
+    points:   (M + 1, 3) float64 array of positions. Move `i` runs from
+              `points[i]` to `points[i + 1]`. Unknown coordinates are NaN
+              and do not count towards move lengths.
+    kind:     (M, ) int array of `RAPID`, `LINEAR`, `ARC_CW` or `ARC_CCW`.
+    feed:     (M, ) float64 array of the programmed feedrate, in units
+              per minute. Ignored for rapid moves.
+    center:   (M, 2) float64 array of arc centers, NaN for other moves.
+    """
+
+    def __init__(self, points, kind, feed, center=None):
+        self.points = np.asarray(points, dtype=float).reshape(-1, 3)
+        self.kind = np.asarray(kind, dtype=np.int64)
+        self.feed = np.asarray(feed, dtype=float)
+        if center is None:
+            center = np.full((len(self.kind), 2), np.nan)
+        self.center = np.asarray(center, dtype=float).reshape(-1, 2)
+
+        assert len(self.points) == len(self.kind) + 1
+        assert len(self.feed) == len(self.kind)
+        assert len(self.center) == len(self.kind)
+
+
+    def __len__(self):
+        return len(self.kind)
+
+
+    @property
+    def delta(self):
+        """Change of each coordinate, zero where it is unknown."""
+
+        delta = np.diff(self.points, axis=0)
+        delta[np.isnan(delta)] = 0
+        return delta
+
+
+    def arc_sweep(self):
+        """Signed angle swept by each arc, zero for other moves."""
+
+        sweep = np.zeros(len(self))
+        arc = self.kind >= ARC_CW
+        if not np.any(arc):
+            return sweep
+
+        center = self.center[arc]
+        start = self.points[:-1][arc, :2] - center
+        end = self.points[1:][arc, :2] - center
+        angle = (np.arctan2(end[:, 1], end[:, 0]) -
+                 np.arctan2(start[:, 1], start[:, 0]))
+
+        # Counter-clockwise sweeps are in (0, 2 pi], clockwise in
+        # [-2 pi, 0). Equal ends make a full circle.
+        ccw = self.kind[arc] == ARC_CCW
+        angle = np.where(ccw, np.mod(angle, 2 * np.pi),
+                         -np.mod(-angle, 2 * np.pi))
+        angle[angle == 0] = np.where(ccw, 2 * np.pi, -2 * np.pi)[angle == 0]
+        sweep[arc] = angle
+        return sweep
+
+
+    def lengths(self):
+        """Distance traveled by each move."""
+
+        delta = self.delta
+        length = np.sqrt(np.sum(delta * delta, axis=1))
+
+        arc = self.kind >= ARC_CW
+        if np.any(arc):
+            radius = np.hypot(*(self.points[:-1][arc, :2] -
+                                self.center[arc]).T)
+            arc_length = radius * np.abs(self.arc_sweep()[arc])
+            length[arc] = np.hypot(arc_length, delta[arc, 2])
+
+        return length
+
+
+    def tangents(self):
+        """
+        Return unit direction vectors `(start, end)` of each move, zero
+        for moves without length.
+        """
+
+        delta = self.delta
+        norm = np.sqrt(np.sum(delta * delta, axis=1))[:, None]
+        with np.errstate(invalid="ignore", divide="ignore"):
+            chord = np.where(norm > 0, delta / norm, 0)
+        (start, end) = (chord.copy(), chord.copy())
+
+        arc = self.kind >= ARC_CW
+        if np.any(arc):
+            sign = np.where(self.kind[arc] == ARC_CCW, 1, -1)[:, None]
+            for tangent, points in (
+                    (start, self.points[:-1]), (end, self.points[1:])):
+                radial = points[arc, :2] - self.center[arc]
+                radius = np.hypot(*radial.T)[:, None]
+                direction = np.zeros((len(radial), 3))
+                with np.errstate(invalid="ignore", divide="ignore"):
+                    direction[:, 0] = -radial[:, 1] / radius[:, 0]
+                    direction[:, 1] = radial[:, 0] / radius[:, 0]
+                tangent[arc] = np.nan_to_num(direction * sign)
+
+        return start, end
+
+
+
+def move_times(length, speed, acceleration=None, junction_speed=None):
+    """
+    Return the time of each move in seconds.
+
+    length:          Move lengths.
+    speed:           Cruising speed of each move, in units per second.
+    acceleration:    Acceleration in units per second squared, or `None`
+                     to ignore acceleration.
+    junction_speed:  Speeds at the M + 1 move boundaries, including the
+                     start and end of the whole sequence. Defaults to
+                     stopping between every move.
+
+    Each move accelerates from its entry speed to its cruising speed and
+    decelerates to its exit speed, or reaches only a lower peak speed if
+    it is too short.
+    """
+
+    length = np.asarray(length, dtype=float)
+    speed = np.asarray(speed, dtype=float)
+
+    with np.errstate(invalid="ignore", divide="ignore"):
+        cruise = np.where(length > 0, length / speed, 0)
+    if not acceleration:
+        return cruise
+
+    if junction_speed is None:
+        junction_speed = np.zeros(len(length) + 1)
+    v_in = np.minimum(junction_speed[:-1], speed)
+    v_out = np.minimum(junction_speed[1:], speed)
+    a = acceleration
+
+    ramp = (2 * speed * speed - v_in * v_in - v_out * v_out) / (2 * a)
+    full = (speed - v_in) / a + (speed - v_out) / a + (length - ramp) / speed
+
+    # Too short to reach cruising speed.
+    peak = np.sqrt(np.maximum(
+        (2 * a * length + v_in * v_in + v_out * v_out) / 2, 0))
+    short = (peak - v_in) / a + (peak - v_out) / a
+
+    # Too short to even change between entry and exit speed.
+    with np.errstate(invalid="ignore", divide="ignore"):
+        coast = 2 * length / (v_in + v_out)
+    short = np.where(peak < np.maximum(v_in, v_out), coast, short)
+
+    time = np.where(ramp <= length, full, short)
+    return np.where(length > 0, time, 0)
+
+
+
+def summarize_moves(moves, conf=None):
+    """
+    Return a dict summarizing `moves`:
+
+    cut-length:    Distance traveled by feed moves.
+    rapid-length:  Distance traveled by rapid moves.
+    plunges:       Number of vertical feed moves towards the work.
+    retracts:      Number of vertical moves away from the work.
+    time:          Estimated time in seconds.
+
+    `conf` may set "rapid-feedrate" and "z-feedrate", the largest rates
+    of rapid moves and of movement along Z, in units per minute, and
+    "acceleration" in units per second squared. Without them rapid moves
+    run at the largest programmed feedrate and acceleration is ignored.
+    "z-safety-direction" gives the direction away from the work.
+
+    Moves slow down at corners, in proportion to the cosine of the angle
+    between them, and stop at sharper corners and changes between rapid
+    and feed moves. This approximates the planners of machine
+    controllers, which are more complex.
+    """
+
+    conf = conf or {}
+    z_dir = conf.get("z-safety-direction", None) or 1
+
+    length = moves.lengths()
+    delta = moves.delta
+    rapid = moves.kind == RAPID
+
+    feed = moves.feed
+    rapid_feed = conf.get("rapid-feedrate", None)
+    if rapid_feed is None:
+        rapid_feed = np.max(feed[~rapid], initial=0) or 1
+    speed = np.where(rapid, rapid_feed, feed) / 60
+
+    z_feed = conf.get("z-feedrate", None)
+    if z_feed is not None:
+        with np.errstate(invalid="ignore", divide="ignore"):
+            z_limit = z_feed / 60 * length / np.abs(delta[:, 2])
+        speed = np.minimum(speed, z_limit)
+
+    # Skip moves that go nowhere, so they do not stop motion.
+    keep = length > 0
+    length = length[keep]
+    speed = speed[keep]
+    (start, end) = moves.tangents()
+    (start, end) = (start[keep], end[keep])
+    rapid_keep = rapid[keep]
+
+    junction_speed = np.zeros(len(length) + 1)
+    if len(length) > 1:
+        cosine = np.sum(end[:-1] * start[1:], axis=1)
+        same = rapid_keep[:-1] == rapid_keep[1:]
+        junction_speed[1:-1] = np.where(
+            same, np.minimum(speed[:-1], speed[1:]) * np.maximum(cosine, 0),
+            0)
+
+    time = move_times(length, speed, conf.get("acceleration", None),
+                      junction_speed)
+
+    vertical = (delta[:, 0] == 0) & (delta[:, 1] == 0) & (delta[:, 2] != 0)
+    toward = delta[:, 2] * z_dir < 0
+
+    return {
+        "cut-length": float(length[~rapid_keep].sum()),
+        "rapid-length": float(length[rapid_keep].sum()),
+        "plunges": int(np.sum(vertical & toward & ~rapid)),
+        "retracts": int(np.sum(vertical & ~toward)),
+        "time": float(time.sum()),
+    }
+
+
+
+def parse_gcode(text):
+    """
+    Return the `Moves` of G-code text.
+
+    Supports `G0`-`G3` moves with `X`, `Y`, `Z`, `I`, `J` and `F`, and
+    absolute or relative coordinates with `G90` and `G91`. Position is
+    unknown until the first move along each axis.
+
+    Raise `ParseError` for text that is not a letter followed by a
+    number.
+    """
+
+    position = [np.nan, np.nan, np.nan]
+    point_list = [tuple(position)]
+    kind_list = []
+    feed_list = []
+    center_list = []
+
+    mode = None
+    feed = 0
+    relative = False
+
+    for n, line in enumerate(text.splitlines(), 1):
+        line = REGEX["comment"].sub("", line).strip()
+        if not line or line.startswith("%"):
+            continue
+
+        if REGEX["word"].sub("", line).strip():
+            raise ParseError(f"Line {n}: Cannot parse `{line}`.")
+
+        words = {}
+        for letter, value in REGEX["word"].findall(line):
+            letter = letter.upper()
+            value = float(value)
+            if letter == "G":
+                if value in (0, 1, 2, 3):
+                    mode = int(value)
+                elif value == 90:
+                    relative = False
+                elif value == 91:
+                    relative = True
+                continue
+            words[letter] = value
+
+        if "F" in words:
+            feed = words["F"]
+
+        axes = [words.get(v, None) for v in "XYZ"]
+        if all(v is None for v in axes):
+            continue
+        if mode is None:
+            raise ParseError(f"Line {n}: Coordinates without a move.")
+
+        start = list(position)
+        for i, value in enumerate(axes):
+            if value is None:
+                continue
+            if relative:
+                position[i] = (0 if np.isnan(position[i])
+                               else position[i]) + value
+            else:
+                position[i] = value
+
+        center = (np.nan, np.nan)
+        if mode >= 2:
+            if "I" not in words and "J" not in words:
+                raise ParseError(f"Line {n}: Arc without `I` or `J`.")
+            center = (start[0] + words.get("I", 0),
+                      start[1] + words.get("J", 0))
+
+        point_list.append(tuple(position))
+        kind_list.append(mode)
+        feed_list.append(feed)
+        center_list.append(center)
+
+    return Moves(point_list, kind_list, feed_list,
+                 center_list or np.empty((0, 2)))
+
+
+
+def analyze_gcode(gcode_file, conf=None):
+    """
+    Return `summarize_moves` of a G-code file object.
+    """
+
+    return summarize_moves(parse_gcode(gcode_file.read()), conf)
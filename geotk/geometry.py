@@ -0,0 +1,498 @@
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this program.  If not, see <http://www.gnu.org/licenses/>.
+
+import math
+from collections import defaultdict
+
+import numpy as np
+
+
+
+# Largest turn of a single segment in an arc from `arc_windows`, in radians.
+ARC_MAX_SEGMENT_ANGLE = math.pi / 6
+
+
+
+class PathSet:
+    """
+    A list of 2D polylines stored in one flat coordinate buffer.
+
+    coords:   (N, 2) float64 array of all vertices.
+    offsets:  (P + 1, ) int64 array. Polyline `i` is
+              `coords[offsets[i]:offsets[i + 1]]`.
+    layer:    Tuple of enclosing layer labels for each polyline,
+              outermost first. Empty for polylines in the document root.
+    net:      Net number for each polyline, or `None`.
+
+    Indexing and iteration return views into `coords`, so polylines can
+    be handed between stages without copying.
+    """
+
+    def __init__(self, coords=None, offsets=None, layer=None, net=None):
+        if coords is None:
+            coords = np.empty((0, 2))
+        if offsets is None:
+            offsets = np.zeros(1, dtype=np.int64)
+
+        self.coords = np.ascontiguousarray(coords, dtype=float).reshape(-1, 2)
+        self.offsets = np.asarray(offsets, dtype=np.int64)
+
+        count = len(self.offsets) - 1
+        self.layer = list(layer) if layer is not None else [()] * count
+        self.net = list(net) if net is not None else [None] * count
+
+        assert self.offsets[-1] == len(self.coords)
+        assert len(self.layer) == count
+        assert len(self.net) == count
+
+
+    @classmethod
+    def from_paths(cls, paths, layer=None, net=None):
+        """
+        Build from an iterable of polylines.
+
+        `layer` and `net` may be single values applied to every polyline
+        or sequences with one value per polyline.
+        """
+
+        array_list = [np.asarray(path, dtype=float).reshape(-1, 2)
+                      for path in paths]
+        count = len(array_list)
+
+        offsets = np.zeros(count + 1, dtype=np.int64)
+        offsets[1:] = np.cumsum([len(v) for v in array_list])
+        coords = (np.concatenate(array_list) if array_list
+                  else np.empty((0, 2)))
+
+        if layer is None or isinstance(layer, tuple):
+            layer = [layer or ()] * count
+        if net is None or isinstance(net, (int, str)):
+            net = [net] * count
+
+        return cls(coords, offsets, layer=layer, net=net)
+
+
+    @classmethod
+    def concatenate(cls, pathset_list):
+        pathset_list = list(pathset_list)
+        if not pathset_list:
+            return cls()
+
+        offsets = [np.zeros(1, dtype=np.int64)]
+        base = 0
+        for pathset in pathset_list:
+            offsets.append(pathset.offsets[1:] + base)
+            base += len(pathset.coords)
+
+        return cls(
+            np.concatenate([v.coords for v in pathset_list]),
+            np.concatenate(offsets),
+            layer=[l for v in pathset_list for l in v.layer],
+            net=[n for v in pathset_list for n in v.net],
+        )
+
+
+    def __len__(self):
+        return len(self.offsets) - 1
+
+
+    def __getitem__(self, index):
+        if index < 0:
+            index += len(self)
+        if not 0 <= index < len(self):
+            raise IndexError(index)
+        return self.coords[self.offsets[index]:self.offsets[index + 1]]
+
+
+    def __iter__(self):
+        for start, end in zip(self.offsets[:-1].tolist(),
+                              self.offsets[1:].tolist()):
+            yield self.coords[start:end]
+
+
+    def __repr__(self):
+        return (f"<PathSet {len(self)} paths, "
+                f"{self.vertex_count} vertices>")
+
+
+    @property
+    def vertex_count(self):
+        return len(self.coords)
+
+
+    @property
+    def lengths(self):
+        """Number of vertices in each polyline."""
+
+        return np.diff(self.offsets)
+
+
+    @property
+    def closed(self):
+        """Boolean array, true for polylines whose ends coincide."""
+
+        lengths = self.lengths
+        closed = lengths > 2
+        first = self.coords[self.offsets[:-1][closed]]
+        last = self.coords[self.offsets[1:][closed] - 1]
+        closed[closed] = np.all(first == last, axis=1)
+        return closed
+
+
+    def select(self, mask):
+        """Return a new `PathSet` with the polylines where `mask` is true."""
+
+        index = np.nonzero(mask)[0].tolist()
+        return PathSet.from_paths(
+            [self[i] for i in index],
+            layer=[self.layer[i] for i in index],
+            net=[self.net[i] for i in index],
+        )
+
+
+    def group(self, key):
+        """
+        Return a dict of polyline lists keyed by `key(layer, net)`,
+        in order of first appearance.
+        """
+
+        groups = defaultdict(list)
+        for path, layer, net in zip(self, self.layer, self.net):
+            groups[key(layer, net)].append(path)
+        return dict(groups)
+
+
+    def tolist(self):
+        """Return polylines as lists of `(x, y)` tuples of Python floats."""
+
+        coords = self.coords.tolist()
+        return [
+            [tuple(v) for v in coords[start:end]]
+            for start, end in zip(self.offsets[:-1].tolist(),
+                                  self.offsets[1:].tolist())
+        ]
+
+
+
+class PointIndex:
+    """
+    Assign indices to 2D points, merging points within `tolerance`
+    of an earlier point.
+
+    Points are hashed on a grid of `tolerance` sized cells, so only the
+    neighbouring cells need to be searched. With no tolerance only
+    identical points are merged.
+
+    points:  The first point seen for each index.
+    """
+
+    def __init__(self, tolerance=None):
+        self.tolerance = tolerance or None
+        self.points = []
+        self._index = {}
+
+
+    def __len__(self):
+        return len(self.points)
+
+
+    def add(self, point):
+        """Return the index of `point`, adding it if it is new."""
+
+        (x, y) = point[0], point[1]
+
+        if self.tolerance is None:
+            key = (x, y)
+            index = self._index.get(key, None)
+            if index is None:
+                index = self._index[key] = len(self.points)
+                self.points.append(point)
+            return index
+
+        tolerance = self.tolerance
+        cx = math.floor(x / tolerance)
+        cy = math.floor(y / tolerance)
+        tolerance_sq = tolerance * tolerance
+
+        for dx in (-1, 0, 1):
+            for dy in (-1, 0, 1):
+                for index in self._index.get((cx + dx, cy + dy), ()):
+                    other = self.points[index]
+                    if ((other[0] - x) ** 2 +
+                            (other[1] - y) ** 2) <= tolerance_sq:
+                        return index
+
+        index = len(self.points)
+        self.points.append(point)
+        self._index.setdefault((cx, cy), []).append(index)
+        return index
+
+
+
+def simplify_mask(coords, offsets, tolerance):
+    """
+    Return a boolean mask of the vertices of each polyline to keep after
+    Douglas-Peucker simplification with `tolerance`.
+
+    `coords` and `offsets` are as in `PathSet`. All polylines are refined
+    together, one level of the recursion at a time: every run between
+    kept vertices keeps its farthest vertex if that is further than
+    `tolerance` from the segment joining the run's ends. Closed
+    polylines start with the vertex farthest from their start kept too.
+    """
+
+    count = len(coords)
+    keep = np.zeros(count, dtype=bool)
+    if not count:
+        return keep
+
+    lengths = np.diff(offsets)
+    keep[offsets[:-1][lengths > 0]] = True
+    keep[offsets[1:][lengths > 0] - 1] = True
+
+    index = np.arange(count)
+    x = coords[:, 0]
+    y = coords[:, 1]
+
+    # Also keep the vertex farthest from the start of closed polylines,
+    # so they cannot collapse to a point.
+    closed = PathSet(coords, offsets).closed
+    if np.any(closed):
+        start = np.repeat(offsets[:-1], lengths)
+        distance = np.hypot(x - x[start], y - y[start])
+        nonempty = np.flatnonzero(lengths > 0)
+        run_max = np.maximum.reduceat(distance, offsets[:-1][nonempty])
+        path = np.repeat(np.arange(len(lengths)), lengths)
+        farthest = np.zeros(len(lengths))
+        farthest[nonempty] = run_max
+        candidate = np.flatnonzero(
+            (distance == farthest[path]) & closed[path])
+        (_unused, first) = np.unique(path[candidate], return_index=True)
+        keep[candidate[first]] = True
+
+    while True:
+        # Kept vertices on either side of each vertex.
+        left = np.maximum.accumulate(np.where(keep, index, 0))
+        right = np.minimum.accumulate(
+            np.where(keep, index, count - 1)[::-1])[::-1]
+
+        dx = x[right] - x[left]
+        dy = y[right] - y[left]
+        px = x - x[left]
+        py = y - y[left]
+        length_sq = dx * dx + dy * dy
+        with np.errstate(invalid="ignore", divide="ignore"):
+            t = np.clip((px * dx + py * dy) / length_sq, 0, 1)
+        t[length_sq == 0] = 0
+        distance = np.hypot(px - t * dx, py - t * dy)
+        distance[keep] = -1
+
+        # Farthest vertex of each run, first one on ties.
+        start = np.flatnonzero(keep)
+        run_max = np.maximum.reduceat(distance, start)
+        run = np.cumsum(keep) - 1
+        candidate = np.flatnonzero(
+            (distance == run_max[run]) & (distance > tolerance))
+        if not len(candidate):
+            break
+        (_unused, first) = np.unique(run[candidate], return_index=True)
+        keep[candidate[first]] = True
+
+    return keep
+
+
+
+def simplify_paths(path_list, tolerance):
+    """Return polylines simplified with `simplify_mask`."""
+
+    pathset = PathSet.from_paths(path_list)
+    keep = simplify_mask(pathset.coords, pathset.offsets, tolerance)
+    kept_offsets = np.concatenate([[0], np.cumsum(keep)])[pathset.offsets]
+    coords = pathset.coords[keep]
+    return [
+        coords[start:end]
+        for start, end in zip(kept_offsets[:-1].tolist(),
+                              kept_offsets[1:].tolist())
+    ]
+
+
+
+def circumcircle(p1, p2, p3):
+    """
+    Return the centers of the circles through arrays of points `p1`,
+    `p2` and `p3`, shaped (..., 2). Centers of collinear points are NaN.
+    """
+
+    (ax, ay) = np.moveaxis(p1, -1, 0)
+    (bx, by) = np.moveaxis(p2, -1, 0)
+    (cx, cy) = np.moveaxis(p3, -1, 0)
+    d = 2 * (ax * (by - cy) + bx * (cy - ay) + cx * (ay - by))
+    d = np.where(d == 0, np.nan, d)
+    a2 = ax * ax + ay * ay
+    b2 = bx * bx + by * by
+    c2 = cx * cx + cy * cy
+    return np.stack([
+        (a2 * (by - cy) + b2 * (cy - ay) + c2 * (ay - by)) / d,
+        (a2 * (cx - bx) + b2 * (ax - cx) + c2 * (bx - ax)) / d,
+    ], axis=-1)
+
+
+
+def arc_windows(windows, tolerance):
+    """
+    Test an array of runs of points, shaped (W, count, 2), for circular
+    arcs passing within `tolerance` of every point.
+
+    Runs that are straight within `tolerance`, or that have a segment
+    turning through more than `ARC_MAX_SEGMENT_ANGLE`, are not arcs.
+
+    The center is fitted by least squares on the perpendicular bisector
+    of each run's first and last points, so that both are exactly the
+    same distance from it, as G-code controllers require. Closed runs
+    use the circle through three of their points.
+
+    Return arrays `(is_arc, center, clockwise)`.
+    """
+
+    count = windows.shape[1]
+    first = windows[:, 0]
+    chord = windows[:, -1] - first
+    middle = first + chord / 2
+    normal = np.stack([-chord[:, 1], chord[:, 0]], axis=-1)
+
+    # The distance `s` along `normal` from `middle` minimizing the sum of
+    # `(|p - c| ** 2 - |first - c| ** 2) ** 2` is linear in the points.
+    local = windows - middle[:, None, :]
+    a = 2 * np.sum((local - local[:, :1]) * normal[:, None, :], axis=2)
+    b = np.sum(local * local, axis=2) - np.sum(
+        local[:, :1] * local[:, :1], axis=2)
+    with np.errstate(invalid="ignore", divide="ignore"):
+        along = np.sum(a * b, axis=1) / np.sum(a * a, axis=1)
+    center = middle + along[:, None] * normal
+
+    closed = np.all(chord == 0, axis=1)
+    if np.any(closed):
+        center[closed] = circumcircle(
+            windows[closed, 0], windows[closed, count // 3],
+            windows[closed, 2 * count // 3])
+
+    radial = windows - center[:, None, :]
+    distance = np.hypot(radial[..., 0], radial[..., 1])
+    radius = distance[:, :1]
+    with np.errstate(invalid="ignore"):
+        is_arc = np.max(np.abs(distance - radius), axis=1) <= tolerance
+
+    cross = (radial[:, :-1, 0] * radial[:, 1:, 1] -
+             radial[:, :-1, 1] * radial[:, 1:, 0])
+    dot = np.sum(radial[:, :-1] * radial[:, 1:], axis=2)
+    sweep = np.arctan2(cross, dot)
+    clockwise = sweep[:, 0] < 0
+    with np.errstate(invalid="ignore"):
+        is_arc &= np.all(sweep > 0, axis=1) | np.all(sweep < 0, axis=1)
+        # Polygons with vertices on a circle are not arcs.
+        is_arc &= np.max(np.abs(sweep), axis=1) <= ARC_MAX_SEGMENT_ANGLE
+        is_arc &= np.abs(np.sum(sweep, axis=1)) <= 2 * np.pi + 1e-9
+
+    start = windows[:, :1]
+    direction = windows[:, -1:] - start
+    length = np.hypot(direction[..., 0], direction[..., 1])
+    offset = windows - start
+    deviation = np.abs(offset[..., 0] * direction[..., 1] -
+                       offset[..., 1] * direction[..., 0])
+    with np.errstate(invalid="ignore"):
+        straight = np.max(deviation, axis=1) <= tolerance * length[:, 0]
+    is_arc &= (length[:, 0] == 0) | ~straight
+
+    return is_arc, center, clockwise
+
+
+
+def arc_through(points, tolerance):
+    """
+    Return `(center, clockwise)` of a circular arc through `points` as
+    tested by `arc_windows`, or `None`.
+    """
+
+    (is_arc, center, clockwise) = arc_windows(points[None], tolerance)
+    if not is_arc[0]:
+        return None
+    return center[0], bool(clockwise[0])
+
+
+
+def fit_arcs(points, tolerance, min_points=4):
+    """
+    Cover polyline `points` with straight and circular moves.
+
+    Return a list of `(end, center, clockwise)`, each moving from the end
+    of the previous move to `points[end]`. `center` is `None` for straight
+    moves. Arcs span at least `min_points` vertices, which all lie within
+    `tolerance` of them.
+    """
+
+    points = np.asarray(points, dtype=float)
+    count = len(points)
+    moves = []
+
+    # Test the shortest arc from every vertex at once, so that runs
+    # without arcs can be skipped quickly.
+    if count >= min_points:
+        windows = np.lib.stride_tricks.sliding_window_view(
+            points, min_points, axis=0).transpose(0, 2, 1)
+        candidate = arc_windows(windows, tolerance)[0].tolist()
+    else:
+        candidate = []
+
+    i = 0
+    while i < count - 1:
+        if i >= len(candidate) or not candidate[i]:
+            moves.append((i + 1, None, None))
+            i += 1
+            continue
+
+        best = None
+
+        # Grow the arc exponentially, then bisect to its longest extent.
+        step = min_points - 1
+        good = None
+        while True:
+            j = min(i + step, count - 1)
+            if j - i + 1 < min_points:
+                break
+            arc = arc_through(points[i:j + 1], tolerance)
+            if arc is None:
+                break
+            (good, best) = (j, arc)
+            if j == count - 1:
+                break
+            step *= 2
+
+        if good is not None and good < count - 1:
+            (low, high) = (good, min(i + step, count - 1))
+            while high - low > 1:
+                middle = (low + high) // 2
+                arc = arc_through(points[i:middle + 1], tolerance)
+                if arc is None:
+                    high = middle
+                else:
+                    (low, best) = (middle, arc)
+            good = low
+
+        if good is None:
+            moves.append((i + 1, None, None))
+            i += 1
+        else:
+            moves.append((good, best[0], best[1]))
+            i = good
+
+    return moves
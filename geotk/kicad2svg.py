@@ -13,10 +13,13 @@
 
 import re
 import logging
-from collections import defaultdict
+from collections import defaultdict, deque, OrderedDict
 
+from geotk import profiling
 from geotk.svg import header as svg_header, footer as svg_footer, \
     style, linear_path_d
+from geotk.geometry import PathSet, PointIndex
+from geotk.output import ChunkWriter
 
 
 
@@ -25,9 +28,16 @@ LOG = logging.getLogger("kicad2svg")
 DEFAULT_WIDTH = 0.25
 
 REGEX = {
-    "trace": re.compile(r"^\s*\(segment "),
-    "origin": re.compile(r"^\s*\(grid_origin (.*) (.*)\)$"),
-    "page": re.compile(r"^\s*\(page (.*)\)$"),
+    "int": re.compile(r"^-?[1-9][0-9]*$"),
+    "float": re.compile(r"^-?(?:[0-9]+\.[0-9]*|[0-9]*\.[0-9]+)$"),
+    "sexp_token": re.compile(r"""\s*(?:
+(?P<open>\()
+|(?P<close>\))
+|"(?P<string>(?:[^"\\]|\\.)*)"
+|(?P<atom>[^\s()"]+)
+|(?P<error>\S)
+)""", re.X | re.S),
+    "sexp_escape": re.compile(r"\\(.)", re.S),
 }
 
 
@@ -38,7 +48,17 @@ class ParseError(Exception):
 
 
 def write_svg(out, layer_net_path, width, height, unit,
-              grid_spacing=None, grid_origin=None):
+              grid_spacing=None, grid_origin=None, precision=None):
+    """
+    `layer_net_path` is either a `PathSet` with layer and net metadata
+    or a dict of path lists by net by layer name.
+    """
+
+    if isinstance(layer_net_path, PathSet):
+        layer_net_path = pathset_layer_net_path(layer_net_path)
+
+    out = ChunkWriter(out)
+
     (ox, oy) = grid_origin or (None, None)
     out.write(svg_header(
         width, height, unit, grid_spacing=grid_spacing, grid_x=ox, grid_y=oy))
@@ -72,7 +92,7 @@ def write_svg(out, layer_net_path, width, height, unit,
         >
 """)
             for path in path_list:
-                d = linear_path_d(path)
+                d = linear_path_d(path, precision=precision)
                 if d:
                     out.write(f"""\
       <path style="{path_style}" d="{d}"/>
@@ -86,88 +106,83 @@ def write_svg(out, layer_net_path, width, height, unit,
 """)
 
     out.write(svg_footer())
+    out.flush()
 
 
 
-def parse_sexp(text):
-    """\
-Parse an S-expression and return a nested structure.
-Currently does not handle string quoting.
-"""
-
-    def parse(text):
-        "Return value and number of characters parsed"
+def sexp_atom(token):
+    """Convert an unquoted S-expression token to `int` or `float` if numeric."""
 
-        if not text:
-            return (None, 0)
+    if token == "0":
+        return 0
+    if REGEX["int"].match(token):
+        return int(token)
+    if REGEX["float"].match(token):
+        return float(token)
+    return token
 
-        c = 0
-        out = []
-        token = ""
 
-        def add_token(new_token):
-            nonlocal out, token
 
-            if new_token:
-                if isinstance(new_token, str):
-                    if new_token == "0":
-                        new_token = 0
-                    elif re.match(r"^-?[1-9][0-9]*$", new_token):
-                        new_token = int(new_token)
-                    elif re.match(r"^-?[0-9]+\.[0-9]*$", new_token):
-                        new_token = float(new_token)
-                    elif re.match(r"^-?[0-9]*\.[0-9]+$", new_token):
-                        new_token = float(new_token)
+def sexp_collapse(item_list):
+    """Return lists of one item as that item, and other lists as tuples."""
 
-                out.append(new_token)
+    if len(item_list) == 1:
+        return item_list[0]
+    return tuple(item_list)
 
-            token = ""
 
 
-        while c < len(text):
-            char = text[c]
-
-            if char in " ":
-                add_token(token)
-                c += 1
-                continue
-
-            if char == "(":
-                add_token(token)
-                (token, n) = parse(text[c + 1:])
-                add_token(token)
-                c += 1 + n
-                continue
-
-            if char == ")":
-                add_token(token)
-                c += 1
-                break
-
-            token += char
-            c += 1
-
-        if out and isinstance(out, list) and len(out) == 1:
-            out = out[0]
+def parse_sexp(text):
+    """\
+Parse an S-expression and return a nested structure.
 
-        if isinstance(out, list):
-            out = tuple(out)
+Lists become tuples, except that lists of one item are replaced by that
+item and empty lists are omitted. Unquoted numeric tokens are converted
+to `int` or `float`. Quoted strings are returned unescaped and never
+converted.
 
-        return out, c
+Reads the text in a single pass, so whole documents parse in linear time.
+Raise `ParseError` on unbalanced parentheses or unterminated strings.
+"""
 
-    (out, length) = parse(text)
+    stack = [[]]
+
+    for match in REGEX["sexp_token"].finditer(text):
+        kind = match.lastgroup
+
+        if kind == "open":
+            stack.append([])
+        elif kind == "close":
+            if len(stack) == 1:
+                raise ParseError(
+                    f"Unexpected `)` at position {match.start(kind)}.")
+            value = sexp_collapse(stack.pop())
+            if value != ():
+                stack[-1].append(value)
+        elif kind == "atom":
+            stack[-1].append(sexp_atom(match.group(kind)))
+        elif kind == "string":
+            stack[-1].append(
+                REGEX["sexp_escape"].sub(r"\1", match.group(kind)))
+        else:
+            raise ParseError(
+                f"Unexpected `{match.group(kind)}` "
+                f"at position {match.start(kind)}.")
 
-    assert length == len(text)
+    if len(stack) != 1:
+        raise ParseError(f"{len(stack) - 1} unclosed parentheses.")
 
-    return out
+    return sexp_collapse(stack[0])
 
 
 
 def parse_trace(text):
     sexp = parse_sexp(text)
     trace = {}
-    for part in sexp:
-        if part == "segment":
+    for part in sexp[1:]:
+        if not isinstance(part, tuple):
+            # Bare flags like `locked`.
+            trace[part] = True
             continue
 
         part = list(part)
@@ -185,156 +200,319 @@ def parse_trace(text):
 
 
 
-def join_segment_list(segment_list):
-    nodes = defaultdict(list)
+def join_segment_list(segment_list, tolerance=None):
+    """
+    Chain segment dicts into polylines of points.
+
+    Paths start from the earliest remaining point, grow at their end while
+    possible and then at their start, and stop when they close. Segments
+    at each point are taken in document order.
+
+    If `tolerance` is given, endpoints closer than this are joined.
+    Segments that become zero-length are then dropped.
+    """
 
     segment_list = [(v["start"], v["end"]) for v in segment_list]
-    for s, segment in enumerate(segment_list):
-        nodes[segment[0]].append(s)
-        nodes[segment[1]].append(s)
 
-    nodes = dict(nodes)
+    if tolerance:
+        snap_index = PointIndex(tolerance)
+        snapped = [snap_index.points[snap_index.add(p)]
+                   for segment in segment_list for p in segment]
+        segment_list = [
+            segment for segment in zip(snapped[0::2], snapped[1::2])
+            if segment[0] != segment[1]
+        ]
+
+    # Segment index to count by point, in insertion order. A count of two
+    # means a zero-length segment.
+    nodes = defaultdict(OrderedDict)
+    for s, segment in enumerate(segment_list):
+        for point in segment:
+            nodes[point][s] = nodes[point].get(s, 0) + 1
+    point_order = list(nodes)
+    point_index = 0
+
+    def take_segment(point):
+        """Remove the first segment at `point` and return its other end."""
+
+        segment_dict = nodes[point]
+        (s, count) = segment_dict.popitem(last=False)
+        if not segment_dict:
+            del nodes[point]
+        if count > 1:
+            return point
+
+        segment = segment_list[s]
+        onward_point = segment[1] if segment[0] == point else segment[0]
+
+        onward_dict = nodes[onward_point]
+        onward_dict[s] -= 1
+        if not onward_dict[s]:
+            del onward_dict[s]
+        if not onward_dict:
+            del nodes[onward_point]
+        return onward_point
 
     path_list = []
-    path = None
     while nodes:
-        if not path:
-            path = [next(iter(nodes))]
+        while point_order[point_index] not in nodes:
+            point_index += 1
+        path = deque([point_order[point_index]])
 
-        start = path[0]
-        end = path[-1]
+        while True:
+            if len(path) > 1 and path[0] == path[-1]:
+                break
+            if path[-1] in nodes:
+                path.append(take_segment(path[-1]))
+            elif path[0] in nodes:
+                path.appendleft(take_segment(path[0]))
+            else:
+                break
 
-        if len(path) > 1 and start == end:
-            path_list.append(path)
-            path = None
-            continue
+        path_list.append(list(path))
 
-        if end in nodes:
-            end_segment_index = nodes[end].pop(0)
-            if not nodes[end]:
-                del nodes[end]
+    return path_list
 
-            segment = segment_list[end_segment_index]
-            if segment[0] == end:
-                onward_point = segment[1]
-            else:
-                assert segment[1] == end
-                onward_point = segment[0]
-            assert onward_point in nodes
-
-            nodes[onward_point].remove(end_segment_index)
-            if not nodes[onward_point]:
-                del nodes[onward_point]
-            path.append(onward_point)
-            continue
 
-        if start in nodes:
-            start_segment_index = nodes[start].pop(0)
-            if not nodes[start]:
-                del nodes[start]
 
-            segment = segment_list[start_segment_index]
-            if segment[0] == start:
-                onward_point = segment[1]
-            else:
-                assert segment[1] == start
-                onward_point = segment[0]
-            assert onward_point in nodes
+class Board:
+    """
+    Indexed contents of a KiCad PCB document, built in a single pass.
+
+    text:         The document text.
+    nodes:        List of `(name, start, end)` for each top-level node,
+                  where `text[start:end]` is its S-expression.
+    page:         The parsed `page` node, or `None`.
+    grid_origin:  `[x, y]` of the grid origin, or `None`.
+    layer_net_segment:
+                  Segment dicts from `parse_trace` by net number by
+                  layer name, in document order.
+    segment_nodes:
+                  Indices into `nodes` of each segment, in the same order
+                  as `segments`.
+    segments:     Segment dicts in document order.
+    """
 
-            nodes[onward_point].remove(start_segment_index)
-            if not nodes[onward_point]:
-                del nodes[onward_point]
+    page_sizes = {
+        "A4": (297, 210),
+    }
 
-            path.insert(0, onward_point)
-            continue
+    def __init__(self, text):
+        self.text = text
+        self.nodes = []
+        self.page = None
+        self.grid_origin = None
+        self.segments = []
+        self.segment_nodes = []
+        self.layer_net_segment = defaultdict(lambda: defaultdict(list))
+
+        for name, start, end in iter_sexp_children(text):
+            n = len(self.nodes)
+            self.nodes.append((name, start, end))
+
+            if name == "segment":
+                trace = parse_trace(text[start:end])
+                self.segments.append(trace)
+                self.segment_nodes.append(n)
+                self.layer_net_segment[trace["layer"]][trace["net"]].append(
+                    trace)
+            elif name == "page":
+                self.page = parse_sexp(text[start:end])
+            elif name == "setup":
+                for part in parse_sexp(text[start:end])[1:]:
+                    if isinstance(part, tuple) and part[0] == "grid_origin":
+                        self.grid_origin = [float(v) for v in part[1:3]]
+
+
+    def page_size(self):
+        """
+        Return `(width, height)` of the page in mm.
+        Raise `ParseError` if it cannot be determined.
+        """
+
+        if self.page is None:
+            raise ParseError("No page information found.")
+
+        page = self.page[1:] if isinstance(self.page, tuple) else ()
+        if len(page) == 1 and page[0] in self.page_sizes:
+            return self.page_sizes[page[0]]
+
+        if len(page) == 3 and page[0] == "User":
+            return [float(v) for v in page[1:]]
+
+        page_text = " ".join(str(v) for v in page)
+        raise ParseError(
+            f"Could not determine page size for page `{page_text}`.")
+
+
+    def node_line_span(self, n):
+        """
+        Return the span of node `n` extended to cover its whole line(s)
+        if nothing else shares them.
+        """
+
+        (_name, start, end) = self.nodes[n]
+        text = self.text
+
+        line_start = text.rfind("\n", 0, start) + 1
+        if not text[line_start:start].strip():
+            start = line_start
+
+        line_end = text.find("\n", end)
+        if line_end == -1:
+            line_end = len(text)
+        else:
+            line_end += 1
+        if not text[end:line_end].strip():
+            end = line_end
 
-        path_list.append(path)
-        path = None
+        return (start, end)
 
-    if path:
-        path_list.append(path)
 
-    return path_list
 
+def iter_sexp_children(text):
+    """
+    Yield `(name, start, end)` for each child node of the root
+    S-expression in `text`, where `text[start:end]` is the child.
+    """
+
+    depth = 0
+    start = None
+    name = None
+
+    for match in REGEX["sexp_token"].finditer(text):
+        kind = match.lastgroup
+
+        if kind == "open":
+            depth += 1
+            if depth == 2:
+                start = match.start(kind)
+                name = None
+        elif kind == "close":
+            if depth == 2:
+                yield name, start, match.end(kind)
+            depth -= 1
+            if depth < 0:
+                raise ParseError(
+                    f"Unexpected `)` at position {match.start(kind)}.")
+        elif kind in ("atom", "string"):
+            if depth == 2 and name is None and start is not None:
+                name = match.group(kind)
+        else:
+            raise ParseError(
+                f"Unexpected `{match.group(kind)}` "
+                f"at position {match.start(kind)}.")
 
+    if depth:
+        raise ParseError(f"{depth} unclosed parentheses.")
 
-def kicad_extract_layer_net_path(kicad_text, layer=None, net=None):
 
-    layer_net_segment = defaultdict(lambda : defaultdict(list))
 
-    for line in kicad_text.split("\n"):
-        match_trace = REGEX["trace"].match(line)
+def load_board(kicad):
+    """Return a `Board` for KiCad PCB text, or `kicad` if already a `Board`."""
 
-        if match_trace:
-            trace = parse_trace(line)
+    if isinstance(kicad, Board):
+        return kicad
+    return Board(kicad)
 
-            if layer is not None and trace["layer"] != layer:
-                continue
 
-            if net is not None and trace["net"] != net:
-                continue
 
-            layer_net_segment[trace["layer"]][trace["net"]].append(trace)
+def kicad_extract_layer_net_path(kicad, layer=None, net=None,
+                                 tolerance=None):
+    """
+    `kicad` is KiCad PCB text or a `Board`.
+    `tolerance` is passed to `join_segment_list`.
+    """
+
+    board = load_board(kicad)
 
     layer_net_path = {}
 
-    for layer_name, net_dict in layer_net_segment.items():
-        layer_net_path[layer_name] = {}
+    for layer_name, net_dict in board.layer_net_segment.items():
+        if layer is not None and layer_name != layer:
+            continue
+
         for net_name, segment_list in net_dict.items():
-            layer_net_path[layer_name][net_name] = \
-                join_segment_list(segment_list)
+            if net is not None and net_name != net:
+                continue
+
+            profiling.count("elements", len(segment_list))
+            with profiling.stage("join"):
+                path_list = join_segment_list(
+                    segment_list, tolerance=tolerance)
+            profiling.count_paths(path_list)
+
+            layer_net_path.setdefault(layer_name, {})[net_name] = path_list
 
     return layer_net_path
 
 
 
-def kicad_extract_origin(kicad_text):
-    for line in kicad_text.split("\n"):
-        match = REGEX["origin"].match(line)
-        if match:
-            return [float(v) for v in match.groups()]
+def kicad_extract_pathset(kicad, layer=None, net=None, tolerance=None):
+    """
+    Return joined traces as a `PathSet` with the layer name and
+    net number of each path.
 
-    return None
+    `kicad` is KiCad PCB text or a `Board`.
+    """
 
+    path_list = []
+    layer_list = []
+    net_list = []
 
+    layer_net_path = kicad_extract_layer_net_path(
+        kicad, layer=layer, net=net, tolerance=tolerance)
+    for layer_name, net_dict in layer_net_path.items():
+        for net_name, paths in net_dict.items():
+            path_list += paths
+            layer_list += [(layer_name, )] * len(paths)
+            net_list += [net_name] * len(paths)
 
-def kicad_extract_page_size(kicad_text):
-    page_sizes = {
-        "A4": (297, 210),
-    }
-    for line in kicad_text.split("\n"):
-        match = REGEX["page"].match(line)
-        if match:
-            page_text = match.group(1)
-            if page_text in page_sizes:
-                return page_sizes[page_text]
+    return PathSet.from_paths(path_list, layer=layer_list, net=net_list)
+
+
+
+def pathset_layer_net_path(pathset):
+    layer_net_path = defaultdict(dict)
+    for (layer_name, net_name), paths in pathset.group(
+            lambda layer, net: (layer[0], net)).items():
+        layer_net_path[layer_name][net_name] = paths
+    return dict(layer_net_path)
 
-            match = re.compile("^User (.*) (.*)$").match(page_text)
-            if match:
-                return [float(v) for v in match.groups()]
 
-            raise ParseError("Could not determine page size for page `{page_text}`.")
 
-    raise ParseError("No page information found.")
+def kicad_extract_origin(kicad):
+    return load_board(kicad).grid_origin
 
 
 
-def kicad2svg(out, kicad_file, layer=None, net=None, grid_spacing=None):
+def kicad_extract_page_size(kicad):
+    return load_board(kicad).page_size()
+
+
+
+def kicad2svg(out, kicad_file, layer=None, net=None, grid_spacing=None,
+              tolerance=None, precision=None):
     """
     Extract traces from KiCad PCB files and save as SVG paths.
 
-    out:  Stream object to write to.
+    out:        Stream object to write to.
+    tolerance:  Join trace ends closer than this distance in mm.
+    precision:  Number of decimal places for coordinates, or `None` for
+                full precision.
 
     Use millimeters for output unit.
     """
 
-    kicad_text = kicad_file.read()
+    with profiling.stage("parse"):
+        board = load_board(kicad_file.read())
 
     width = 297
     height = 210
 
+    page_size = None
     try:
-        page_size = kicad_extract_page_size(kicad_text)
+        page_size = board.page_size()
     except ParseError as e:
         LOG.warning(str(e))
     else:
@@ -342,15 +520,19 @@ def kicad2svg(out, kicad_file, layer=None, net=None, grid_spacing=None):
 
     origin = None
     if grid_spacing:
-        origin = kicad_extract_origin(kicad_text)
+        origin = board.grid_origin
 
-        if page_size:
-            origin[1] = page_size[1] - origin[1]
+        if origin is None:
+            LOG.warning("No grid origin found.")
+        elif page_size:
+            origin = [origin[0], page_size[1] - origin[1]]
         else:
             LOG.error("Grid origin cannot be correctly placed.")
 
-    layer_net_path = kicad_extract_layer_net_path(
-        kicad_text, layer=layer, net=net)
+    pathset = kicad_extract_pathset(
+        board, layer=layer, net=net, tolerance=tolerance)
 
-    write_svg(out, layer_net_path, width=width, height=height, unit="mm",
-              grid_spacing=grid_spacing, grid_origin=origin)
+    with profiling.stage("write"):
+        write_svg(out, pathset, width=width, height=height, unit="mm",
+                  grid_spacing=grid_spacing, grid_origin=origin,
+                  precision=precision)
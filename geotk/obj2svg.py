@@ -11,13 +11,20 @@
 # You should have received a copy of the GNU General Public License
 # along with this program.  If not, see <http://www.gnu.org/licenses/>.
 
+import os
 import re
+import sys
+import mmap
 import logging
-from collections import defaultdict
+from itertools import chain
 
+import numpy as np
+
+from geotk import profiling
 from geotk.svg import header as svg_header, footer as svg_footer, \
-    style, linear_path_d
+    style, format_path_d
 from geotk.common import format_float
+from geotk.output import ChunkWriter, format_xy
 
 
 
@@ -26,9 +33,23 @@ LOG = logging.getLogger("obj2svg")
 
 Z_WARN_NON_ZERO = False
 
+# Statements that carry nothing needed for 2D outlines.
+OBJ_IGNORE_TOKENS = {
+    b"g", b"o", b"s", b"vn", b"vt", b"usemtl", b"mtllib",
+}
+
+REGEX = {
+    "continuation": re.compile(rb"\s*\\\n\s*"),
+    "token": re.compile(rb"^[ \t]*([^\s#]+)", re.M),
+    "vertex": re.compile(rb"^[ \t]*v[ \t]+([^#\r\n]*)", re.M),
+    "face": re.compile(rb"^[ \t]*f[ \t]+([^#\r\n]*)", re.M),
+    "face_suffix": re.compile(rb"/[^\s]*"),
+}
 
 
-def write_svg(out, face_list, vert_list, width, height, unit):
+
+def write_svg(out, face_list, vert_list, width, height, unit,
+              precision=None):
     width = format_float(width)
     height = format_float(height)
 
@@ -40,139 +61,238 @@ def write_svg(out, face_list, vert_list, width, height, unit):
         "stroke-width": "0.1",
     })
 
-    for face in face_list:
-        path = [vert_list[v - 1] for v in face]
-        d = linear_path_d(path)
-        if d:
-            out.write(f"""\
+    # Format every vertex once, however many faces share it.
+    xy_list = format_xy(vert_list, precision=precision)
+    vert_list = [tuple(v[:2]) for v in np.asarray(vert_list).tolist()]
+
+    with ChunkWriter(out) as chunk:
+        for face in face_list:
+            if len(face) <= 1:
+                continue
+            closed = (len(face) > 3 and
+                      vert_list[face[0] - 1] == vert_list[face[-1] - 1])
+            if closed:
+                face = face[:-1]
+            d = format_path_d([xy_list[v - 1] for v in face], closed)
+            chunk.write(f"""\
   <path style="{path_style}" d="{d}"/>
 """)
     out.write(svg_footer())
 
 
 
-def remove_backtracks(face_list):
-    line_dict = defaultdict(int)
-
-    for face in face_list:
-        if not face:
-            continue
-        cursor = face[0]
-        for vert in face[1:]:
-            if cursor == vert:
-                continue
-            pair = tuple(sorted([cursor, vert]))
-            line_dict[pair] += 1 if vert > cursor else -1
-            LOG.info(pair)
-            cursor = vert
-
-    line_dict = dict(line_dict)
-    LOG.info(sorted(line_dict.items()))
-    LOG.info("")
-
-    line_soup = defaultdict(list)
-    for key, value in line_dict.items():
-        if value > 0:
-            line_soup[key[0]] += [key[1]] * value
-        elif value < 0:
-            line_soup[key[1]] += [key[0]] * -value
-
-    line_soup = dict(line_soup)
-    LOG.info(repr(line_soup))
-    LOG.info("")
-
-    poly_list = [[]]
-    while line_soup:
-        if poly_list[-1]:
-            s1 = poly_list[-1][0]
-        else:
-            s1 = list(line_soup.keys())[0]
-            poly_list[-1].append(s1)
-
-        if len(poly_list[-1]) > 1:
-            e1 = poly_list[-1][-1]
-            if s1 == e1:
-                poly_list.append([])
-                continue
-        else:
-            e1 = line_soup[s1].pop(0)
-            if not line_soup[s1]:
-                del line_soup[s1]
-            poly_list[-1].append(e1)
+def face_edges(face_list):
+    """
+    Return arrays `(a, b)` of the edges from each vertex to the next
+    within each face. Faces are not closed, and repeated vertices are
+    skipped.
+    """
+
+    lengths = np.fromiter((len(v) for v in face_list), dtype=np.int64,
+                          count=len(face_list))
+    flat = np.fromiter(chain.from_iterable(face_list), dtype=np.int64,
+                       count=int(lengths.sum()))
+
+    valid = np.ones(max(len(flat) - 1, 0), dtype=bool)
+    face_end = np.cumsum(lengths)[:-1] - 1
+    valid[face_end[(face_end >= 0) & (face_end < len(valid))]] = False
+
+    a = flat[:-1][valid]
+    b = flat[1:][valid]
+    distinct = a != b
+    return a[distinct], b[distinct]
+
+
+
+def cancel_edges(a, b):
+    """
+    Cancel edges `a -> b` against edges `b -> a`.
+
+    Return arrays `(source, target)` of the remaining directed edges,
+    repeated by multiplicity and ordered by first appearance of each
+    undirected edge.
+    """
+
+    if not len(a):
+        empty = np.empty(0, dtype=np.int64)
+        return empty, empty
+
+    pair = np.stack([np.minimum(a, b), np.maximum(a, b)], axis=1)
+    weight = np.where(b > a, 1, -1)
+
+    (unique_pair, first, inverse) = np.unique(
+        pair, axis=0, return_index=True, return_inverse=True)
+    value = np.bincount(inverse.reshape(-1), weights=weight,
+                        minlength=len(unique_pair)).astype(np.int64)
+
+    order = np.argsort(first, kind="stable")
+    order = order[value[order] != 0]
+    unique_pair = unique_pair[order]
+    value = value[order]
+
+    forward = value > 0
+    count = np.abs(value)
+    source = np.where(forward, unique_pair[:, 0], unique_pair[:, 1])
+    target = np.where(forward, unique_pair[:, 1], unique_pair[:, 0])
+    return np.repeat(source, count), np.repeat(target, count)
+
+
+
+def walk_edges(source, target):
+    """
+    Return polylines of vertex numbers walking directed edges in order.
+
+    Each polyline starts from the earliest remaining source vertex and
+    follows the earliest remaining edge from its end until it closes or
+    the end has no edges left.
+    """
+
+    (node_list, source_id) = np.unique(source, return_inverse=True)
+    source_id = source_id.reshape(-1)
+
+    (_unused, first) = np.unique(source_id, return_index=True)
+    start_order = np.argsort(first, kind="stable").tolist()
+
+    edge_order = np.argsort(source_id, kind="stable")
+    target_list = target[edge_order].tolist()
+    bounds = np.searchsorted(
+        source_id[edge_order], np.arange(len(node_list) + 1)).tolist()
+    position = bounds[:-1]
+    end = bounds[1:]
 
-        try:
-            e2 = line_soup[e1].pop(0)
-        except:
-            poly_list.append([])
-            continue
+    node_list = node_list.tolist()
+    node_id = {v: i for i, v in enumerate(node_list)}
 
-        if not line_soup[e1]:
-            del line_soup[e1]
-        poly_list[-1].append(e2)
+    poly_list = []
+    remaining = len(target_list)
+    start_index = 0
+    while remaining:
+        node = start_order[start_index]
+        while position[node] == end[node]:
+            start_index += 1
+            node = start_order[start_index]
+        poly = [node_list[node]]
 
-    LOG.info(repr(poly_list))
-    LOG.info("")
+        while node is not None and position[node] < end[node]:
+            vertex = target_list[position[node]]
+            position[node] += 1
+            remaining -= 1
+            poly.append(vertex)
+            if vertex == poly[0]:
+                break
+            node = node_id.get(vertex, None)
+
+        poly_list.append(poly)
 
     return poly_list
 
 
 
-def obj2svg(out, obj_file, unit=""):
+def remove_backtracks(face_list):
+    """
+    Join the edges of faces into polylines, removing edges that are
+    traversed in both directions.
+    """
+
+    (a, b) = face_edges(face_list)
+    (source, target) = cancel_edges(a, b)
+    return walk_edges(source, target)
+
+
+
+def read_obj_data(data):
+    """
+    Parse OBJ bytes, or any buffer such as an `mmap`.
+
+    Return `(vertices, faces, offsets)`, where `vertices` is an (N, 3)
+    array, `faces` is a flat array of 1-based vertex numbers and face `i`
+    is `faces[offsets[i]:offsets[i + 1]]`.
+    """
+
+    if data.find(b"\\\n") != -1:
+        data = REGEX["continuation"].sub(b" ", data)
+
+    token_set = set(REGEX["token"].findall(data))
+    unknown = token_set - {b"v", b"f"} - OBJ_IGNORE_TOKENS
+    if unknown:
+        LOG.error("Unsupported OBJ statements: %s.", ", ".join(
+            sorted(v.decode("utf-8", "replace") for v in unknown)))
+        sys.exit(1)
+
+    vertex_text = REGEX["vertex"].findall(data)
+    try:
+        vertices = np.array(b" ".join(vertex_text).split(), dtype=float)
+        if len(vertices) != 3 * len(vertex_text):
+            vertices = np.array(
+                [v.split()[:3] for v in vertex_text], dtype=float)
+    except ValueError:
+        LOG.error("Could not parse OBJ vertices.")
+        sys.exit(1)
+    vertices = vertices.reshape(-1, 3)
+
+    face_text = REGEX["face_suffix"].sub(
+        b"", b"\n".join(REGEX["face"].findall(data)))
+    lengths = [len(v.split()) for v in face_text.split(b"\n")] \
+        if face_text else []
+    offsets = np.zeros(len(lengths) + 1, dtype=np.int64)
+    offsets[1:] = np.cumsum(lengths)
+    try:
+        faces = np.array(face_text.split(), dtype=np.int64)
+    except ValueError:
+        LOG.error("Could not parse OBJ faces.")
+        sys.exit(1)
+
+    return vertices, faces, offsets
+
+
+
+def read_obj(obj_file, use_mmap=False):
+    """
+    Read vertices and faces from an OBJ file. See `read_obj_data`.
+
+    With `use_mmap` the file is memory-mapped instead of read into memory.
+    """
+
+    if use_mmap and os.fstat(obj_file.fileno()).st_size:
+        with mmap.mmap(obj_file.fileno(), 0, access=mmap.ACCESS_READ) \
+                as data:
+            return read_obj_data(data)
+
+    data = obj_file.read()
+    if isinstance(data, str):
+        data = data.encode("utf-8")
+    return read_obj_data(data)
+
+
+
+def obj2svg(out, obj_file, unit="", use_mmap=False, precision=None):
     LOG.info(obj_file.name)
 
-    obj_text = obj_file.read()
-
-    vert_list = []
-    face_list = []
-
-    obj_text = re.compile(r"\s*\\\n\s*").sub(" ", obj_text)
-
-    x_min = None
-    y_min = None
-    x_max = None
-    y_max = None
-
-    for line in obj_text.splitlines():
-        line = re.sub("#.*$", "", line)
-        line = line.strip()
-        if not line:
-            continue
-
-        g_match = re.match("g", line)
-        if g_match:
-            continue
-
-        vn_match = re.match("vn ([-0-9e.]+) ([-0-9e.]+) ([-0-9e.]+)", line)
-        if vn_match:
-            continue
-
-        v_match = re.match("v ([-0-9e.]+) ([-0-9e.]+) ([-0-9e.]+)", line)
-        if v_match:
-            point = [float(v) for v in v_match.groups()]
-            (x, y, z) = point
-            x_min = x if x_min is None else min(x_min, x)
-            y_min = y if y_min is None else min(y_min, y)
-            x_max = x if x_max is None else max(x_max, x)
-            y_max = y if y_max is None else max(y_max, y)
-            if Z_WARN_NON_ZERO and z != 0:
-                LOG.warning("Point is not in z-plane")
-                sys.exit(1)
-            vert_list.append(point)
-            continue
-
-        f_match = re.match("f( [-0-9e./]+)+$", line)
-        if f_match:
-            face = [int(v.split("/")[0]) for v in line.split()[1:]]
-            LOG.debug("Face %d: %s", len(face_list), repr(face))
-            face_list.append(face)
-            continue
-
-        LOG.error(line)
+    with profiling.stage("parse"):
+        (vertices, faces, offsets) = read_obj(obj_file, use_mmap=use_mmap)
+
+    if Z_WARN_NON_ZERO and np.any(vertices[:, 2] != 0):
+        LOG.warning("Point is not in z-plane")
         sys.exit(1)
 
+    if len(vertices):
+        (x_min, y_min) = vertices[:, :2].min(axis=0).tolist()
+        (x_max, y_max) = vertices[:, :2].max(axis=0).tolist()
+    else:
+        (x_min, y_min, x_max, y_max) = (0, 0, 0, 0)
+
     width = x_max - x_min
     height = y_max - y_min
 
-    write_svg(out, face_list, vert_list, width, height, unit)
+    faces = faces.tolist()
+    face_list = [faces[start:end] for start, end in zip(
+        offsets[:-1].tolist(), offsets[1:].tolist())]
+
+    profiling.count("elements", len(face_list))
+    profiling.count_paths(face_list)
+
+    with profiling.stage("write"):
+        write_svg(out, face_list, vertices[:, :2], width, height, unit,
+                  precision=precision)
 
     LOG.info(f"%d faces.", len(face_list))
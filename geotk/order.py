@@ -0,0 +1,309 @@
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this program.  If not, see <http://www.gnu.org/licenses/>.
+
+import math
+
+import numpy as np
+
+from geotk.common import ORDER_METHODS
+
+
+
+# Number of following paths considered for each 2-opt move.
+TWO_OPT_WINDOW = 32
+TWO_OPT_PASSES = 4
+
+
+
+class EntryGrid:
+    """
+    Uniform grid of the points where paths may be entered.
+
+    Points are removed a whole path at a time. The grid is rebuilt over
+    the remaining points when most of it is empty, so searches do not
+    spend long crossing empty cells.
+    """
+
+    def __init__(self, x, y, path):
+        self.x = x
+        self.y = y
+        self._path_points = {}
+        for i, p in enumerate(path):
+            self._path_points.setdefault(p, []).append(i)
+        self.count = len(x)
+        self._build(range(len(x)))
+
+
+    def _build(self, point_list):
+        point_list = list(point_list)
+        self.built_count = len(point_list)
+
+        if not point_list:
+            self.cells = {}
+            return
+
+        x = [self.x[i] for i in point_list]
+        y = [self.y[i] for i in point_list]
+        self.x_min = min(x)
+        self.y_min = min(y)
+        width = max(x) - self.x_min
+        height = max(y) - self.y_min
+
+        # Aim for about two points per cell, even if they are in a line.
+        count = len(point_list)
+        self.size = max(math.sqrt(2 * width * height / count),
+                        2 * max(width, height) / count, 1e-9)
+        self.columns = int(width / self.size) + 1
+        self.rows = int(height / self.size) + 1
+
+        self.cells = {}
+        for i in point_list:
+            self.cells.setdefault(self._cell(self.x[i], self.y[i]), set()) \
+                .add(i)
+
+
+    def _cell(self, x, y):
+        return (
+            min(max(int((x - self.x_min) / self.size), 0), self.columns - 1),
+            min(max(int((y - self.y_min) / self.size), 0), self.rows - 1),
+        )
+
+
+    def remove_path(self, path):
+        for i in self._path_points.pop(path, ()):
+            key = self._cell(self.x[i], self.y[i])
+            cell = self.cells[key]
+            cell.discard(i)
+            self.count -= 1
+            if not cell:
+                del self.cells[key]
+
+        if self.count and self.count * 4 < self.built_count:
+            self._build(i for cell in self.cells.values() for i in cell)
+
+
+    def nearest(self, x, y):
+        """Return the index of the nearest point to `(x, y)`, or `None`."""
+
+        if not self.count:
+            return None
+
+        (cx, cy) = self._cell(x, y)
+        best = None
+        best_d2 = None
+        ring_max = max(self.columns, self.rows)
+
+        for r in range(ring_max + 1):
+            for c in self._ring(cx, cy, r):
+                for i in self.cells.get(c, ()):
+                    d2 = (self.x[i] - x) ** 2 + (self.y[i] - y) ** 2
+                    if best is None or d2 < best_d2 or (
+                            d2 == best_d2 and i < best):
+                        best = i
+                        best_d2 = d2
+            if best is not None and best_d2 <= (r * self.size) ** 2:
+                break
+
+        return best
+
+
+    def _ring(self, cx, cy, r):
+        """Yield the cells inside the grid at Chebyshev distance `r`."""
+
+        if r == 0:
+            yield (cx, cy)
+            return
+
+        x_range = range(max(cx - r, 0), min(cx + r, self.columns - 1) + 1)
+        for y in (cy - r, cy + r):
+            if 0 <= y < self.rows:
+                for x in x_range:
+                    yield (x, y)
+        for x in (cx - r, cx + r):
+            if 0 <= x < self.columns:
+                for y in range(max(cy - r + 1, 0),
+                               min(cy + r - 1, self.rows - 1) + 1):
+                    yield (x, y)
+
+
+
+def is_closed(path):
+    return len(path) > 2 and tuple(path[0]) == tuple(path[-1])
+
+
+
+def path_travel(path_list, origin=(0, 0)):
+    """Return the total distance between the end and start of each path."""
+
+    if not path_list:
+        return 0
+
+    start = np.array([p[0] for p in path_list], dtype=float)
+    end = np.array([origin] + [p[-1] for p in path_list[:-1]], dtype=float)
+    return float(np.hypot(*(start - end).T).sum())
+
+
+
+def nearest_order(path_list, origin=(0, 0), reverse=True):
+    """
+    Return a list of `(index, entry)` for each path, greedily choosing the
+    nearest entry point to the end of the previous path.
+
+    `entry` is the vertex where the path starts. Open paths may only
+    start at their first vertex, or also at their last if `reverse` is
+    true. Closed paths may start at any vertex.
+    """
+
+    x = []
+    y = []
+    point_path = []
+    point_vertex = []
+
+    for p, path in enumerate(path_list):
+        if is_closed(path):
+            vertex_list = range(len(path) - 1)
+        elif reverse and len(path) > 1:
+            vertex_list = (0, len(path) - 1)
+        else:
+            vertex_list = (0, )
+
+        for v in vertex_list:
+            x.append(float(path[v][0]))
+            y.append(float(path[v][1]))
+            point_path.append(p)
+            point_vertex.append(v)
+
+    grid = EntryGrid(x, y, point_path)
+
+    order = []
+    (px, py) = origin
+    while True:
+        i = grid.nearest(px, py)
+        if i is None:
+            break
+        p = point_path[i]
+        v = point_vertex[i]
+        order.append((p, v))
+        grid.remove_path(p)
+
+        path = path_list[p]
+        if is_closed(path):
+            exit_vertex = v
+        else:
+            exit_vertex = len(path) - 1 - v
+        (px, py) = (float(path[exit_vertex][0]), float(path[exit_vertex][1]))
+
+    return order
+
+
+
+def enter_path(path, entry):
+    """Return `path` started from vertex `entry`."""
+
+    path = np.asarray(path)
+    if not entry:
+        return path
+    if not is_closed(path):
+        assert entry == len(path) - 1
+        return path[::-1]
+
+    ring = path[:-1]
+    return np.concatenate([ring[entry:], ring[:entry], ring[entry:entry + 1]])
+
+
+
+def two_opt(path_list, origin=(0, 0), window=TWO_OPT_WINDOW,
+            passes=TWO_OPT_PASSES):
+    """
+    Improve an order of paths by reversing runs of up to `window` paths
+    where that shortens the travel. Reversing a run also reverses each
+    path in it.
+    """
+
+    count = len(path_list)
+    if count < 2:
+        return path_list
+
+    order = np.arange(count)
+    flipped = np.zeros(count, dtype=bool)
+    entry = np.array([p[0] for p in path_list], dtype=float)
+    exit_ = np.array([p[-1] for p in path_list], dtype=float)
+    origin = np.asarray(origin, dtype=float)
+
+    for _pass in range(passes):
+        improved = False
+        for i in range(count):
+            j = np.arange(i, min(i + window, count))
+            a = exit_[i - 1] if i else origin
+            has_next = j + 1 < count
+            b = entry[np.minimum(j + 1, count - 1)]
+
+            before = (np.hypot(*(entry[i] - a)) +
+                      np.hypot(*(b - exit_[j]).T) * has_next)
+            after = (np.hypot(*(exit_[j] - a).T) +
+                     np.hypot(*(b - entry[i]).T) * has_next)
+            delta = after - before
+
+            k = int(np.argmin(delta))
+            if delta[k] < -1e-9:
+                run = slice(i, int(j[k]) + 1)
+                order[run] = order[run][::-1].copy()
+                flipped[run] = ~flipped[run][::-1]
+                (entry[run], exit_[run]) = (
+                    exit_[run][::-1].copy(), entry[run][::-1].copy())
+                improved = True
+        if not improved:
+            break
+
+    return [
+        path_list[p][::-1] if f else path_list[p]
+        for p, f in zip(order.tolist(), flipped.tolist())
+    ]
+
+
+
+def order_paths(path_list, method="nearest", origin=(0, 0), reverse=True):
+    """
+    Reorder paths to reduce travel between them.
+
+    method:   One of `ORDER_METHODS`. "document" keeps the input order.
+              "2opt" improves the nearest-neighbour order with 2-opt
+              moves, which may reverse open paths.
+    origin:   Position before the first path.
+    reverse:  Allow open paths to be drawn from their last vertex.
+
+    Return `(path_list, travel_before, travel_after)`.
+    """
+
+    path_list = [path for path in path_list if len(path)]
+    travel_before = path_travel(path_list, origin)
+
+    if method == "document":
+        return path_list, travel_before, travel_before
+
+    if method not in ORDER_METHODS:
+        raise ValueError(f"Unknown path order method `{method}`.")
+    if method == "2opt" and not reverse:
+        raise ValueError("2-opt path ordering requires reversing paths.")
+
+    path_list = [
+        enter_path(path_list[p], entry)
+        for p, entry in nearest_order(path_list, origin, reverse=reverse)
+    ]
+
+    if method == "2opt":
+        path_list = two_opt(path_list, origin)
+
+    travel_after = path_travel(path_list, origin)
+
+    return path_list, travel_before, travel_after
@@ -0,0 +1,178 @@
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this program.  If not, see <http://www.gnu.org/licenses/>.
+
+import numpy as np
+
+from geotk.common import format_float
+
+
+
+# Number of strings collected before `ChunkWriter` writes them.
+CHUNK_SIZE = 1 << 14
+
+# Integral values below this are formatted through `int64`.
+INT_LIMIT = 2 ** 53
+
+# `str` uses exponent notation for non-zero values outside this range.
+REPR_FIXED_RANGE = (1e-4, 1e16)
+
+
+
+class ChunkWriter:
+    """
+    Collect strings and write them to `out` joined in large chunks.
+
+    Use as a context manager, or call `flush` when done.
+    """
+
+    def __init__(self, out, chunk_size=CHUNK_SIZE):
+        self.out = out
+        self.chunk_size = chunk_size
+        self._parts = []
+
+
+    def write(self, text):
+        self._parts.append(text)
+        if len(self._parts) >= self.chunk_size:
+            self.flush()
+
+
+    def flush(self):
+        if self._parts:
+            self.out.write("".join(self._parts))
+            self._parts = []
+
+
+    def __enter__(self):
+        return self
+
+
+    def __exit__(self, *args):
+        self.flush()
+
+
+
+def format_floats(values, precision=None, fixed=False):
+    """
+    Format an array of numbers as a flat list of strings.
+
+    By default each value is formatted exactly like `format_float`.
+    With `precision`, values are rounded to that many decimal places and
+    trailing zeros are removed.
+
+    With `fixed`, values that `format_float` would write in exponent
+    notation are written in positional notation with the same digits,
+    as G-code requires.
+    """
+
+    values = np.asarray(values, dtype=float).ravel()
+
+    if precision is not None:
+        return format_floats_fixed(values, precision)
+
+    if not np.all(np.isfinite(values)):
+        return [format_float(v) for v in values.tolist()]
+
+    text_list = format_floats_repr(values)
+
+    if fixed:
+        magnitude = np.abs(values)
+        exponent = (values != np.trunc(values)) & (
+            (magnitude < REPR_FIXED_RANGE[0]) |
+            (magnitude >= REPR_FIXED_RANGE[1]))
+        for i in np.flatnonzero(exponent).tolist():
+            text_list[i] = np.format_float_positional(values[i], trim="-")
+
+    return text_list
+
+
+
+def format_floats_repr(values):
+    """
+    Format a flat array of finite numbers like `format_float`.
+    """
+
+    value_list = values.tolist()
+    text_list = list(map(str, value_list))
+
+    whole = values == np.trunc(values)
+    small = whole & (np.abs(values) < INT_LIMIT)
+    index = np.flatnonzero(small).tolist()
+    if index:
+        int_list = map(str, values[small].astype(np.int64).tolist())
+        for i, text in zip(index, int_list):
+            text_list[i] = text
+
+    # Integers too large for `int64`.
+    for i in np.flatnonzero(whole & ~small).tolist():
+        text_list[i] = format_float(value_list[i])
+
+    return text_list
+
+
+
+def format_floats_fixed(values, precision):
+    """
+    Format values rounded to `precision` decimal places, without
+    trailing zeros.
+
+    Values are scaled to integers so that most of the work is integer
+    arithmetic in NumPy.
+    """
+
+    scale = 10 ** precision
+    scaled = np.round(values * scale)
+
+    if not np.all(np.abs(scaled) < INT_LIMIT):
+        text_list = np.char.mod(f"%.{precision:d}f", values).tolist()
+        if precision > 0:
+            text_list = [v.rstrip("0").rstrip(".") for v in text_list]
+        return ["0" if v == "-0" else v for v in text_list]
+
+    scaled = scaled.astype(np.int64)
+    negative = (scaled < 0).tolist()
+    scaled = np.abs(scaled)
+    whole = scaled // scale
+    fraction = scaled % scale
+
+    digits = np.full(len(values), precision)
+    for _i in range(precision):
+        trailing = (fraction % 10 == 0) & (fraction != 0)
+        fraction[trailing] //= 10
+        digits[trailing] -= 1
+
+    return [
+        ("-" if n else "") + w + ("." + f.zfill(d) if f != "0" else "")
+        for n, w, f, d in zip(
+            negative,
+            map(str, whole.tolist()),
+            map(str, fraction.tolist()),
+            digits.tolist(),
+        )
+    ]
+
+
+
+def format_xy(points, sep=" ", precision=None, fixed=False):
+    """
+    Return a list of `"{x}{sep}{y}"` strings for the first two
+    columns of `points`, formatted by `format_floats`.
+    """
+
+    points = np.asarray(points, dtype=float)
+    if not len(points):
+        return []
+
+    text_list = format_floats(
+        points[:, :2], precision=precision, fixed=fixed)
+    return [x + sep + y for x, y in zip(text_list[0::2], text_list[1::2])]
@@ -0,0 +1,281 @@
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this program.  If not, see <http://www.gnu.org/licenses/>.
+
+"""
+Stage timers, counters and peak memory for conversions.
+
+Library code marks stages with `stage` and counts work with `count`
+and `count_paths`. These do nothing until a `session` is started, by
+the `--profile` option of the scripts or the `GEOTK_PROFILE`
+environment variable.
+"""
+
+import os
+import sys
+import json
+import time
+import logging
+from contextlib import contextmanager, nullcontext
+
+try:
+    import resource
+except ImportError:
+    resource = None
+
+
+
+LOG = logging.getLogger("profiling")
+
+PROFILE_ENV = "GEOTK_PROFILE"
+
+PROFILE_FORMATS = ("text", "json")
+
+NULL_STAGE = nullcontext()
+
+# The running `Profiler`, or `None`.
+_profiler = None
+
+
+
+def peak_rss():
+    """Return the peak resident set size of this process in bytes."""
+
+    if resource is None:
+        return None
+    rss = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    # Kilobytes on Linux, bytes on macOS.
+    return rss if sys.platform == "darwin" else rss * 1024
+
+
+
+class StageTimer:
+    """Context manager that adds its duration to a `Profiler` stage."""
+
+    __slots__ = ("profiler", "name", "start", "child", "rss")
+
+    def __init__(self, profiler, name):
+        self.profiler = profiler
+        self.name = name
+        self.start = None
+        self.child = 0
+        self.rss = None
+
+
+    def __enter__(self):
+        self.profiler.stack.append(self)
+        self.rss = peak_rss()
+        self.start = time.perf_counter()
+        return self
+
+
+    def __exit__(self, *exc):
+        elapsed = time.perf_counter() - self.start
+        stack = self.profiler.stack
+        stack.pop()
+        if stack:
+            stack[-1].child += elapsed
+
+        stats = self.profiler.stages.get(self.name, None)
+        if stats is None:
+            stats = self.profiler.stages[self.name] = {
+                "calls": 0,
+                "total": 0.0,
+                "self": 0.0,
+                "rss-increase": 0,
+            }
+        stats["calls"] += 1
+        stats["total"] += elapsed
+        stats["self"] += elapsed - self.child
+        if self.rss is not None:
+            stats["rss-increase"] += peak_rss() - self.rss
+        return False
+
+
+
+class Profiler:
+    """
+    Collect stage times and counters.
+
+    Stages may nest, including through generators that are consumed
+    inside another stage. The self time of a stage excludes the time of
+    stages inside it, so self times add up to the profiled time.
+
+    Work done in worker processes, eg. with `jobs`, is not recorded.
+    """
+
+    def __init__(self):
+        self.stages = {}
+        self.counters = {}
+        self.stack = []
+        self.start = time.perf_counter()
+        self.rss = peak_rss()
+
+
+    def stage(self, name):
+        return StageTimer(self, name)
+
+
+    def count(self, name, value=1):
+        self.counters[name] = self.counters.get(name, 0) + value
+
+
+    def results(self):
+        """Return a JSON-serializable dict of results so far."""
+
+        rss = peak_rss()
+        mb = 1e-6
+        return {
+            "wall-time": time.perf_counter() - self.start,
+            "peak-rss-mb": None if rss is None else rss * mb,
+            "stages": {
+                name: {
+                    "calls": stats["calls"],
+                    "total": stats["total"],
+                    "self": stats["self"],
+                    "rss-increase-mb": stats["rss-increase"] * mb,
+                }
+                for name, stats in self.stages.items()
+            },
+            "counters": dict(self.counters),
+        }
+
+
+    def report(self):
+        """Return results so far as a text table."""
+
+        results = self.results()
+
+        line_list = ["%-16s %8s %10s %10s %12s" % (
+            "Stage", "Calls", "Total s", "Self s", "Peak +MB")]
+        for name, stats in results["stages"].items():
+            line_list.append("%-16s %8d %10.4f %10.4f %12.1f" % (
+                name, stats["calls"], stats["total"], stats["self"],
+                stats["rss-increase-mb"]))
+
+        line_list.append("")
+        for name, value in results["counters"].items():
+            line_list.append("%-16s %8d" % (name, value))
+        if results["counters"]:
+            line_list.append("")
+
+        line_list.append("%-16s %8.4f s" % ("Wall time", results["wall-time"]))
+        if results["peak-rss-mb"] is not None:
+            line_list.append("%-16s %8.1f MB" % (
+                "Peak RSS", results["peak-rss-mb"]))
+
+        return "\n".join(line_list) + "\n"
+
+
+
+def active():
+    """Return the running `Profiler`, or `None`."""
+
+    return _profiler
+
+
+
+def stage(name):
+    """Return a context manager that times the stage `name`."""
+
+    if _profiler is None:
+        return NULL_STAGE
+    return _profiler.stage(name)
+
+
+
+def count(name, value=1):
+    """Add `value` to the counter `name`."""
+
+    if _profiler is not None:
+        _profiler.count(name, value)
+
+
+
+def count_paths(paths):
+    """Count the paths, segments and vertices of a list of polylines."""
+
+    if _profiler is None:
+        return
+    vertices = sum(len(v) for v in paths)
+    _profiler.count("paths", len(paths))
+    _profiler.count("segments", vertices - sum(1 for v in paths if len(v)))
+    _profiler.count("vertices", vertices)
+
+
+
+@contextmanager
+def session(output_format="text", out=None, cprofile=None):
+    """
+    Profile the body and write a report when it ends.
+
+    output_format:
+             "text" or "json".
+    out:     Stream for the report. Defaults to standard error.
+    cprofile:
+             Path to also write `cProfile` statistics to, for use with
+             `pstats` or other viewers.
+
+    Yields the `Profiler`.
+    """
+
+    global _profiler
+
+    if output_format not in PROFILE_FORMATS:
+        raise ValueError(f"Unknown profile format: {output_format}")
+
+    profiler = Profiler()
+    previous = _profiler
+    _profiler = profiler
+
+    profile = None
+    if cprofile:
+        import cProfile
+        profile = cProfile.Profile()
+        profile.enable()
+
+    try:
+        yield profiler
+    finally:
+        if profile is not None:
+            profile.disable()
+            profile.dump_stats(cprofile)
+        _profiler = previous
+
+        out = out or sys.stderr
+        if output_format == "json":
+            json.dump(profiler.results(), out, indent=2)
+            out.write("\n")
+        else:
+            out.write(profiler.report())
+
+
+
+def session_from_args(args):
+    """
+    Return a `session` if `args` from `base_parser` or `$GEOTK_PROFILE`
+    enable profiling, otherwise a context manager that does nothing.
+
+    `$GEOTK_PROFILE` may be "text", "json" or "1" for text.
+    """
+
+    env = os.environ.get(PROFILE_ENV, None)
+    if env == "0":
+        env = None
+    output_format = args.profile_format
+    if not (args.profile or output_format or args.cprofile or env):
+        return nullcontext()
+
+    if output_format is None:
+        output_format = env if env in PROFILE_FORMATS else "text"
+
+    return session(output_format=output_format, cprofile=args.cprofile)
@@ -11,19 +11,32 @@
 # You should have received a copy of the GNU General Public License
 # along with this program.  If not, see <http://www.gnu.org/licenses/>.
 
+import os
 import re
 import math
 import logging
+from collections import defaultdict, deque
 
 import numpy as np
-from bs4 import BeautifulSoup
 
+from geotk import profiling
 from geotk.common import format_whitespace, format_float
+from geotk.output import format_xy
+from geotk.geometry import PathSet, simplify_paths
+from geotk.cache import content_digest
 
 
 
 LOG = logging.getLogger("svg")
 
+SVG_NS = "http://www.w3.org/2000/svg"
+INKSCAPE_NS = "http://www.inkscape.org/namespaces/inkscape"
+
+INKSCAPE_LABEL = "{%s}label" % INKSCAPE_NS
+INKSCAPE_GROUPMODE = "{%s}groupmode" % INKSCAPE_NS
+
+STREAM_CHUNK_SIZE = 1 << 20
+
 
 
 # Formatting functions
@@ -92,25 +105,24 @@ def style(d):
 
 
 
-def linear_path_d(path):
-    if not path or len(path) == 1:
+def linear_path_d(path, precision=None):
+    if len(path) <= 1:
         return None
 
-    path = path[:]
-
-    closed = len(path) > 3 and path[0] == path[-1]
+    closed = len(path) > 3 and tuple(path[0]) == tuple(path[-1])
     if closed:
         path = path[:-1]
 
-    d = ""
-    for v, vert in enumerate(path):
-        command = "L" if v else "M"
-        if d:
-            d += " "
-        d += f"{command} {format_float(vert[0])} {format_float(vert[1])}"
+    return format_path_d(format_xy(path, precision=precision), closed)
+
+
+
+def format_path_d(xy_list, closed):
+    """Return path data for a list of formatted `"x y"` strings."""
+
+    d = "M " + " L ".join(xy_list)
     if closed:
         d += " Z"
-
     return d
 
 
@@ -144,100 +156,61 @@ def text_to_mm(text):
 
 
 def transform_poly(poly, xform):
-    poly2 = []
-    for vertex in poly:
-        v1 = np.array([[vertex[0]], [vertex[1]], [1]])
-        v2 = xform @ v1
-        poly2.append([v2[0, 0], v2[1, 0]])
-    return poly2
-
-
-
-def angle_difference_radians(a1, a2):
-    diff = a2 - a1
-    if diff > math.pi:
-        diff -= 2 * math.pi
-    elif diff < -math.pi:
-        diff += 2 * math.pi
-    return diff
+    """
+    Apply the affine matrix `xform` to a polyline.
 
+    Return an (N, 2) float64 array.
+    """
 
+    poly = np.asarray(poly, dtype=float).reshape(-1, 2)
+    return (
+        poly[:, 0:1] * xform[:2, 0] +
+        poly[:, 1:2] * xform[:2, 1] +
+        xform[:2, 2]
+    )
 
-def split_bezier(
-        point_f, tangent_f, pa, pb, ta, tb,
-        min_dist=None, max_dist=None, max_angle=None,
-        depth=None, parent_angle=None
-):
-    """Split `path` in place as necessary according to dist and angle"""
 
-    if depth is None:
-        depth = 0
-
-    def point_2d(t):
-        return (point_f(t, 0), point_f(t, 1),)
 
-    def tangent_2d(t):
-        return (tangent_f(t, 0), tangent_f(t, 1),)
+def transform_poly_list(poly_list, xform):
+    """
+    Apply the affine matrix `xform` to all polylines in `poly_list`
+    with a single array operation.
 
-    do_split = False
-    this_angle = None
+    Return a list of (N, 2) float64 arrays.
+    """
 
-    section_dist = dist(pa, pb)
+    if not poly_list:
+        return []
 
-    if min_dist is None or section_dist > min_dist:
-        if max_dist:
-            do_split = section_dist > max_dist
+    lengths = [len(poly) for poly in poly_list]
+    vertex_list = [vertex for poly in poly_list for vertex in poly]
+    return np.split(
+        transform_poly(vertex_list, xform), np.cumsum(lengths)[:-1])
 
-        if not do_split and max_angle:
-            tm = (ta + tb) / 2
 
-            da = tangent_2d(ta)
-            dm = tangent_2d(tm)
-            db = tangent_2d(tb)
-            aa = angle(da)
-            am = angle(dm)
-            ab = angle(db)
 
-            section_angle = max(
-                abs(angle_difference_radians(aa, am)),
-                abs(angle_difference_radians(aa, ab))
-            ) * 180 / math.pi
+def angle_difference_radians(a1, a2):
+    """
+    Accepts scalars or NumPy arrays.
+    """
 
-            if depth < 2 or parent_angle is None or section_angle < parent_angle:
-                # Do not split if angle is increasing (near to touching points)
-                # except for the first and second split (where curve may be
-                # changing direction)
-                if section_angle > max_angle:
-                    do_split = True
-                    this_angle = section_angle
-
-    if not do_split:
-        return [pb]
-
-    tm = (ta + tb) / 2
-    pm = point_2d(tm)
-
-    def split(pa, pb, ta, tb):
-        return split_bezier(
-            point_f, tangent_f,
-            pa, pb, ta, tb,
-            min_dist=min_dist, max_dist=max_dist, max_angle=max_angle,
-            depth=depth + 1,
-            parent_angle=this_angle,
-        )
+    diff = a2 - a1
+    if isinstance(diff, np.ndarray):
+        return np.where(
+            diff > math.pi, diff - 2 * math.pi,
+            np.where(diff < -math.pi, diff + 2 * math.pi, diff))
 
-    return split(pa, pm, ta, tm) + split(pm, pb, tm, tb)
+    if diff > math.pi:
+        diff -= 2 * math.pi
+    elif diff < -math.pi:
+        diff += 2 * math.pi
+    return diff
 
 
 
-def poly_points_quadratic(
-        command, cursor, segment, absolute,
-        step_dist=None, step_angle=None, step_min=None
-):
+def bezier_control_points(cursor, segment, absolute):
     """
-    Quadratic Bézier spline.
-
-    Return absolute points
+    Return absolute control points of a Bézier segment starting at `cursor`.
     """
 
     vertex_list = [tuple(cursor)]
@@ -253,88 +226,205 @@ def poly_points_quadratic(
                 cursor[1] + vertex[1]
             ))
 
-    p = vertex_list
+    return vertex_list
+
+
+
+def bezier_powers(t):
+    """
+    Return `(1 - t) ** 2, (1 - t) ** 3, t ** 2, t ** 3` for an array of `t`.
+
+    Parameters come from repeated halving of [0, 1], so below 18 halvings
+    these products are exact and equal to Python `pow`.
+    """
+
+    u = 1 - t
+    u2 = u * u
+    t2 = t * t
+    return (u2, u2 * u, t2, t2 * t)
+
 
-    def point_f(t, c):
-        pc = [v[c] for v in p]
-        u = 1 - t
-        return (
-            pc[0] * pow(u, 2) +
-            pc[1] * 2 * u * t +
-            pc[2] * pow(t, 2)
-        )
 
-    def tangent_f(t, c):
-        pc = [v[c] for v in p]
-        u = 1 - t
-        pc = [v[c] for v in p]
+def bezier_point(pc, t):
+    """
+    Points at `t` of quadratic (K = 3) or cubic (K = 4) Bézier segments
+    with control coordinates `pc` of shape (N, K, ...).
+    """
+
+    (u2, u3, t2, t3) = bezier_powers(t)
+    if pc.shape[1] == 3:
         return (
-            pc[0] * -2 * u +
-            pc[2] * 2 * t
+            pc[:, 0] * u2 +
+            pc[:, 1] * 2 * (1 - t) * t +
+            pc[:, 2] * t2
         )
+    return (
+        pc[:, 0] * u3 +
+        pc[:, 1] * 3 * u2 * t +
+        pc[:, 2] * 3 * (1 - t) * t2 +
+        pc[:, 3] * t3
+    )
+
 
-    max_dist = None if step_dist is None else abs(step_dist) * math.sqrt(2)
-    max_angle = None if step_angle is None else abs(step_angle) * math.sqrt(2)
 
-    return split_bezier(
-        point_f, tangent_f, cursor, p[2], 0, 1,
-        min_dist=step_min, max_dist=max_dist, max_angle=max_angle
+def bezier_tangent(pc, t):
+    (u2, _u3, t2, _t3) = bezier_powers(t)
+    u = 1 - t
+    if pc.shape[1] == 3:
+        return (
+            pc[:, 0] * -2 * u +
+            pc[:, 2] * 2 * t
+        )
+    return (
+        pc[:, 0] * -3 * u2 +
+        pc[:, 1] * (3 * u2 - 6 * t * u) +
+        pc[:, 2] * (-3 * t2 + 6 * t * u) +
+        pc[:, 3] * 3 * t2
     )
 
 
 
-def poly_points_cubic(
-        command, cursor, segment, absolute,
+def flatten_bezier(
+        control,
         step_dist=None, step_angle=None, step_min=None
 ):
     """
-    Cubic Bézier spline.
+    Linearize a batch of Bézier segments of the same order.
 
-    Return absolute points
+    `control` is an array of absolute control points of shape (S, K, 2),
+    where K is 3 for quadratic and 4 for cubic segments.
+
+    Each segment is split in half at its parameter midpoint while the
+    section is longer than `step_dist` or turns through more than
+    `step_angle` degrees, unless it is shorter than `step_min`. Angle
+    splits stop once the angle starts increasing between successive
+    splits (near touching control points), except for the first two.
+    All sections at the same depth are evaluated together.
+
+    Return `(points, counts)`: an (N, 2) array of the vertices of all
+    segments in order, excluding each segment's start point, and the
+    number of vertices for each segment.
     """
 
-    vertex_list = [tuple(cursor)]
-    while segment:
-        vertex = tuple(segment[:2])
-        segment = segment[2:]
+    control = np.asarray(control, dtype=float)
+    n_segments = control.shape[0]
 
-        if absolute:
-            vertex_list.append(tuple(vertex))
+    min_dist = step_min
+    max_dist = None if step_dist is None else abs(step_dist) * math.sqrt(2)
+    max_angle = None if step_angle is None else abs(step_angle) * math.sqrt(2)
+
+    seg = np.arange(n_segments)
+    ta = np.zeros(n_segments)
+    tb = np.ones(n_segments)
+    pa = control[:, 0]
+    pb = control[:, -1]
+    depth = 0
+    parent_angle = np.full(n_segments, np.nan)
+
+    leaf_seg = []
+    leaf_t = []
+    leaf_point = []
+
+    while len(seg):
+        delta = pb - pa
+        section_dist = np.sqrt(
+            delta[:, 0] * delta[:, 0] + delta[:, 1] * delta[:, 1])
+
+        if min_dist is None:
+            check = np.ones(len(seg), dtype=bool)
         else:
-            vertex_list.append((
-                cursor[0] + vertex[0],
-                cursor[1] + vertex[1]
-            ))
+            check = section_dist > min_dist
 
-    p = vertex_list
+        do_split = np.zeros(len(seg), dtype=bool)
+        this_angle = np.full(len(seg), np.nan)
 
-    def point_f(t, c):
-        pc = [v[c] for v in p]
-        return (
-            pc[0] * pow((1 - t), 3) +
-            pc[1] * 3 * pow((1 - t), 2) * t +
-            pc[2] * 3 * (1 - t) * pow(t, 2) +
-            pc[3] * pow(t, 3)
-        )
+        if max_dist:
+            do_split = check & (section_dist > max_dist)
+
+        if max_angle:
+            (idx, ) = np.nonzero(check & ~do_split)
+            pc = control[seg[idx]]
+            sa = ta[idx]
+            sb = tb[idx]
+            sm = (sa + sb) / 2
+
+            (aa, am, ab) = [
+                np.arctan2(d[:, 1], d[:, 0]) for d in (
+                    bezier_tangent(pc, sa[:, None]),
+                    bezier_tangent(pc, sm[:, None]),
+                    bezier_tangent(pc, sb[:, None]),
+                )
+            ]
+
+            section_angle = np.maximum(
+                np.abs(angle_difference_radians(aa, am)),
+                np.abs(angle_difference_radians(aa, ab))
+            ) * 180 / math.pi
 
-    def tangent_f(t, c):
-        pc = [v[c] for v in p]
-        u = 1 - t
-        pc = [v[c] for v in p]
-        return (
-            pc[0] * -3 * pow(u, 2) +
-            pc[1] * (3 * pow(u, 2) - 6 * t * u) +
-            pc[2] * (-3 * pow(t, 2) + 6 * t * u) +
-            pc[3] * 3 * pow(t, 2)
-        )
+            # Do not split if angle is increasing (near to touching points)
+            # except for the first and second split (where curve may be
+            # changing direction)
+            parent = parent_angle[idx]
+            allow = np.isnan(parent) | (section_angle < parent)
+            if depth < 2:
+                allow[:] = True
+            angle_split = allow & (section_angle > max_angle)
 
-    max_dist = None if step_dist is None else abs(step_dist) * math.sqrt(2)
-    max_angle = None if step_angle is None else abs(step_angle) * math.sqrt(2)
+            do_split[idx[angle_split]] = True
+            this_angle[idx[angle_split]] = section_angle[angle_split]
+
+        leaf = ~do_split
+        leaf_seg.append(seg[leaf])
+        leaf_t.append(ta[leaf])
+        leaf_point.append(pb[leaf])
+
+        seg = seg[do_split]
+        ta = ta[do_split]
+        tb = tb[do_split]
+        pa = pa[do_split]
+        pb = pb[do_split]
+        this_angle = this_angle[do_split]
+
+        tm = (ta + tb) / 2
+        pm = bezier_point(control[seg], tm[:, None])
 
-    return split_bezier(
-        point_f, tangent_f, cursor, p[3], 0, 1,
-        min_dist=step_min, max_dist=max_dist, max_angle=max_angle
+        seg = np.concatenate((seg, seg))
+        ta, tb = np.concatenate((ta, tm)), np.concatenate((tm, tb))
+        pa, pb = np.concatenate((pa, pm)), np.concatenate((pm, pb))
+        parent_angle = np.concatenate((this_angle, this_angle))
+        depth += 1
+
+    leaf_seg = np.concatenate(leaf_seg)
+    order = np.lexsort((np.concatenate(leaf_t), leaf_seg))
+
+    points = np.concatenate(leaf_point)[order]
+    counts = np.bincount(leaf_seg, minlength=n_segments)
+
+    return points, counts
+
+
+
+def poly_points_bezier(
+        command, cursor, segment, absolute,
+        step_dist=None, step_angle=None, step_min=None
+):
+    """
+    Quadratic or cubic Bézier spline.
+
+    Return absolute points
+    """
+
+    control = bezier_control_points(cursor, segment, absolute)
+    (points, _counts) = flatten_bezier(
+        [control],
+        step_dist=step_dist, step_angle=step_angle, step_min=step_min
     )
+    return points.tolist()
+
+
+
+poly_points_quadratic = poly_points_bezier
+poly_points_cubic = poly_points_bezier
 
 
 
@@ -508,108 +598,238 @@ def poly_points_linear(command, cursor, segment, absolute, **kwargs):
 
 
 
-def path_to_poly_list(attrs, step_dist=None, step_angle=None, step_min=None):
-    path = attrs["d"]
-    path = " " + format_whitespace(path)
-    path = re.compile(" ([mlhvzcsqta])([0-9-])", re.I).sub(r"\1 \2", path)
-    path = re.sub(",", " ", path)
-
-    handlers = {
-        "M": {
-            "length": 2,
-            "draw": False,
-            "path": poly_points_linear,
-        },
-        "L": {
-            "length": 2,
-            "path": poly_points_linear,
-        },
-        "H": {
-            "length": 1,
-            "path": poly_points_linear,
-        },
-        "V": {
-            "length": 1,
-            "path": poly_points_linear,
-        },
-        "Z": {
-            "length": 0,
-        },
-        "C": {
-            "length": 6,
-            "path": poly_points_cubic,
-        },
-        # "S": {
-        #     "length": 4,
-        #     "path": poly_points_cubic,
-        # },
-        "Q": {
-            "length": 4,
-            "path": poly_points_quadratic,
-        },
-        # "T": {
-        #     "length": 2,
-        #     "path": poly_points_quadratic,
-        # },
-        "A": {
-            "length": 7,
-            "path": poly_points_arc,
-        },
-    }
+PATH_HANDLERS = {
+    "M": {
+        "length": 2,
+        "draw": False,
+        "path": poly_points_linear,
+    },
+    "L": {
+        "length": 2,
+        "path": poly_points_linear,
+    },
+    "H": {
+        "length": 1,
+        "path": poly_points_linear,
+    },
+    "V": {
+        "length": 1,
+        "path": poly_points_linear,
+    },
+    "Z": {
+        "length": 0,
+    },
+    "C": {
+        "length": 6,
+        "path": poly_points_cubic,
+        "bezier": True,
+    },
+    # "S": {
+    #     "length": 4,
+    #     "path": poly_points_cubic,
+    # },
+    "Q": {
+        "length": 4,
+        "path": poly_points_quadratic,
+        "bezier": True,
+    },
+    # "T": {
+    #     "length": 2,
+    #     "path": poly_points_quadratic,
+    # },
+    "A": {
+        "length": 7,
+        "path": poly_points_arc,
+    },
+}
+
+PATH_TOKEN_REGEX = re.compile(r"""
+(?P<number>[-+]?(?:[0-9]+\.?[0-9]*|\.[0-9]+)(?:[eE][-+]?[0-9]+)?)
+|(?P<command>[a-zA-Z])
+|(?P<error>[^\s,])
+""", re.X)
+
+
+
+def tokenize_path(text):
+    """
+    Yield `(command, values)` for each command in an SVG path `d`
+    attribute, where `values` is a float64 array.
+
+    Handles compact number forms like `1.5.5` and `1e-3-2`, and arc
+    flags written without separators. Raises `ValueError` on
+    unexpected characters.
+    """
+
+    command = None
+    values = []
+
+    for match in PATH_TOKEN_REGEX.finditer(text):
+        number = match.group("number")
+        if number is not None:
+            if command in ("A", "a") and len(values) % 7 in (3, 4):
+                # Arc flags are single digits and need no separator.
+                while (
+                        len(number) > 1 and number[0] in "01" and
+                        len(values) % 7 in (3, 4)
+                ):
+                    values.append(number[0])
+                    number = number[1:]
+            values.append(number)
+            continue
+
+        letter = match.group("command")
+        if letter is not None:
+            if command is not None:
+                yield command, np.array(values, dtype=float)
+            command = letter
+            values = []
+            continue
+
+        raise ValueError(
+            "Unexpected character %r at position %d in path data." % (
+                match.group(0), match.start()))
+
+    if command is not None:
+        yield command, np.array(values, dtype=float)
+
+
+
+def flatten_bezier_list(
+        bezier_list, step_dist=None, step_angle=None, step_min=None
+):
+    """
+    Linearize a list of Bézier control point lists, of any order, with
+    `flatten_bezier`. Return a list of the vertices of each.
+    """
+
+    by_order = defaultdict(list)
+    for b, control in enumerate(bezier_list):
+        by_order[len(control)].append(b)
+
+    vertex_lists = [None] * len(bezier_list)
+    for index_list in by_order.values():
+        (points, counts) = flatten_bezier(
+            [bezier_list[b] for b in index_list],
+            step_dist=step_dist, step_angle=step_angle, step_min=step_min)
+        points = points.tolist()
+        offset = 0
+        for b, count in zip(index_list, counts.tolist()):
+            vertex_lists[b] = points[offset:offset + count]
+            offset += count
+
+    return vertex_lists
 
 
+
+def expand_poly_list(poly_list, vertex_lists, offset=0):
+    """
+    Return `poly_list` with each Bézier index `i` replaced by the
+    vertices in `vertex_lists[offset + i]`.
+    """
+
+    result = []
+    for poly in poly_list:
+        flat = []
+        for item in poly:
+            if isinstance(item, int):
+                flat += vertex_lists[offset + item]
+            else:
+                flat.append(item)
+        result.append(flat)
+    return result
+
+
+
+def path_to_poly_items(
+        attrs, step_dist=None, step_angle=None, step_min=None
+):
+    """
+    Return `(poly_list, bezier_list)` for an SVG path before its Bézier
+    segments are linearized.
+
+    Bézier segments are represented in `poly_list` by their index in
+    `bezier_list` of control points, so that the segments of many paths
+    can be linearized together. See `expand_poly_list`.
+    """
+
     poly_list = [[]]
     cursor = [0, 0]
-    command_list = re.compile(" ([mlhvzcsqta])", re.I).split(path)[1:]
     step_options = {
         "step_dist": step_dist,
         "step_angle": step_angle,
         "step_min": step_min,
     }
 
-    for i in range(0, len(command_list), 2):
-        command = command_list[i]
+    bezier_list = []
+
+    tokens = tokenize_path(attrs["d"])
+    while True:
+        try:
+            (command, values) = next(tokens)
+        except StopIteration:
+            break
+        except ValueError as e:
+            LOG.error("Could not parse path data: %s", e)
+            break
+
         absolute = command == command.upper()
-        values = format_whitespace(command_list[i + 1]).split()
+        values = values.tolist()
 
         try:
-            handler = handlers[command.upper()]
+            handler = PATH_HANDLERS[command.upper()]
         except KeyError:
             LOG.error("No handler for path segment: %s %s",
                       command, values)
             break
 
-        try:
-            values = [float(v) for v in values]
-        except ValueError:
-            LOG.error("Could not convert all values to float: %s",
-                      values)
-            break
-
         if handler.get("draw", True) is False:
             if poly_list[-1]:
                 poly_list.append([])
 
-        while values:
-            segment = values[:handler["length"]]
-            values = values[handler["length"]:]
-            if "value" in handler:
-                segment = handler["value"](segment)
+        if "path" in handler:
+            for i in range(0, len(values), handler["length"]):
+                segment = values[i:i + handler["length"]]
+                if "value" in handler:
+                    segment = handler["value"](segment)
 
-            if not "path" in handler:
-                break
+                if handler.get("bezier", False):
+                    control = bezier_control_points(cursor, segment, absolute)
+                    poly_list[-1].append(len(bezier_list))
+                    bezier_list.append(control)
+                    cursor = list(control[-1])
+                    continue
 
-            vertex_list = handler["path"](
-                command, cursor, segment, absolute, **step_options)
+                vertex_list = handler["path"](
+                    command, cursor, segment, absolute, **step_options)
 
-            for vertex in vertex_list:
-                cursor = list(vertex)
-                poly_list[-1].append(cursor)
+                for vertex in vertex_list:
+                    cursor = list(vertex)
+                    poly_list[-1].append(cursor)
 
         if command.upper() == "Z":
+            if isinstance(poly_list[-1][0], int):
+                vertex_lists = flatten_bezier_list(
+                    bezier_list, **step_options)
+                poly_list = expand_poly_list(poly_list, vertex_lists)
+                bezier_list = []
             cursor = poly_list[-1][0]
             poly_list[-1].append(cursor)
 
+    return poly_list, bezier_list
+
+
+
+def path_to_poly_list(attrs, step_dist=None, step_angle=None, step_min=None):
+    step_options = {
+        "step_dist": step_dist,
+        "step_angle": step_angle,
+        "step_min": step_min,
+    }
+
+    (poly_list, bezier_list) = path_to_poly_items(attrs, **step_options)
+    poly_list = expand_poly_list(
+        poly_list, flatten_bezier_list(bezier_list, **step_options))
 
     poly_list = [[(v[0], v[1]) for v in poly] for poly in poly_list]
 
@@ -774,7 +994,7 @@ def extract_paths(
         node,
         xform=None, with_layers=None,
         step_dist=None, step_angle=None, step_min=None,
-        depth=None,
+        simplify=None, depth=None,
 ):
     if xform is None:
         xform = np.identity(3)
@@ -800,7 +1020,9 @@ def extract_paths(
     if node.name in path_handlers:
         poly_list = path_handlers[node.name](
             node.attrs, step_dist=step_dist, step_angle=step_angle, step_min=step_min)
-        poly_list = [transform_poly(poly, xform) for poly in poly_list]
+        poly_list = transform_poly_list(poly_list, xform)
+        if simplify:
+            poly_list = simplify_paths(poly_list, simplify)
         paths += poly_list
 
     elif node.name in ["svg", "g"]:
@@ -818,7 +1040,7 @@ def extract_paths(
                     child, xform=np.copy(xform),
                     with_layers=with_layers,
                     step_dist=step_dist, step_angle=step_angle,
-                    step_min=step_min,
+                    step_min=step_min, simplify=simplify,
                     depth=depth + 1)
         else:
             if label:
@@ -846,54 +1068,505 @@ def extract_paths(
 
 
 
-def svg2paths(
+def page_transform(width, height, viewbox, invert_y=True):
+    """
+    Return a matrix converting SVG user units to millimeters,
+    or `None` if the page dimensions are not all present.
+    """
+
+    if not (width and height and viewbox):
+        return None
+
+    width = text_to_mm(width)
+    height = text_to_mm(height)
+    viewbox = [float(v) for v in viewbox.split()]
+    unit_scale = [
+        width / viewbox[2],
+        height / viewbox[3]
+    ]
+
+    LOG.info("Page size (mm): %0.3f x %0.3f", width, height)
+    LOG.info("View box: %0.3f %0.3f %0.3f %0.3f", *viewbox)
+    LOG.info("Unit scale: %0.3f, %0.3f", *unit_scale)
+
+    if invert_y:
+        return np.array([
+            [unit_scale[0], 0, 0],
+            [0, -unit_scale[1], height],
+            [0, 0, 1]
+        ])
+
+    return np.array([
+        [unit_scale[0], 0, 0],
+        [0, unit_scale[1], 0],
+        [0, 0, 1]
+    ])
+
+
+
+def element_name(element):
+    """
+    Return the name of an lxml element as BeautifulSoup would report it,
+    ie. without namespace for SVG elements and with the document prefix
+    for foreign elements like `sodipodi:namedview`.
+    """
+
+    tag = element.tag
+    if tag[0] != "{":
+        return tag
+    (namespace, name) = tag[1:].split("}", 1)
+    if namespace == SVG_NS or not element.prefix:
+        return name
+    return f"{element.prefix}:{name}"
+
+
+
+def iterparse_svg(svg_file, chunk_size=None):
+    """
+    Yield `(event, element)` pairs for "start" and "end" events
+    while reading `svg_file` incrementally.
+
+    Closed elements are cleared as soon as the caller has handled their
+    "end" event, so memory use does not grow with document size.
+    """
+
+    from lxml import etree
+
+    if chunk_size is None:
+        chunk_size = STREAM_CHUNK_SIZE
+
+    parser = etree.XMLPullParser(
+        events=("start", "end"),
+        remove_comments=True, remove_pis=True, huge_tree=True)
+
+    def read_events():
+        for event, element in parser.read_events():
+            yield event, element
+            if event == "end":
+                element.clear()
+                while element.getprevious() is not None:
+                    del element.getparent()[0]
+
+    while True:
+        with profiling.stage("parse"):
+            chunk = svg_file.read(chunk_size)
+            if chunk:
+                parser.feed(chunk)
+        if not chunk:
+            break
+        yield from read_events()
+
+    with profiling.stage("parse"):
+        parser.close()
+    yield from read_events()
+
+
+
+PATH_ELEMENT_HANDLERS = {
+    "path": path_to_poly_list,
+    "circle": circle_to_poly_list,
+}
+
+# Number of streamed element and layer events converted together, and
+# sent to a worker process at once with `jobs`.
+CHUNK_SIZE = 64
+
+# Chunks submitted to the pool ahead of the one being read, per process.
+JOBS_PENDING = 2
+
+
+
+def iterparse_elements(svg_file, invert_y=True, with_layers=None):
+    """
+    Stream drawable elements from `svg_file` without building a
+    document tree.
+
+    Yields `("element", (name, attrs, xform))` for each visible
+    `<path>` or `<circle>`, where `xform` is its accumulated transform.
+    If `with_layers` is set, also yields `("layer", label)` when an
+    Inkscape layer opens and `("end", label)` when it closes.
+    """
+
+    path_handlers = PATH_ELEMENT_HANDLERS
+
+    # Stack of `(xform, walk, layer)` for each open element, where `walk`
+    # is true if children of the element are to be converted.
+    stack = []
+    done = False
+
+    for event, element in iterparse_svg(svg_file):
+        if done:
+            continue
+
+        if event == "end":
+            if not stack:
+                continue
+
+            (xform, walk, layer) = stack.pop()
+            name = element_name(element)
+
+            if name in path_handlers and (not stack or stack[-1][1]):
+                yield "element", (name, dict(element.attrib), xform)
+
+            if layer:
+                yield "end", element.get(INKSCAPE_LABEL, None)
+
+            if not stack:
+                done = True
+            continue
+
+        name = element_name(element)
+
+        if not stack:
+            if name != "svg":
+                continue
+            xform = page_transform(
+                element.get("width", None),
+                element.get("height", None),
+                element.get("viewBox", None),
+                invert_y=invert_y
+            )
+            if xform is None:
+                xform = np.identity(3)
+        else:
+            (xform, walk, _layer) = stack[-1]
+            if not walk:
+                stack.append((xform, False, False))
+                continue
+
+        if "transform" in element.attrib:
+            LOG.debug("transform raw: %s %s", name, element.get("transform"))
+            xform_ = parse_transform(element.get("transform"))
+            if xform_ is not None:
+                xform = xform @ xform_
+
+        if name in path_handlers:
+            stack.append((xform, False, False))
+
+        elif name in ["svg", "g"]:
+            label = element.get(INKSCAPE_LABEL, None)
+            groupmode = element.get(INKSCAPE_GROUPMODE, None)
+            style = element.get("style", "")
+
+            walk = "display:none" not in style
+            if label:
+                if walk:
+                    LOG.info(label)
+                else:
+                    LOG.debug(label)
+
+            layer = bool(with_layers and groupmode == "layer")
+            if layer:
+                yield "layer", label
+
+            stack.append((xform, walk, layer))
+
+        else:
+            if not (
+                    name.startswith("sodipodi") or
+                    name in ["metadata", "defs"]
+            ):
+                LOG.warning("Ignoring node: %s", name)
+            stack.append((xform, False, False))
+
+
+
+def convert_events(item):
+    """
+    Convert an `(event_list, step_options, simplify)` work item.
+
+    Return `event_list` with each `("element", (name, attrs, xform))`
+    replaced by `("paths", poly_list)` of its transformed polylines.
+    The Bézier segments of all path elements are linearized together.
+    """
+
+    (event_list, step_options, simplify) = item
+
+    element_list = []
+    bezier_list = []
+    with profiling.stage("flatten"):
+        for event, value in event_list:
+            if event != "element":
+                continue
+            (name, attrs, xform) = value
+            if name == "path":
+                (poly_list, path_bezier_list) = path_to_poly_items(
+                    attrs, **step_options)
+                element_list.append((poly_list, len(bezier_list), xform))
+                bezier_list += path_bezier_list
+            else:
+                poly_list = PATH_ELEMENT_HANDLERS[name](attrs, **step_options)
+                element_list.append((poly_list, None, xform))
+        vertex_lists = flatten_bezier_list(bezier_list, **step_options)
+
+    paths_list = []
+    for poly_list, offset, xform in element_list:
+        if offset is not None:
+            poly_list = expand_poly_list(poly_list, vertex_lists, offset)
+        with profiling.stage("transform"):
+            poly_list = transform_poly_list(poly_list, xform)
+        if simplify:
+            with profiling.stage("simplify"):
+                poly_list = simplify_paths(poly_list, simplify)
+        paths_list.append(poly_list)
+
+    paths_iter = iter(paths_list)
+    return [
+        ("paths", next(paths_iter)) if event == "element" else (event, value)
+        for event, value in event_list
+    ]
+
+
+
+def iterparse_paths(
         svg_file,
         invert_y=True, with_layers=None,
-        step_dist=None, step_angle=None, step_min=None
+        step_dist=None, step_angle=None, step_min=None,
+        simplify=None, jobs=None
 ):
+    """
+    Stream paths from `svg_file` without building a document tree.
+
+    Yields `("path", poly)` for each polyline in document order.
+    If `with_layers` is set, also yields `("layer", label)` when an
+    Inkscape layer opens and `("end", label)` when it closes.
+
+    If `jobs` is greater than 1, elements are linearized in a pool of
+    that many processes. Results are identical to serial conversion.
+    The file is read only a few chunks ahead of the paths yielded.
+
+    If `simplify` is set, polylines are simplified with that tolerance
+    in output units; see `simplify_mask`.
+
+    Produces the same paths as `extract_paths`.
+    """
+
+    step_options = {
+        "step_dist": step_dist,
+        "step_angle": step_angle,
+        "step_min": step_min,
+    }
+
+    def work_items():
+        event_list = []
+        for event, value in iterparse_elements(
+                svg_file, invert_y=invert_y, with_layers=with_layers):
+            if event == "element":
+                profiling.count("elements")
+            event_list.append((event, value))
+            if len(event_list) == CHUNK_SIZE:
+                yield event_list, step_options, simplify
+                event_list = []
+        if event_list:
+            yield event_list, step_options, simplify
+
+    def events(converted):
+        for event_list in converted:
+            for event, value in event_list:
+                if event == "paths":
+                    profiling.count_paths(value)
+                    for poly in value:
+                        yield "path", poly
+                else:
+                    yield event, value
+
+    def pool_results(pool):
+        # Items are read and submitted from this thread, only as far
+        # ahead of the results being read as `JOBS_PENDING` allows.
+        pending = deque()
+        for item in work_items():
+            pending.append(pool.apply_async(convert_events, (item, )))
+            if len(pending) > JOBS_PENDING * jobs:
+                yield pending.popleft().get()
+        while pending:
+            yield pending.popleft().get()
+
+    if jobs is not None and jobs < 1:
+        jobs = os.cpu_count()
+
+    if not jobs or jobs == 1:
+        yield from events(map(convert_events, work_items()))
+        return
+
+    import multiprocessing
+
+    LOG.info("Converting paths with %d processes.", jobs)
+    with multiprocessing.Pool(jobs) as pool:
+        yield from events(pool_results(pool))
+
+
+
+def iter_svg_paths(
+        svg_file,
+        invert_y=True,
+        step_dist=None, step_angle=None, step_min=None,
+        simplify=None, jobs=None, cache=None
+):
+    """
+    Yield polylines from `svg_file` one at a time in document order.
+
+    The file is read incrementally, so memory use does not depend on
+    the number of paths. See `iterparse_paths` for `jobs`.
+
+    If `cache` is a `PathCache`, polylines converted before from the
+    same content with the same options are loaded from it instead.
+    """
+
     LOG.info("Converting %s", svg_file.name)
 
-    svg_text = svg_file.read()
+    options = {
+        "invert_y": invert_y,
+        "with_layers": False,
+        "step_dist": step_dist,
+        "step_angle": step_angle,
+        "step_min": step_min,
+        "simplify": simplify,
+    }
+    if cache is not None:
+        (digest, svg_file) = content_digest(svg_file)
+        key = cache.key(digest, options)
+        pathset = cache.load(key)
+        if pathset is not None:
+            LOG.info("Loaded paths from cache.")
+            yield from pathset
+            return
+        path_list = []
+
+    for event, value in iterparse_paths(
+            svg_file,
+            invert_y=invert_y,
+            step_dist=step_dist, step_angle=step_angle, step_min=step_min,
+            simplify=simplify, jobs=jobs
+    ):
+        if event == "path":
+            if cache is not None:
+                path_list.append(value)
+            yield value
+
+    if cache is not None:
+        cache.store(key, PathSet.from_paths(path_list))
+
 
-    soup = BeautifulSoup(svg_text, "lxml")
+
+def svg2pathset(
+        svg_file,
+        invert_y=True,
+        step_dist=None, step_angle=None, step_min=None,
+        simplify=None, jobs=None, cache=None
+):
+    """
+    Return polylines from `svg_file` as a `PathSet`, with the labels of
+    enclosing Inkscape layers stored in its `layer` metadata.
+
+    See `iter_svg_paths` for `cache`.
+    """
+
+    LOG.info("Converting %s", svg_file.name)
+
+    options = {
+        "invert_y": invert_y,
+        "with_layers": True,
+        "step_dist": step_dist,
+        "step_angle": step_angle,
+        "step_min": step_min,
+        "simplify": simplify,
+    }
+    if cache is not None:
+        (digest, svg_file) = content_digest(svg_file)
+        key = cache.key(digest, options)
+        pathset = cache.load(key)
+        if pathset is not None:
+            LOG.info("Loaded paths from cache.")
+            return pathset
+
+    paths = []
+    layer_list = []
+    stack = []
+    for event, value in iterparse_paths(
+            svg_file,
+            invert_y=invert_y, with_layers=True,
+            step_dist=step_dist, step_angle=step_angle, step_min=step_min,
+            simplify=simplify, jobs=jobs
+    ):
+        if event == "path":
+            paths.append(value)
+            layer_list.append(tuple(stack))
+        elif event == "layer":
+            stack.append(value)
+        elif event == "end":
+            stack.pop()
+
+    pathset = PathSet.from_paths(paths, layer=layer_list)
+
+    if cache is not None:
+        cache.store(key, pathset)
+
+    return pathset
+
+
+
+def svg2paths(
+        svg_file,
+        invert_y=True, with_layers=None,
+        step_dist=None, step_angle=None, step_min=None,
+        simplify=None, stream=None, jobs=None
+):
+    """
+    Return a list of polylines from `svg_file` as (N, 2) arrays.
+
+    If `with_layers` is set, Inkscape layers are returned as dicts
+    of `label` and `paths`.
+
+    If `stream` is set, the file is read incrementally with an XML
+    pull parser instead of building a BeautifulSoup tree. Setting `jobs`
+    implies `stream`; see `iterparse_paths`.
+    """
+
+    LOG.info("Converting %s", svg_file.name)
+
+    if stream or jobs:
+        paths = []
+        stack = [paths]
+        for event, value in iterparse_paths(
+                svg_file,
+                invert_y=invert_y, with_layers=with_layers,
+                step_dist=step_dist, step_angle=step_angle,
+                step_min=step_min, simplify=simplify, jobs=jobs
+        ):
+            if event == "path":
+                stack[-1].append(value)
+            elif event == "layer":
+                layer = {
+                    "label": value,
+                    "paths": [],
+                }
+                stack[-1].append(layer)
+                stack.append(layer["paths"])
+            elif event == "end":
+                stack.pop()
+        return paths
+
+    from bs4 import BeautifulSoup
+
+    with profiling.stage("parse"):
+        svg_text = svg_file.read()
+        soup = BeautifulSoup(svg_text, "lxml")
 
     svg = soup.find("svg")
-    xform = None
-
-    width = svg.get("width", None)
-    height = svg.get("height", None)
-    viewbox = svg.get("viewbox", None)
-
-    if width and height and viewbox:
-        width = text_to_mm(width)
-        height = text_to_mm(height)
-        viewbox = [float(v) for v in viewbox.split()]
-        unit_scale = [
-            width / viewbox[2],
-            height / viewbox[3]
-        ]
-
-        LOG.info("Page size (mm): %0.3f x %0.3f", width, height)
-        LOG.info("View box: %0.3f %0.3f %0.3f %0.3f", *viewbox)
-        LOG.info("Unit scale: %0.3f, %0.3f", *unit_scale)
-
-        if invert_y:
-            xform = np.array([
-                [unit_scale[0], 0, 0],
-                [0, -unit_scale[1], height],
-                [0, 0, 1]
-            ])
-        else:
-            xform = np.array([
-                [unit_scale[0], 0, 0],
-                [0, unit_scale[1], 0],
-                [0, 0, 1]
-            ])
-
-    paths = extract_paths(
-        svg,
-        xform=xform, with_layers=with_layers,
-        step_dist=step_dist, step_angle=step_angle, step_min=step_min
+
+    xform = page_transform(
+        svg.get("width", None),
+        svg.get("height", None),
+        svg.get("viewbox", None),
+        invert_y=invert_y
     )
 
+    with profiling.stage("flatten"):
+        paths = extract_paths(
+            svg,
+            xform=xform, with_layers=with_layers,
+            step_dist=step_dist, step_angle=step_angle, step_min=step_min,
+            simplify=simplify
+        )
+
     return paths
@@ -12,11 +12,17 @@
 # along with this program.  If not, see <http://www.gnu.org/licenses/>.
 
 import logging
+from functools import lru_cache
+from collections import namedtuple
 
-import jsonschema
+import numpy as np
 
-from geotk.common import format_float
-from geotk.svg import svg2paths
+from geotk import profiling
+from geotk.output import ChunkWriter, format_floats, format_xy
+from geotk.svg import iter_svg_paths
+from geotk.geometry import PathSet, fit_arcs
+from geotk.order import order_paths
+from geotk.gcode import Moves, RAPID, LINEAR, summarize_moves
 
 
 
@@ -24,8 +30,12 @@ LOG = logging.getLogger("svg2gcode")
 
 DEFAULTS = {
     "linearization-target-angle": 5,
+    "arc-tolerance": 0.01,
+    "z-layer-order": "layer-first",
 }
 
+LAYER_ORDERS = ("layer-first", "path-first")
+
 CONF_SCHEMA = {
     "type": "object",
     "required": [
@@ -44,6 +54,30 @@ CONF_SCHEMA = {
             "minimum": 0,
             "exclusiveMinimum": True,
         },
+        "rapid-feedrate": {
+            "type": [
+                "number",
+                "null",
+            ],
+            "minimum": 0,
+            "exclusiveMinimum": True,
+        },
+        "z-feedrate": {
+            "type": [
+                "number",
+                "null",
+            ],
+            "minimum": 0,
+            "exclusiveMinimum": True,
+        },
+        "acceleration": {
+            "type": [
+                "number",
+                "null",
+            ],
+            "minimum": 0,
+            "exclusiveMinimum": True,
+        },
         "linearization-target-angle": {
             "type": [
                 "number",
@@ -91,6 +125,10 @@ CONF_SCHEMA = {
             "minimum": 0,
             "exclusiveMinimum": True,
         },
+        "z-layer-order": {
+            "type": "string",
+            "enum": list(LAYER_ORDERS),
+        },
         "z-material-thickness": {
             "type": [
                 "number",
@@ -105,17 +143,148 @@ CONF_SCHEMA = {
             ],
             "minimum": 0,
         },
+        "precision": {
+            "type": [
+                "integer",
+                "null",
+            ],
+            "minimum": 0,
+        },
+        "arcs": {
+            "type": "boolean",
+        },
+        "arc-tolerance": {
+            "type": "number",
+            "minimum": 0,
+            "exclusiveMinimum": True,
+        },
     }
 }
 
 
 
+@lru_cache(maxsize=None)
+def conf_validator():
+    """
+    Return a validator for `CONF_SCHEMA`, compiled on first use.
+    """
+
+    import jsonschema
+
+    jsonschema.Draft4Validator.check_schema(CONF_SCHEMA)
+    return jsonschema.Draft4Validator(CONF_SCHEMA)
+
+
+
+class GcodeConf(namedtuple("GcodeConf", [
+        "unit", "feedrate", "rapid_feedrate", "z_feedrate", "acceleration",
+        "z_dir", "z_start", "z_safe", "z_layer", "z_list", "layer_order",
+        "x_offset", "y_offset", "precision", "arc_tolerance",
+        "step_dist", "step_angle", "step_min",
+])):
+    """
+    A validated configuration with defaults resolved.
+
+    unit:        Output unit.
+    feedrate, rapid_feedrate, z_feedrate:
+                 In units per minute. Optional rates are `None` if unset.
+    acceleration:
+                 In units per second squared, or `None`.
+    z_dir:       Direction away from the work, 1 or -1.
+    z_start:     Z coordinate of the top of the material.
+    z_safe:      Z coordinate of safe height for travel.
+    z_layer:     Depth of each pass, or `None` for a single pass.
+    z_list:      Tuple of Z coordinates of each pass. See `depth_targets`.
+    layer_order: One of `LAYER_ORDERS`.
+    x_offset, y_offset:
+                 Added to path coordinates.
+    precision:   Number of decimal places, or `None` for full precision.
+    arc_tolerance:
+                 Tolerance for writing arcs, or `None` to write lines.
+    step_dist, step_angle, step_min:
+                 Linearization options for `svg2gcode`.
+
+    Validate a configuration once with `from_dict` and reuse the result
+    for any number of jobs.
+    """
+
+    __slots__ = ()
+
+
+    @classmethod
+    def from_dict(cls, conf):
+        """
+        Validate a configuration dict against `CONF_SCHEMA` and return a
+        `GcodeConf`. Raises `jsonschema.ValidationError` if invalid.
+        """
+
+        conf_validator().validate(conf)
+
+        z_dir = conf["z-safety-direction"]
+        z_start = (conf.get("z-base-coordinate", 0) +
+                   conf.get("z-material-thickness", 0) * z_dir)
+
+        arc_tolerance = None
+        if conf.get("arcs", False):
+            arc_tolerance = conf.get(
+                "arc-tolerance", DEFAULTS["arc-tolerance"])
+
+        return cls(
+            unit=conf["unit"],
+            feedrate=conf["feedrate"],
+            rapid_feedrate=conf.get("rapid-feedrate", None),
+            z_feedrate=conf.get("z-feedrate", None),
+            acceleration=conf.get("acceleration", None),
+            z_dir=z_dir,
+            z_start=z_start,
+            z_safe=z_start + conf.get("z-safety-distance", 0) * z_dir,
+            z_layer=conf.get("z-layer-depth", None),
+            z_list=tuple(depth_targets(conf)),
+            layer_order=conf.get(
+                "z-layer-order", DEFAULTS["z-layer-order"]),
+            x_offset=conf.get("x-offset", 0),
+            y_offset=conf.get("y-offset", 0),
+            precision=conf.get("precision", None),
+            arc_tolerance=arc_tolerance,
+            # The target angle has always set the target distance too.
+            step_dist=conf.get("linearization-target-angle", None),
+            step_angle=conf.get(
+                "linearization-target-angle",
+                DEFAULTS["linearization-target-angle"]),
+            step_min=conf.get("linearization-min-dist", None),
+        )
+
+
+    def summary_conf(self):
+        """Return the configuration dict used by `summarize_moves`."""
+
+        return {
+            "rapid-feedrate": self.rapid_feedrate,
+            "z-feedrate": self.z_feedrate,
+            "acceleration": self.acceleration,
+            "z-safety-direction": self.z_dir,
+        }
+
+
+
+def resolve_conf(conf):
+    """
+    Return `conf` if it is a `GcodeConf`, otherwise validate it as a
+    configuration dict and return its `GcodeConf`.
+    """
+
+    if isinstance(conf, GcodeConf):
+        return conf
+    return GcodeConf.from_dict(conf)
+
+
+
 def format_gcode(d):
     command = []
     for k, v in d.items():
         param = k
         if v is not None:
-            param += format_float(v)
+            param += format_floats([v], fixed=True)[0]
         command.append(param)
     return " ".join(command)
 
@@ -135,96 +304,332 @@ def sign(v):
 
 
 
-def write_paths_gcode(out, paths, conf):
+def format_arc_moves(path, xy_list, tolerance, precision=None):
     """
-    Vertex numbers start from 1.
+    Return G-code moves along `path` after its first vertex, using `G2`
+    and `G3` arcs where they fit within `tolerance`.
+
+    `xy_list` holds the formatted `"{x} Y{y}"` of each vertex.
     """
 
-    jsonschema.validate(conf, CONF_SCHEMA)
+    moves = fit_arcs(path, tolerance)
+
+    start = [0] + [end for end, _center, _clockwise in moves[:-1]]
+    arc_index = [i for i, move in enumerate(moves) if move[1] is not None]
+    ij_list = format_xy(
+        [moves[i][1] - path[start[i]] for i in arc_index],
+        sep=" J", precision=precision, fixed=True)
+    ij_map = dict(zip(arc_index, ij_list))
+
+    line_list = []
+    for i, (end, center, clockwise) in enumerate(moves):
+        if center is None:
+            line_list.append("G1 X" + xy_list[end] + "\n")
+        else:
+            line_list.append("%s X%s I%s\n" % (
+                "G2" if clockwise else "G3", xy_list[end], ij_map[i]))
+
+    return "".join(line_list)
+
+
+
+def depth_targets(conf):
+    """
+    Return the Z coordinates of each milling pass, from the first to the
+    deepest.
+    """
 
     z_dir = conf.get("z-safety-direction", None)
     z_layer = conf.get("z-layer-depth", None)
     z_base = conf.get("z-base-coordinate", 0)
     z_thickness = (conf.get("z-material-thickness", 0) +
                    conf.get("z-mill-wasteboard-distance", 0))
-
     z_start = z_base + conf.get("z-material-thickness", 0) * z_dir
-    z_safe = z_start + conf.get("z-safety-distance", 0) * z_dir
 
-    x_offset = conf.get("x-offset", 0)
-    y_offset = conf.get("y-offset", 0)
+    if z_layer is None:
+        return [z_start]
 
-    write_gcode(out, {
-        "G90": None
-    })
-    write_gcode(out, {
-        "F": conf["feedrate"]
-    })
-    write_gcode(out, {
-        "G0": None,
-        "Z": z_safe
-    })
-
-    z_target = z_start
+    z_list = []
     max_depth = 0
     while True:
-        if z_layer is not None:
-            max_depth += z_layer
-            z_target = z_start - min(z_thickness, max_depth) * z_dir
+        max_depth += z_layer
+        z_list.append(z_start - min(z_thickness, max_depth) * z_dir)
+        if max_depth >= z_thickness:
+            break
+    return z_list
 
-        for path in paths:
-            if not path:
-                continue
 
 
-            for v, vertex in enumerate(path):
-                if v == 1:
-                    write_gcode(out, {
-                        "G1": None,
-                        "Z": z_target,
-                    })
+def plan_moves(paths, conf):
+    """
+    Return the `Moves` that `write_paths_gcode` writes for `paths`,
+    following each path as a polyline even where it is written as arcs.
+
+    `conf` is a `GcodeConf` or a configuration dict.
+    """
+
+    conf = resolve_conf(conf)
+    z_safe = conf.z_safe
+    z_list = conf.z_list
+    layer_order = conf.layer_order
+
+    offset = np.array([conf.x_offset, conf.y_offset], dtype=float)
+    path_list = [np.asarray(path, dtype=float)[:, :2] + offset
+                 for path in paths if len(path)]
+
+    # The first move goes to safe height from an unknown position.
+    points = [[np.nan, np.nan, np.nan], [np.nan, np.nan, z_safe]]
+    feedrate = conf.feedrate
+    if not path_list:
+        return Moves(points, [RAPID], [feedrate])
+
+    coords = np.concatenate(path_list)
+    lengths = np.array([len(v) for v in path_list])
+    offsets = np.concatenate([[0], np.cumsum(lengths)])
+    path_start = coords[offsets[:-1]]
+    path_end = coords[offsets[1:] - 1]
+    cutting = lengths > 1
+    closed = (lengths > 2) & np.all(path_start == path_end, axis=1)
+
+    # Cut each path at each depth, as units ordered path by path or
+    # depth by depth.
+    (count, passes) = (len(path_list), len(z_list))
+    path_first = layer_order == "path-first"
+    if path_first:
+        unit_path = np.repeat(np.arange(count), passes)
+        unit_pass = np.tile(np.arange(passes), count)
+    else:
+        unit_path = np.tile(np.arange(count), passes)
+        unit_pass = np.repeat(np.arange(passes), count)
+
+    unit_length = np.where(cutting, lengths, 0)[unit_path]
+    unit_end = np.cumsum(unit_length)
+    unit_start = unit_end - unit_length
+    index = (np.repeat(offsets[:-1][unit_path] - unit_start, unit_length) +
+             np.arange(unit_end[-1]))
+
+    xy = coords[index]
+    z_row = np.repeat(np.asarray(z_list, dtype=float)[unit_pass],
+                      unit_length)
+    rapid = np.zeros(len(xy), dtype=bool)
+
+    # Enter each unit rapidly at safe height and retract after it.
+    # Path-first units only do so at the first and last depth, except
+    # that open paths go back to their start in between.
+    if path_first:
+        enter = unit_pass == 0
+        leave = unit_pass == passes - 1
+        again = (unit_pass > 0) & cutting[unit_path] & ~closed[unit_path]
+    else:
+        enter = leave = np.ones(len(unit_path), dtype=bool)
+        again = ~enter
+
+    # Rows at safe height, in order of unit and then of step: leaving an
+    # open path to go back, entering, and leaving after the last depth.
+    insert = []
+    for step, (mask, position, point, is_rapid) in enumerate([
+            (again, unit_start, path_end, False),
+            (enter | again, unit_start, path_start, True),
+            (leave, unit_end, path_end, False),
+    ]):
+        unit = np.flatnonzero(mask)
+        insert.append((unit, np.full(len(unit), step), position[unit],
+                       point[unit_path[unit]], np.full(len(unit), is_rapid)))
+    (unit, step, position, point, is_rapid) = [
+        np.concatenate(v) for v in zip(*insert)]
+    order = np.lexsort((step, unit))
+
+    xy = np.insert(xy, position[order], point[order], axis=0)
+    z_row = np.insert(z_row, position[order], z_safe)
+    rapid = np.insert(rapid, position[order], is_rapid[order])
+
+    points = np.concatenate([points, np.column_stack([xy, z_row])])
+    kind = np.concatenate([[RAPID], np.where(rapid, RAPID, LINEAR)])
+    feed = np.full(len(kind), feedrate, dtype=float)
+
+    return Moves(points, kind, feed)
+
+
+
+def write_paths_gcode(out, paths, conf, summary=False):
+    """
+    Vertex numbers start from 1.
+
+    With `arcs` in `conf`, runs of vertices lying on a circle within
+    `arc-tolerance` are written as `G2`/`G3` arcs.
 
-                cmd = "G1" if v else "G0"
-                write_gcode(out, {
-                    cmd: None,
-                    "X": vertex[0] + x_offset,
-                    "Y": vertex[1] + y_offset,
-                })
+    `paths` may be a `PathSet` or any iterable of polylines. It is
+    consumed lazily in a single pass unless `z-layer-depth` requires
+    several passes, in which case each path's moves are formatted once
+    and kept for every pass.
 
-            write_gcode(out, {
-                "G1": None,
-                "Z": z_safe,
-            })
+    With several passes, `z-layer-order` is either "layer-first", cutting
+    every path at one depth before the next, or "path-first", cutting
+    each path to full depth before moving on. Closed paths are then
+    lowered to the next depth without retracting.
 
-        if z_layer is None or max_depth >= z_thickness:
-            break
+    `conf` is a `GcodeConf`, or a configuration dict which is validated
+    on each call.
+
+    With several passes and `INFO` logging, the machining time of each
+    `LAYER_ORDERS` value is estimated and logged. With `summary`, the
+    `summarize_moves` dict of the written moves is returned.
+    """
+
+    conf = resolve_conf(conf)
+    z_layer = conf.z_layer
+    layer_order = conf.layer_order
+    z_safe = conf.z_safe
+    z_list = conf.z_list
+
+    offset = np.array([conf.x_offset, conf.y_offset], dtype=float)
+    precision = conf.precision
+    arc_tolerance = conf.arc_tolerance
+
+
+    def format_blocks(paths):
+        """Yield `(entry, moves, closed)` for each non-empty path."""
+
+        for path in paths:
+            if not len(path):
+                continue
+
+            path = np.asarray(path, dtype=float)[:, :2] + offset
+            xy_list = format_xy(
+                path, sep=" Y", precision=precision, fixed=True)
+
+            entry = "G0 X" + xy_list[0] + "\n"
+            if len(xy_list) == 1:
+                moves = ""
+            elif arc_tolerance is None:
+                moves = "G1 X" + "\nG1 X".join(xy_list[1:]) + "\n"
+            else:
+                moves = format_arc_moves(
+                    path, xy_list, arc_tolerance, precision=precision)
+            closed = len(xy_list) > 2 and xy_list[0] == xy_list[-1]
+
+            yield entry, moves, closed
+
+
+    estimate = z_layer is not None and LOG.isEnabledFor(logging.INFO)
+    if (estimate or summary) and \
+            not isinstance(paths, (list, tuple, PathSet)):
+        paths = list(paths)
+
+    result = None
+    if estimate:
+        for order in LAYER_ORDERS:
+            with profiling.stage("estimate"):
+                order_summary = summarize_moves(
+                    plan_moves(paths, conf._replace(layer_order=order)),
+                    conf.summary_conf())
+            LOG.info("Estimated %s machining time: %0.1f minutes.",
+                     order, order_summary["time"] / 60)
+            if summary and order == layer_order:
+                result = order_summary
+    if summary and result is None:
+        with profiling.stage("summary"):
+            result = summarize_moves(
+                plan_moves(paths, conf), conf.summary_conf())
+
+    blocks = format_blocks(paths)
+    if len(z_list) > 1:
+        blocks = list(blocks)
+
+    chunk = ChunkWriter(out)
+
+    write_gcode(chunk, {
+        "G90": None
+    })
+    write_gcode(chunk, {
+        "F": conf.feedrate
+    })
+    write_gcode(chunk, {
+        "G0": None,
+        "Z": z_safe
+    })
+
+    z_safe_line = format_gcode({"G1": None, "Z": z_safe}) + "\n"
+    z_line_list = [
+        format_gcode({"G1": None, "Z": z_target}) + "\n"
+        for z_target in z_list
+    ]
+
+    if layer_order == "path-first":
+        for entry, moves, closed in blocks:
+            chunk.write(entry)
+            for i, z_target_line in enumerate(z_line_list):
+                if moves:
+                    if i and not closed:
+                        chunk.write(z_safe_line)
+                        chunk.write(entry)
+                    chunk.write(z_target_line)
+                    chunk.write(moves)
+            chunk.write(z_safe_line)
+    else:
+        for z_target_line in z_line_list:
+            for entry, moves, _closed in blocks:
+                chunk.write(entry)
+                if moves:
+                    chunk.write(z_target_line)
+                    chunk.write(moves)
+                chunk.write(z_safe_line)
+
+    chunk.flush()
+
+    return result
 
 
 
 def svg2gcode(
         out, svg_file, conf,
-        step_dist=None, step_angle=None, step_min=None
+        step_dist=None, step_angle=None, step_min=None,
+        simplify=None, jobs=None, order=None, summary=False, cache=None
 ):
     """
     Write paths in GCODE format.
 
-    out:  Stream object to write to.
+    out:   Stream object to write to.
+    conf:  `GcodeConf`, or a configuration dict.
+    simplify:
+           Tolerance for simplifying paths, in mm.
+    jobs:  Number of processes for linearizing paths.
+    order: Path ordering method from `ORDER_METHODS` to reduce travel.
+           Defaults to document order.
+    summary:
+           Return the `summarize_moves` dict of the job.
+    cache: `PathCache` for converted paths.
 
     Use millimeters for output unit.
     """
 
+    conf = resolve_conf(conf)
+
     if step_dist is None:
-        step_dist = conf.get("linearization-target-angle", None)
+        step_dist = conf.step_dist
 
     if step_angle is None:
-        step_angle = conf.get("linearization-target-angle",
-                              DEFAULTS["linearization-target-angle"])
+        step_angle = conf.step_angle
 
     if step_min is None:
-        step_min = conf.get("linearization-min-dist", None)
+        step_min = conf.step_min
 
-    paths = svg2paths(
+    paths = iter_svg_paths(
         svg_file,
         step_dist=step_dist, step_angle=step_angle, step_min=step_min,
+        simplify=simplify, jobs=jobs, cache=cache
     )
-    write_paths_gcode(out, paths, conf)
+
+    if order is not None and order != "document":
+        # Travel starts from the machine origin.
+        origin = (-conf.x_offset, -conf.y_offset)
+        with profiling.stage("order"):
+            (paths, travel_before, travel_after) = order_paths(
+                paths, method=order, origin=origin)
+        LOG.info("Ordered paths to reduce travel from %0.1f to %0.1f %s.",
+                 travel_before, travel_after, conf.unit)
+
+    with profiling.stage("write"):
+        result = write_paths_gcode(out, paths, conf, summary=summary)
+
+    return result
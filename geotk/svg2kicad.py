@@ -14,8 +14,12 @@
 import logging
 from collections import defaultdict
 
-from geotk.svg import svg2paths
-from geotk.kicad2svg import REGEX, parse_trace
+import numpy as np
+
+from geotk import profiling
+from geotk.svg import svg2pathset
+from geotk.geometry import PathSet
+from geotk.kicad2svg import load_board
 
 
 
@@ -29,6 +33,9 @@ def replace_kicad_traces(
         out, kicad_src_file, layers_paths, width=None, layer=None, net=None):
     """
     Vertex numbers start from 1.
+
+    `layers_paths` is either a `PathSet` whose polylines are two layers
+    deep, or the nested list returned by `svg2paths(with_layers=True)`.
     """
 
     if width is None:
@@ -36,22 +43,32 @@ def replace_kicad_traces(
 
     layer_net_path = defaultdict(lambda: defaultdict(list))
 
+    if isinstance(layers_paths, PathSet):
+        for path, path_layer in zip(layers_paths, layers_paths.layer):
+            if not path_layer:
+                LOG.warning("Ignoring path in SVG root.")
+                continue
+            if len(path_layer) == 1:
+                LOG.warning("Ignoring path outside of net layer.")
+                continue
+            if len(path_layer) > 2:
+                LOG.warning("Ignoring non-path inside net layer.")
+                continue
+            layer_net_path[path_layer[0]][path_layer[1]].append(path)
+        layers_paths = []
+
     for layer_item in layers_paths:
-        if isinstance(layer_item, list):
-            LOG.warning("Ignoring path in SVG root.")
-            continue
         if not isinstance(layer_item, dict):
+            LOG.warning("Ignoring path in SVG root.")
             continue
 
         for net_item in layer_item["paths"]:
-            if isinstance(net_item, list):
-                LOG.warning("Ignoring path outside of net layer.")
-                continue
             if not isinstance(net_item, dict):
+                LOG.warning("Ignoring path outside of net layer.")
                 continue
 
             for path in net_item["paths"]:
-                if not isinstance(path, list):
+                if isinstance(path, dict):
                     LOG.warning("Ignoring non-path inside net layer.")
                     continue
                 layer_net_path[layer_item["label"]][net_item["label"]].append(
@@ -68,15 +85,20 @@ def replace_kicad_traces(
                 if net is not None and net_name != str(net):
                     continue
 
+                suffix = (f")         (width {width}) "
+                          f"(layer {layer_name}) (net {net_name}))\n")
                 for path in path_list:
-                    last = []
-                    for vertex in path:
-                        if last:
-                            out.write(f"""\
-        (segment (start {vertex[0]:0.3f} {vertex[1]:0.3f}) \
-        (end {last[0]:0.3f} {last[1]:0.3f}) \
-        (width {width}) (layer {layer_name}) (net {net_name}))\n""")
-                        last = vertex
+                    if len(path) < 2:
+                        continue
+                    point_list = [
+                        "%0.3f %0.3f" % (x, y)
+                        for (x, y) in np.asarray(path)[:, :2].tolist()
+                    ]
+                    out.write("".join([
+                        f"        (segment (start {start})         (end {end}"
+                        + suffix
+                        for start, end in zip(point_list[1:], point_list)
+                    ]))
 
                 if path_list:
                     written_layers_nets.append((layer_name, net_name))
@@ -84,41 +106,60 @@ def replace_kicad_traces(
         return written_layers_nets
 
 
-    written_layers_nets = None
-    for line in kicad_src_file.read().split("\n"):
-        match_trace = REGEX["trace"].match(line)
-
-        if match_trace:
-            if written_layers_nets is None:
-                written_layers_nets = write_segments()
+    board = load_board(kicad_src_file.read())
+    text = board.text + "\n"
 
-            trace = parse_trace(line)
+    if board.segment_nodes:
+        (insert, _end) = board.node_line_span(board.segment_nodes[0])
+    else:
+        # No traces yet: add them just before the closing parenthesis.
+        insert = text.rfind(")")
+        if insert == -1:
+            insert = len(text)
+        line_start = text.rfind("\n", 0, insert) + 1
+        if not text[line_start:insert].strip():
+            insert = line_start
 
-            if (trace["layer"], str(trace["net"])) in written_layers_nets:
-                continue
+    out.write(text[:insert])
+    written_layers_nets = write_segments()
 
-        out.write(line + "\n")
+    position = insert
+    for trace, n in zip(board.segments, board.segment_nodes):
+        if (trace["layer"], str(trace["net"])) not in written_layers_nets:
+            continue
+        (start, end) = board.node_line_span(n)
+        out.write(text[position:start])
+        position = end
+    out.write(text[position:])
 
 
 
 def svg2kicad(
         out, svg_file, kicad_src_file,
         width=None, layer=None, net=None,
-        step_dist=None, step_angle=None, step_min=None
+        step_dist=None, step_angle=None, step_min=None,
+        simplify=None, jobs=None, cache=None
 ):
     """
     Replace traces in KiCad source file with paths from SVG file.
 
     out:  Stream object to write to.
+    simplify:
+          Tolerance for simplifying paths, in mm.
+    jobs: Number of processes for linearizing paths.
+    cache:
+          `PathCache` for converted paths.
 
     Use millimeters for output unit.
     """
 
-    layers_paths = svg2paths(
+    layers_paths = svg2pathset(
         svg_file,
-        invert_y=False, with_layers=True,
+        invert_y=False,
         step_dist=step_dist, step_angle=step_angle,
-        step_min=step_min
+        step_min=step_min, simplify=simplify, jobs=jobs, cache=cache
     )
-    replace_kicad_traces(
-        out, kicad_src_file, layers_paths, width=width, layer=layer, net=net)
+    with profiling.stage("write"):
+        replace_kicad_traces(
+            out, kicad_src_file, layers_paths,
+            width=width, layer=layer, net=net)
@@ -13,8 +13,10 @@
 
 import logging
 
-from geotk.common import format_float
-from geotk.svg import svg2paths
+from geotk import profiling
+from geotk.output import ChunkWriter, format_xy
+from geotk.svg import iter_svg_paths
+from geotk.geometry import PointIndex
 
 
 
@@ -22,49 +24,109 @@ LOG = logging.getLogger("svg2obj")
 
 
 
-def write_obj(out, paths):
+def write_obj(out, paths, weld=None, precision=None):
     """
     Vertex numbers start from 1.
+
+    `paths` may be a `PathSet` or any iterable of polylines. Vertices
+    are written as each path is consumed and only the vertex range of
+    each face is kept until the faces are written.
+
+    If `weld` is not `None`, vertices within `weld` distance of an
+    earlier vertex are written once and shared between faces.
+    """
+
+    if weld is not None:
+        write_obj_welded(out, paths, weld, precision=precision)
+        return
+
+    vertex_count = 0
+    face_list = []
+
+    with ChunkWriter(out) as chunk:
+        chunk.write("g\n")
+        for path in paths:
+            start = vertex_count + 1
+            xy_list = format_xy(path, precision=precision)
+            if xy_list:
+                chunk.write("v " + " 0\nv ".join(xy_list) + " 0\n")
+            vertex_count += len(xy_list)
+            face_list.append((start, vertex_count + 1))
+        for (start, end) in face_list:
+            chunk.write("f " + " ".join(map(str, range(start, end))) + "\n")
+
+    LOG.info("Wrote %d vertices and %d faces.",
+             vertex_count, len(face_list))
+
+
+
+def write_obj_welded(out, paths, tolerance, precision=None):
+    """
+    Write paths in OBJ format, merging vertices closer than `tolerance`.
+    Only consecutive vertices that merge into one are collapsed. A face
+    that returns to an earlier vertex, such as where it closes, still
+    lists that vertex again.
     """
 
-    vertex_list = []
+    point_index = PointIndex(tolerance)
+    input_count = 0
     face_list = []
 
-    for path in paths:
-        face = []
-        for vertex in path:
-            vertex_list.append(vertex)
-            v = len(vertex_list)
-            face.append(v)
-        face_list.append(face)
-
-    out.write("g\n")
-    for vertex in vertex_list:
-        out.write(f"v {format_float(vertex[0])} {format_float(vertex[1])} 0\n")
-    for face in face_list:
-        out.write("f ")
-        out.write(" ".join([str(v) for v in face]))
-        out.write("\n")
+    with ChunkWriter(out) as chunk:
+        chunk.write("g\n")
+        for path in paths:
+            face = []
+            count = len(point_index)
+            for vertex in path:
+                input_count += 1
+                index = point_index.add(vertex) + 1
+                if not face or face[-1] != index:
+                    face.append(index)
+            xy_list = format_xy(point_index.points[count:],
+                                precision=precision)
+            if xy_list:
+                chunk.write("v " + " 0\nv ".join(xy_list) + " 0\n")
+            face_list.append(face)
+        for face in face_list:
+            chunk.write("f " + " ".join(map(str, face)) + "\n")
+
+    vertex_count = len(point_index)
     LOG.info("Wrote %d vertices and %d faces.",
-             len(vertex_list), len(face_list))
+             vertex_count, len(face_list))
+    if input_count:
+        LOG.info("Welding saved %d of %d vertices (%0.1f%%).",
+                 input_count - vertex_count, input_count,
+                 100 * (input_count - vertex_count) / input_count)
 
 
 
 def svg2obj(
         out, svg_file,
-        step_dist=None, step_angle=None, step_min=None
+        step_dist=None, step_angle=None, step_min=None,
+        simplify=None, jobs=None, weld=None, precision=None, cache=None
 ):
     """
     Write paths in OBJ format.
 
     out:  Stream object to write to.
+    simplify:
+          Tolerance for simplifying paths, in mm.
+    jobs: Number of processes for linearizing paths.
+    weld: Merge vertices closer than this distance. Use 0 to merge
+          identical vertices only.
+    precision:
+          Number of decimal places for coordinates, or `None` for full
+          precision.
+    cache:
+          `PathCache` for converted paths.
 
     Use millimeters for output unit.
     """
 
-    paths = svg2paths(
+    paths = iter_svg_paths(
         svg_file,
         step_dist=step_dist, step_angle=step_angle,
-        step_min=step_min
+        step_min=step_min, simplify=simplify, jobs=jobs, cache=cache
     )
-    write_obj(out, paths)
+    with profiling.stage("write"):
+        write_obj(out, paths, weld=weld, precision=precision)
@@ -36,10 +36,10 @@ setuptools.setup(
         "License :: OSI Approved :: GNU General Public License v3 (GPLv3)",
         "Operating System :: OS Independent",
     ],
-    install_requires=["beautifulsoup4", "jsonschema", "lxml", "numpy"],
+    install_requires=["beautifulsoup4", "jsonschema", "lxml", "numpy>=1.20"],
     python_requires='>=3',
     scripts=["scripts/obj2svg", "scripts/svg2obj",
-             "scripts/svg2gcode",
+             "scripts/svg2gcode", "scripts/svg2gcode-batch",
              "scripts/kicad2svg", "scripts/svg2kicad", ],
     setup_requires=["pytest-runner"],
     tests_require=["pytest", "tox", "coverage", "pytest-cov"],
@@ -0,0 +1,90 @@
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this program.  If not, see <http://www.gnu.org/licenses/>.
+
+import re
+import sys
+from pathlib import Path
+from subprocess import Popen, PIPE
+
+import pytest
+
+
+PROJECT_PATH = Path(__file__).parent.resolve()
+
+sys.path.append(PROJECT_PATH)
+
+
+
+SCRIPT_PATH = PROJECT_PATH.parent / "scripts"
+
+SCRIPT_NAMES = ("obj2svg", "svg2obj", "svg2gcode", "kicad2svg", "svg2kicad")
+
+# Modules only needed once a conversion starts.
+HEAVY_MODULES = ("numpy", "bs4", "jsonschema", "lxml", "multiprocessing")
+
+# Microseconds spent importing `geotk` modules for `--version`. Generous
+# enough to include compiling them without cached bytecode.
+SCRIPT_IMPORT_BUDGET = 50000
+
+REGEX = {
+    "importtime": re.compile(
+        r"^import time:\s+(\d+) \|\s+(\d+) \|( *)(\S+)$", re.M),
+}
+
+
+
+def import_times(cmd):
+    """
+    Return a dict of cumulative import time in microseconds for each
+    top-level module imported by `cmd`, as reported by `-X importtime`.
+    """
+
+    process = Popen(
+        [sys.executable, "-X", "importtime"] + cmd,
+        stdout=PIPE, stderr=PIPE)
+    (_out, err) = process.communicate()
+    assert not process.returncode
+
+    result = {}
+    for (_self, cumulative, indent, name) in REGEX["importtime"].findall(
+            err.decode("utf-8")):
+        if len(indent) == 1:
+            result[name] = int(cumulative)
+    return result
+
+
+
+@pytest.mark.parametrize("name", SCRIPT_NAMES)
+def test_script_version(name):
+    times = import_times([str(SCRIPT_PATH / name), "--version"])
+
+    assert not [v for v in times if v.split(".")[0] in HEAVY_MODULES]
+
+    geotk_time = sum(v for k, v in times.items() if k.startswith("geotk"))
+    assert geotk_time < SCRIPT_IMPORT_BUDGET
+
+
+
+@pytest.mark.parametrize("module", [
+    "geotk.svg2gcode",
+    "geotk.svg2obj",
+    "geotk.svg2kicad",
+    "geotk.kicad2svg",
+    "geotk.obj2svg",
+])
+def test_module_lazy_imports(module):
+    """Only the converters' rarely used paths need these modules."""
+
+    times = import_times(["-c", f"import {module}"])
+    for name in ("bs4", "jsonschema", "multiprocessing"):
+        assert name not in times
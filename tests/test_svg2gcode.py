@@ -11,10 +11,15 @@
 # You should have received a copy of the GNU General Public License
 # along with this program.  If not, see <http://www.gnu.org/licenses/>.
 
+import io
 import sys
 import json
+import re
+import math
 from pathlib import Path
 
+import pytest
+
 sys.path.append("../")
 
 from geotk.svg2gcode import svg2gcode
@@ -25,6 +30,14 @@ from conftest import get_test_case, api_compare, cli_compare
 
 TEST_PATH = Path(__file__).parent.resolve()
 
+REGEX = {
+    "exponent": re.compile(r"\d[eE]"),
+}
+
+# Largest difference between the start and end radius of an arc that
+# G-code controllers accept, in mm.
+ARC_RADIUS_ERROR = 0.002
+
 
 
 def test_api(svg2gcode_case_name):
@@ -53,3 +66,73 @@ def test_cli(svg2gcode_case_name):
         svg_path,
         "__result_path__",
     ])
+
+
+
+def parse_moves(text):
+    """Return `(command, params)` for each line of G-code."""
+
+    move_list = []
+    for line in text.splitlines():
+        (command, *words) = line.split()
+        move_list.append((command, {v[0]: float(v[1:]) for v in words}))
+    return move_list
+
+
+
+def test_api_arcs(svg2gcode_case_name):
+    (conf_path, svg_path, gcode_known_path) = get_test_case(
+        "svg2gcode", svg2gcode_case_name)
+
+    with open(conf_path) as fp:
+        conf = json.load(fp)
+    conf["arcs"] = True
+    tolerance = 0.01
+
+    out = io.StringIO()
+    with open(svg_path) as fp:
+        svg2gcode(out, fp, conf)
+    with open(gcode_known_path) as fp:
+        known = parse_moves(fp.read())
+    result = parse_moves(out.getvalue())
+
+    # Numbers are written in fixed point, as G-code has no exponents.
+    assert not REGEX["exponent"].search(out.getvalue())
+
+    # Arcs replace runs of `G1` moves, keeping their end points.
+    assert len(result) <= len(known)
+    known_iter = iter(known)
+    position = None
+    for command, param in result:
+        arc_points = []
+        for known_command, known_param in known_iter:
+            if command in ("G2", "G3"):
+                if known_command == "G1" and "X" in known_param:
+                    arc_points.append((known_param["X"], known_param["Y"]))
+                    if arc_points[-1] == (param["X"], param["Y"]):
+                        break
+            elif (known_command, known_param) == (command, param):
+                break
+        else:
+            assert False, (command, param)
+
+        if arc_points:
+            # The replaced vertices lie on the circle and turn about its
+            # center clockwise for `G2` and anticlockwise for `G3`.
+            center = (position[0] + param["I"], position[1] + param["J"])
+            radius = math.dist(position, center)
+            assert abs(math.dist((param["X"], param["Y"]), center) -
+                       radius) <= ARC_RADIUS_ERROR
+            direction = -1 if command == "G2" else 1
+            previous = position
+            for point in arc_points:
+                assert math.dist(point, center) == pytest.approx(
+                    radius, abs=2 * tolerance)
+                cross = (
+                    (previous[0] - center[0]) * (point[1] - center[1]) -
+                    (previous[1] - center[1]) * (point[0] - center[0]))
+                assert cross * direction > 0, (command, param, point)
+                previous = point
+
+        if "X" in param:
+            position = (param["X"], param["Y"])
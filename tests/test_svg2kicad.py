@@ -11,6 +11,7 @@
 # You should have received a copy of the GNU General Public License
 # along with this program.  If not, see <http://www.gnu.org/licenses/>.
 
+import io
 import sys
 from pathlib import Path
 
@@ -51,3 +52,22 @@ def test_cli(svg2kicad_case_name):
         "--distance-step", "30",
         "--angle-step", "15",
     ])
+
+
+
+def test_api_multiline(svg2kicad_case_name):
+    """Segments split over several lines are replaced like single lines."""
+
+    (svg_path, kicad_src_path, kicad_known_path) = get_test_case(
+        "svg2kicad", svg2kicad_case_name)
+
+    kicad_src_text = Path(kicad_src_path).read_text().replace(
+        " (end ", "\n    (end ")
+
+    out = io.StringIO()
+    with open(svg_path) as svg_file:
+        svg2kicad(out, svg_file, io.StringIO(kicad_src_text),
+                  step_dist=30, step_angle=15)
+
+    assert out.getvalue().replace("\n    (end ", " (end ") == \
+        Path(kicad_known_path).read_text()
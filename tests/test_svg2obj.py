@@ -11,12 +11,15 @@
 # You should have received a copy of the GNU General Public License
 # along with this program.  If not, see <http://www.gnu.org/licenses/>.
 
+import io
 import sys
 from pathlib import Path
+from itertools import groupby
 
 sys.path.append("../")
 
 from geotk.svg2obj import svg2obj
+from geotk.obj2svg import read_obj
 
 from conftest import get_test_case, api_compare, cli_compare
 
@@ -49,3 +52,33 @@ def test_cli(svg2obj_case_name):
         "--distance-step", "30",
         "--angle-step", "15",
     ])
+
+
+
+def test_api_weld(svg2obj_case_name):
+    """
+    Welded output has fewer vertices but describes the same faces,
+    apart from repeated consecutive vertices.
+    """
+
+    (svg_path, obj_known_path) = get_test_case(
+        "svg2obj", svg2obj_case_name)
+
+    face_coords = []
+    vertex_count = []
+    for weld in (None, 0):
+        out = io.StringIO()
+        with open(svg_path) as fp:
+            svg2obj(out, fp, step_dist=30, step_angle=15, weld=weld)
+
+        out.seek(0)
+        (vertices, faces, offsets) = read_obj(out)
+        face_coords.append([
+            [k for k, _group in groupby(
+                vertices[faces[start:end] - 1].tolist())]
+            for start, end in zip(offsets[:-1], offsets[1:])
+        ])
+        vertex_count.append(len(vertices))
+
+    assert face_coords[0] == face_coords[1]
+    assert vertex_count[1] < vertex_count[0]
@@ -0,0 +1,208 @@
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this program.  If not, see <http://www.gnu.org/licenses/>.
+
+import os
+import sys
+import json
+import shutil
+from concurrent.futures import ThreadPoolExecutor
+from pathlib import Path
+
+import pytest
+
+PROJECT_PATH = Path(__file__).parent.resolve()
+
+sys.path.append(PROJECT_PATH)
+
+from geotk.batch import ConfCache, BatchRunner, run_job, read_jobs, \
+    glob_jobs, serve_socket
+from geotk.svg2gcode import GcodeConf
+
+
+
+CASE_PATH = PROJECT_PATH / "cases" / "svg2gcode"
+
+CONF_PATH = CASE_PATH / "circle-path-mill.conf.json"
+
+CASE_NAMES = ("circle-path-mill", "curves", "single-path-depths")
+
+
+
+def known_gcode(name):
+    return (CASE_PATH / f"{name}.gcode").read_text()
+
+
+
+def test_conf_cache(tmp_path):
+    known = json.loads(CONF_PATH.read_text())
+    path = tmp_path / "conf.json"
+    path.write_text(json.dumps(known))
+
+    conf_cache = ConfCache()
+    conf = conf_cache.get(str(path))
+    assert conf == GcodeConf.from_dict(known)
+    assert conf_cache.get(str(path)) is conf
+
+    path.write_text(json.dumps({**known, "feedrate": 2}))
+    os.utime(path, ns=(0, 0))
+    assert conf_cache.get(str(path)).feedrate == 2
+
+    assert conf_cache.get(known) == conf
+
+
+
+def test_read_jobs():
+    jobs = list(read_jobs(['{"input": "a.svg"}', "", "[1]", "{"]))
+    assert jobs[0] == {"input": "a.svg"}
+    assert jobs[1].startswith("Line 3:")
+    assert jobs[2].startswith("Line 4:")
+
+
+
+def test_glob_jobs(tmp_path):
+    for name in ("b.svg", "a.svg", "c.txt", "d/a.svg", "d/e/a.svg"):
+        (tmp_path / name).parent.mkdir(parents=True, exist_ok=True)
+        (tmp_path / name).write_text("")
+
+    out = tmp_path / "out"
+    jobs = list(glob_jobs(
+        [str(tmp_path / "*.svg"), str(tmp_path / "**" / "a.svg")],
+        output_dir=str(out)))
+    assert jobs == [
+        {
+            "input": str(tmp_path / "a.svg"),
+            "output": str(out / "a.gcode"),
+        },
+        {
+            "input": str(tmp_path / "b.svg"),
+            "output": str(out / "b.gcode"),
+        },
+        {
+            "input": str(tmp_path / "d" / "a.svg"),
+            "output": str(out / "d" / "a.gcode"),
+        },
+        {
+            "input": str(tmp_path / "d" / "e" / "a.svg"),
+            "output": str(out / "d" / "e" / "a.gcode"),
+        },
+    ]
+    assert (out / "d" / "e").is_dir()
+
+    jobs = list(glob_jobs([str(tmp_path / "d" / "**" / "a.svg")]))
+    assert [v["output"] for v in jobs] == [
+        str(tmp_path / "d" / "a.gcode"),
+        str(tmp_path / "d" / "e" / "a.gcode"),
+    ]
+
+
+
+def test_glob_jobs_collision(tmp_path):
+    for name in ("d/a.svg", "e/a.svg"):
+        (tmp_path / name).parent.mkdir(parents=True, exist_ok=True)
+        (tmp_path / name).write_text("")
+
+    jobs = list(glob_jobs(
+        [str(tmp_path / "d" / "*.svg"), str(tmp_path / "e" / "*.svg")],
+        output_dir=str(tmp_path / "out")))
+    assert jobs[0]["input"] == str(tmp_path / "d" / "a.svg")
+    assert jobs[1].startswith(str(tmp_path / "e" / "a.svg") + ": Output")
+
+    result = run_job(jobs[1], ConfCache())
+    assert "is also written by" in result["error"]
+
+
+
+def test_run_job(tmp_path):
+    name = CASE_NAMES[0]
+    output = tmp_path / f"{name}.gcode"
+    job = {
+        "input": str(CASE_PATH / f"{name}.svg"),
+        "output": str(output),
+        "id": "a",
+    }
+
+    result = run_job(job, ConfCache(), defaults={"conf": str(CONF_PATH)})
+    assert result["error"] is None
+    assert result["id"] == "a"
+    assert output.read_text() == known_gcode(name)
+
+    del job["output"]
+    result = run_job({**job, "summary": True}, ConfCache(),
+                     defaults={"conf": str(CONF_PATH)})
+    assert result["gcode"] == known_gcode(name)
+    assert result["summary"]["cut-length"] > 0
+
+
+
+@pytest.mark.parametrize("job, error", [
+    ("Line 1: Bad", "Line 1: Bad"),
+    ({"input": "a.svg"}, "Job has no `conf`."),
+    ({"input": "a.svg", "conf": {}, "jobs": 2}, "Unknown job keys: jobs."),
+    ({"input": "a.svg", "conf": {}}, "'unit' is a required property"),
+    ({"input": "missing.svg", "conf": str(CONF_PATH)}, "No such file"),
+])
+def test_run_job_error(job, error, tmp_path):
+    result = run_job(job, ConfCache())
+    assert error in result["error"]
+    assert "seconds" in result
+
+
+
+@pytest.mark.parametrize("jobs", [None, 2])
+def test_batch_runner(jobs, tmp_path):
+    for name in CASE_NAMES:
+        shutil.copy(CASE_PATH / f"{name}.svg", tmp_path)
+
+    job_list = list(glob_jobs([str(tmp_path / "*.svg")]))
+    for job in job_list:
+        job["conf"] = str(CASE_PATH / (Path(job["input"]).stem + ".conf.json"))
+    job_list.insert(1, {"input": str(tmp_path / "missing.svg"), "conf": {}})
+
+    with BatchRunner(jobs=jobs) as runner:
+        result_list = list(runner.run_all(job_list))
+
+    assert [v["input"] for v in result_list] == \
+        [v["input"] for v in job_list]
+    assert [v["error"] is None for v in result_list] == \
+        [True, False, True, True]
+
+    for name in CASE_NAMES:
+        assert (tmp_path / f"{name}.gcode").read_text() == known_gcode(name)
+
+
+
+def test_batch_runner_threads(tmp_path):
+    job_list = [
+        {
+            "input": str(CASE_PATH / f"{name}.svg"),
+            "conf": str(CASE_PATH / f"{name}.conf.json"),
+        }
+        for name in CASE_NAMES * 3
+    ]
+
+    with BatchRunner() as runner, ThreadPoolExecutor(4) as executor:
+        result_list = list(executor.map(runner.run, job_list))
+
+    assert [v["gcode"] for v in result_list] == \
+        [known_gcode(name) for name in CASE_NAMES * 3]
+
+
+
+def test_serve_socket_not_socket(tmp_path):
+    path = tmp_path / "data.txt"
+    path.write_text("data")
+
+    with BatchRunner() as runner:
+        with pytest.raises(FileExistsError):
+            serve_socket(str(path), runner)
+    assert path.read_text() == "data"
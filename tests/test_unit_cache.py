@@ -0,0 +1,114 @@
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this program.  If not, see <http://www.gnu.org/licenses/>.
+
+import io
+import os
+import sys
+from pathlib import Path
+
+
+PROJECT_PATH = Path(__file__).parent.resolve()
+
+sys.path.append(PROJECT_PATH)
+
+from geotk.svg import iter_svg_paths, svg2pathset
+from geotk.cache import PathCache, content_digest
+from geotk.geometry import PathSet
+
+
+
+SVG_PATH = PROJECT_PATH / "cases" / "svg2kicad" / "linear-layers.svg"
+
+
+
+class NoSeek(io.StringIO):
+    def seekable(self):
+        return False
+
+
+
+def test_content_digest():
+    text = "<svg/>"
+    (digest, fp) = content_digest(io.StringIO(text))
+    assert fp.read() == text
+
+    (no_seek_digest, fp) = content_digest(NoSeek(text))
+    assert no_seek_digest == digest
+    assert fp.read() == text
+
+
+
+def test_iter_svg_paths_cache(tmp_path):
+    cache = PathCache(tmp_path)
+
+    with open(SVG_PATH) as fp:
+        known = list(iter_svg_paths(fp, step_angle=10))
+    with open(SVG_PATH) as fp:
+        stored = list(iter_svg_paths(fp, step_angle=10, cache=cache))
+    assert len(list(tmp_path.glob("*.npz"))) == 1
+
+    with open(SVG_PATH) as fp:
+        loaded = list(iter_svg_paths(fp, step_angle=10, cache=cache))
+    assert len(list(tmp_path.glob("*.npz"))) == 1
+
+    assert [v.tolist() for v in stored] == [v.tolist() for v in known]
+    assert [v.tolist() for v in loaded] == [v.tolist() for v in known]
+
+    # Other options are stored separately.
+    with open(SVG_PATH) as fp:
+        list(iter_svg_paths(fp, step_angle=20, cache=cache))
+    assert len(list(tmp_path.glob("*.npz"))) == 2
+
+
+
+def test_svg2pathset_cache(tmp_path):
+    cache = PathCache(tmp_path)
+
+    with open(SVG_PATH) as fp:
+        known = svg2pathset(fp, cache=cache)
+    with open(SVG_PATH) as fp:
+        result = svg2pathset(fp, cache=cache)
+
+    assert result.tolist() == known.tolist()
+    assert result.layer == known.layer
+    assert result.net == known.net
+    assert any(result.layer)
+
+
+
+def test_cache_evict(tmp_path):
+    pathset = PathSet.from_paths([[(0, 0), (1, 1)]], layer=("a", "b"))
+
+    cache = PathCache(tmp_path)
+    for key in ("a", "b", "c"):
+        cache.store(key, pathset)
+    size = os.path.getsize(tmp_path / "a.npz")
+
+    # Loading "a" makes "b" the least recently used.
+    for key, mtime in (("a", 1), ("b", 2), ("c", 3)):
+        os.utime(tmp_path / f"{key}.npz", (mtime, mtime))
+    assert cache.load("a").layer == [("a", "b")]
+
+    cache.max_size = 2 * size
+    cache.evict()
+    assert sorted(v.stem for v in tmp_path.glob("*.npz")) == ["a", "c"]
+
+
+
+def test_cache_unreadable(tmp_path, caplog):
+    cache = PathCache(tmp_path)
+    (tmp_path / "bad.npz").write_text("not a zip file")
+
+    assert cache.load("missing") is None
+    assert cache.load("bad") is None
+    assert "unreadable" in caplog.text
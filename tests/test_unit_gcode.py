@@ -0,0 +1,125 @@
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this program.  If not, see <http://www.gnu.org/licenses/>.
+
+import io
+import sys
+import math
+from pathlib import Path
+
+import pytest
+
+PROJECT_PATH = Path(__file__).parent.resolve()
+
+sys.path.append(PROJECT_PATH)
+
+from geotk.gcode import parse_gcode, analyze_gcode, move_times, \
+    ParseError, RAPID, LINEAR, ARC_CW, ARC_CCW
+
+
+
+GCODE = """\
+G90
+F600
+G0 Z5 (safe height)
+G0 X10 Y0
+G1 Z0
+G1 X20 ; along X
+G3 X20 Y0 I-5 J0
+G91
+G1 X0 Y10
+G2 X10 Y10 I10
+G0 Z5
+"""
+
+SUMMARY_CASES = [
+    {
+        "conf": None,
+        "summary": {
+            "cut-length": 5 + 10 + 10 * math.pi + 10 + 5 * math.pi,
+            "rapid-length": 5,
+            "plunges": 1,
+            "retracts": 1,
+            "time": (25 + 15 * math.pi) / 10 + 5 / 10,
+        },
+    },
+    {
+        "conf": {"rapid-feedrate": 6000, "z-feedrate": 60},
+        "summary": {
+            "cut-length": 5 + 10 + 10 * math.pi + 10 + 5 * math.pi,
+            "rapid-length": 5,
+            "plunges": 1,
+            "retracts": 1,
+            "time": 5 + (20 + 15 * math.pi) / 10 + 5,
+        },
+    },
+]
+
+
+
+def test_parse_gcode():
+    moves = parse_gcode(GCODE)
+
+    assert moves.kind.tolist() == [
+        RAPID, RAPID, LINEAR, LINEAR, ARC_CCW, LINEAR, ARC_CW, RAPID]
+    assert moves.points[-1].tolist() == [30, 20, 5]
+    assert moves.lengths() == pytest.approx([
+        0, 0, 5, 10, 10 * math.pi, 10, 5 * math.pi, 5])
+    assert moves.arc_sweep()[[4, 6]] == pytest.approx(
+        [2 * math.pi, -math.pi / 2])
+
+
+
+@pytest.mark.parametrize("text, known", [
+    ("G2 X1 J-8.3e-06 I2", [2, -8.3e-06]),
+    ("G2X1I1E2J.5E-1", [100, 0.05]),
+])
+def test_parse_gcode_exponent(text, known):
+    moves = parse_gcode("G0 X0 Y0\n" + text)
+    assert moves.center[-1].tolist() == pytest.approx(known)
+
+
+
+@pytest.mark.parametrize("text", [
+    "X10 Y10",
+    "G0 X0 Y0\nG2 X1 Y1",
+    "G1 X1.5.2",
+    "G1 X1 Y-",
+    "G1 X1 Y2 #3",
+])
+def test_parse_gcode_error(text):
+    with pytest.raises(ParseError):
+        parse_gcode(text)
+
+
+
+@pytest.mark.parametrize("case", SUMMARY_CASES)
+def test_analyze_gcode(case):
+    assert analyze_gcode(io.StringIO(GCODE), case["conf"]) == \
+        pytest.approx(case["summary"])
+
+
+
+def test_move_times():
+    length = [100, 1, 0]
+    speed = [10, 10, 10]
+
+    assert move_times(length, speed).tolist() == [10, 0.1, 0]
+
+    # 1 s to reach 10 / s over 5, then 9 s at full speed and 1 s to stop.
+    # The short move accelerates for half its length and then stops.
+    assert move_times(length, speed, 10) == pytest.approx(
+        [11, 2 * math.sqrt(0.1), 0])
+
+    # Entering at full speed saves the time to accelerate.
+    assert move_times(length[:1], speed[:1], 10, [10, 0]) == \
+        pytest.approx([10.5])
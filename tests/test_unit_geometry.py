@@ -0,0 +1,148 @@
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this program.  If not, see <http://www.gnu.org/licenses/>.
+
+import sys
+from pathlib import Path
+
+import numpy as np
+
+PROJECT_PATH = Path(__file__).parent.resolve()
+
+sys.path.append(PROJECT_PATH)
+
+from geotk.geometry import PathSet, PointIndex, simplify_paths, fit_arcs
+
+
+
+PATHS = [
+    [(0, 0), (1, 0), (1, 1), (0, 0)],
+    [],
+    [(2.5, 3), (4, 5)],
+]
+
+
+
+def test_pathset_from_paths():
+    pathset = PathSet.from_paths(PATHS, layer=[("a", "1"), (), ("b", )])
+
+    assert len(pathset) == 3
+    assert pathset.vertex_count == 6
+    assert pathset.offsets.tolist() == [0, 4, 4, 6]
+    assert pathset.lengths.tolist() == [4, 0, 2]
+    assert pathset.closed.tolist() == [True, False, False]
+    assert pathset.tolist() == [
+        [(float(x), float(y)) for (x, y) in path] for path in PATHS]
+    assert pathset.net == [None, None, None]
+
+
+
+def test_pathset_views():
+    pathset = PathSet.from_paths(PATHS)
+
+    path = pathset[-1]
+    assert np.shares_memory(path, pathset.coords)
+    assert path.tolist() == [[2.5, 3], [4, 5]]
+    assert [len(v) for v in pathset] == [4, 0, 2]
+
+
+
+def test_pathset_group_concatenate():
+    pathset = PathSet.concatenate([
+        PathSet.from_paths(PATHS[:2], layer=("F.Cu", ), net=1),
+        PathSet.from_paths(PATHS[2:], layer=("B.Cu", ), net=2),
+    ])
+
+    assert pathset.offsets.tolist() == [0, 4, 4, 6]
+    assert pathset.net == [1, 1, 2]
+
+    groups = pathset.group(lambda layer, net: (layer[0], net))
+    assert list(groups) == [("F.Cu", 1), ("B.Cu", 2)]
+    assert [len(v) for v in groups[("F.Cu", 1)]] == [4, 0]
+
+    selected = pathset.select(pathset.lengths > 0)
+    assert selected.net == [1, 2]
+    assert selected.tolist() == [pathset.tolist()[0], pathset.tolist()[2]]
+
+
+
+
+def test_point_index():
+    exact = PointIndex()
+    assert [exact.add(v) for v in [(0, 0), (0, 0.001), (0, 0)]] == [0, 1, 0]
+
+    welded = PointIndex(0.01)
+    assert [welded.add(v) for v in [
+        (0, 0), (0.005, 0), (1, 1), (0, 0.009), (0.011, 0), (1, 0.995),
+    ]] == [0, 0, 1, 0, 2, 1]
+    assert welded.points == [(0, 0), (1, 1), (0.011, 0)]
+
+
+
+
+def test_simplify_paths():
+    path_list = [
+        [(0, 0), (1, 0.05), (2, 0), (3, 1), (4, 0)],
+        [(0, 0), (1, 0), (1, 1), (0.5, 1.01), (0, 1), (0, 0)],
+        [(5, 5)],
+        [],
+    ]
+
+    assert [v.tolist() for v in simplify_paths(path_list, 0.1)] == [
+        [[0, 0], [2, 0], [3, 1], [4, 0]],
+        [[0, 0], [1, 0], [1, 1], [0, 1], [0, 0]],
+        [[5, 5]],
+        [],
+    ]
+    assert [len(v) for v in simplify_paths(path_list, 10)] == [2, 3, 1, 0]
+
+
+
+
+def test_fit_arcs():
+    angle = np.linspace(0, 2 * np.pi, 49)
+    circle = np.stack([30 + 10 * np.cos(angle), 30 + 10 * np.sin(angle)], 1)
+    circle[-1] = circle[0]
+
+    moves = fit_arcs(circle, 0.01)
+    assert len(moves) == 1
+    (end, center, clockwise) = moves[0]
+    assert end == 48
+    assert np.allclose(center, (30, 30))
+    assert not clockwise
+
+    moves = fit_arcs(circle[::-1], 0.01)
+    assert len(moves) == 1 and moves[0][2]
+
+    # A square has its corners on a circle, but is not an arc.
+    square = [(0, 0), (1, 0), (1, 1), (0, 1), (0, 0)]
+    assert fit_arcs(square, 0.01) == [
+        (1, None, None), (2, None, None), (3, None, None), (4, None, None)]
+
+    line = [(x, 0) for x in range(6)]
+    assert [v[0] for v in fit_arcs(line, 0.01)] == [1, 2, 3, 4, 5]
+
+    # Straight lead-in, then a half circle.
+    half = np.stack([np.cos(angle[:25]), np.sin(angle[:25])], 1)
+    moves = fit_arcs(np.concatenate([[(1, -2)], half]), 0.001)
+    assert [v[0] for v in moves] == [1, 25]
+    assert moves[0][1] is None
+    assert np.allclose(moves[1][1], (0, 0))
+
+    # Vertices off the circle still give arcs that end at the same
+    # distance from their center as they start.
+    noisy = circle[:25] + np.random.default_rng(0).uniform(
+        -0.004, 0.004, (25, 2))
+    moves = fit_arcs(noisy, 0.01)
+    assert len(moves) == 1 and moves[0][1] is not None
+    (start_radius, end_radius) = np.hypot(*(noisy[[0, 24]] - moves[0][1]).T)
+    assert abs(start_radius - end_radius) < 1e-9
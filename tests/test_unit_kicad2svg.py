@@ -0,0 +1,193 @@
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this program.  If not, see <http://www.gnu.org/licenses/>.
+
+import sys
+from pathlib import Path
+
+import pytest
+
+PROJECT_PATH = Path(__file__).parent.resolve()
+
+sys.path.append(PROJECT_PATH)
+
+from geotk.kicad2svg import parse_sexp, parse_trace, ParseError, \
+    load_board, join_segment_list
+
+
+
+SEXP_CASES = {
+    "segment": (
+        "(segment (start 25.4 -50.8) (end 76 0) (width 0.25) "
+        "(layer F.Cu) (net 1))",
+        ("segment", ("start", 25.4, -50.8), ("end", 76, 0),
+         ("width", 0.25), ("layer", "F.Cu"), ("net", 1)),
+    ),
+    "quoted": (
+        '(net 1 "Net (A) \\"x\\"") (net 0 "")',
+        (("net", 1, 'Net (A) "x"'), ("net", 0, "")),
+    ),
+    "multiline": (
+        "(kicad_pcb\n  (page A4)\n\t(general (nets 2)\n  )\n)\n",
+        ("kicad_pcb", ("page", "A4"), ("general", ("nets", 2))),
+    ),
+    "tokens": (
+        "(a 007 -1 .5 5. 1e3 -0)",
+        ("a", "007", -1, 0.5, 5.0, "1e3", "-0"),
+    ),
+}
+
+
+
+@pytest.mark.parametrize("case_name", SEXP_CASES)
+def test_parse_sexp(case_name):
+    (text, known) = SEXP_CASES[case_name]
+    assert parse_sexp(text) == known
+
+
+
+@pytest.mark.parametrize("text", ["(a (b 1)", "(a))", '(a "b)'])
+def test_parse_sexp_error(text):
+    with pytest.raises(ParseError):
+        parse_sexp(text)
+
+
+
+KICAD_PATH = PROJECT_PATH / "cases" / "kicad2svg" / "traces.kicad_pcb"
+
+
+
+def test_parse_sexp_document():
+    sexp = parse_sexp(KICAD_PATH.read_text())
+
+    assert sexp[0] == "kicad_pcb"
+    assert ("page", "A4") in sexp
+    assert ("net", 1, "Net-1") in sexp
+    assert len([v for v in sexp if v[0] == "segment"]) == 20
+
+
+
+def test_parse_trace():
+    assert parse_trace(
+        "  (segment (start 1.5 2) (end 3 4) (width 0.25) "
+        "(layer B.Cu) (net 0))"
+    ) == {
+        "start": (1.5, 2),
+        "end": (3, 4),
+        "width": 0.25,
+        "layer": "B.Cu",
+        "net": 0,
+    }
+
+
+
+def test_load_board():
+    text = KICAD_PATH.read_text()
+    board = load_board(text)
+
+    assert board.page_size() == (297, 210)
+    assert board.grid_origin == [50.8, 76.2]
+    assert len(board.segments) == 20
+    assert board.segments[0]["start"] == (25.4, 25.4)
+    assert sorted(board.layer_net_segment) == ["B.Cu", "F.Cu"]
+
+    for n in board.segment_nodes:
+        (name, start, end) = board.nodes[n]
+        assert name == "segment"
+        assert text[start:end].startswith("(segment ")
+        assert text[start:end].endswith(")")
+
+
+
+def test_load_board_multiline():
+    text = KICAD_PATH.read_text()
+    board = load_board(text)
+    multiline = load_board(
+        text.replace(" (end ", "\n    (end ").replace(") (segment", ")\n(segment"))
+
+    assert multiline.segments == board.segments
+    assert multiline.page_size() == board.page_size()
+    assert multiline.grid_origin == board.grid_origin
+
+
+
+def test_load_board_page_error():
+    with pytest.raises(ParseError):
+        load_board("(kicad_pcb (page B9))").page_size()
+    with pytest.raises(ParseError):
+        load_board("(kicad_pcb)").page_size()
+
+
+
+def segments(*point_list):
+    return [{"start": a, "end": b} for a, b in point_list]
+
+
+
+JOIN_CASES = {
+    "chain": (
+        segments(((1, 0), (2, 0)), ((0, 0), (1, 0)), ((2, 0), (3, 0))),
+        [[(0, 0), (1, 0), (2, 0), (3, 0)]],
+    ),
+    "chain-reversed": (
+        segments(((2, 0), (3, 0)), ((1, 0), (2, 0)), ((0, 0), (1, 0))),
+        [[(0, 0), (1, 0), (2, 0), (3, 0)]],
+    ),
+    "loop": (
+        segments(((0, 0), (1, 0)), ((1, 0), (1, 1)), ((1, 1), (0, 0))),
+        [[(0, 0), (1, 0), (1, 1), (0, 0)]],
+    ),
+    "branch": (
+        segments(((0, 0), (1, 0)), ((1, 0), (2, 0)), ((1, 0), (1, 1))),
+        [[(0, 0), (1, 0), (2, 0)], [(1, 0), (1, 1)]],
+    ),
+    "separate": (
+        segments(((0, 0), (1, 0)), ((5, 5), (6, 5))),
+        [[(0, 0), (1, 0)], [(5, 5), (6, 5)]],
+    ),
+}
+
+
+
+@pytest.mark.parametrize("case_name", JOIN_CASES)
+def test_join_segment_list(case_name):
+    (segment_list, known) = JOIN_CASES[case_name]
+    assert join_segment_list(segment_list) == known
+
+
+
+def test_join_segment_list_tolerance():
+    segment_list = segments(
+        ((0, 0), (1, 0)),
+        ((1.0004, 0.0003), (2, 0)),
+        ((2, 0), (2.0002, 0)),
+    )
+
+    assert join_segment_list(segment_list) == [
+        [(0, 0), (1, 0)],
+        [(1.0004, 0.0003), (2, 0), (2.0002, 0)],
+    ]
+    assert join_segment_list(segment_list, tolerance=0.001) == [
+        [(0, 0), (1, 0), (2, 0)],
+    ]
+
+
+
+def test_join_segment_list_large():
+    count = 50000
+    segment_list = segments(*[
+        ((i, 0), (i + 1, 0)) for i in reversed(range(count))])
+
+    path_list = join_segment_list(segment_list)
+
+    assert len(path_list) == 1
+    assert path_list[0] == [(i, 0) for i in range(count + 1)]
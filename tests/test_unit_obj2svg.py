@@ -0,0 +1,106 @@
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this program.  If not, see <http://www.gnu.org/licenses/>.
+
+import sys
+from pathlib import Path
+
+import pytest
+
+PROJECT_PATH = Path(__file__).parent.resolve()
+
+sys.path.append(PROJECT_PATH)
+
+from geotk.obj2svg import remove_backtracks, read_obj
+
+
+
+BACKTRACK_CASES = {
+    "empty": (
+        [],
+        [],
+    ),
+    "single": (
+        [[1, 2, 3, 1]],
+        [[1, 2, 3, 1]],
+    ),
+    "shared-edge": (
+        [[1, 2, 3, 1], [1, 3, 4, 1]],
+        [[1, 2, 3, 4, 1]],
+    ),
+    "backtrack": (
+        [[1, 3, 1, 4]],
+        [[1, 4]],
+    ),
+    "repeated-vertex": (
+        [[1, 1, 2, 2, 3]],
+        [[1, 2, 3]],
+    ),
+    "multiple": (
+        [[1, 2], [1, 2], [5, 6]],
+        [[1, 2], [1, 2], [5, 6]],
+    ),
+}
+
+
+
+@pytest.mark.parametrize("case_name", BACKTRACK_CASES)
+def test_remove_backtracks(case_name):
+    (face_list, known) = BACKTRACK_CASES[case_name]
+    assert remove_backtracks(face_list) == known
+
+
+
+def test_remove_backtracks_grid():
+    size = 100
+    face_list = []
+    for i in range(size):
+        for j in range(size):
+            a = i * (size + 1) + j + 1
+            b = a + 1
+            c = a + size + 1
+            d = c + 1
+            face_list += [[a, b, d, a], [a, d, c, a]]
+
+    poly_list = remove_backtracks(face_list)
+
+    assert len(poly_list) == 1
+    assert poly_list[0][0] == poly_list[0][-1]
+    assert len(poly_list[0]) == 4 * size + 1
+
+
+
+OBJ_TEXT = """\
+# Comment
+g group
+v 1 2 0
+v 3.5 -4e-1 0 # Trailing comment
+  v 5 \\
+    6 0
+vn 0 0 1
+f 1/1/1 2//1 3
+f 3 2
+"""
+
+
+
+@pytest.mark.parametrize("use_mmap", [False, True])
+def test_read_obj(tmp_path, use_mmap):
+    obj_path = tmp_path / "test.obj"
+    obj_path.write_text(OBJ_TEXT)
+
+    with open(obj_path) as obj_file:
+        (vertices, faces, offsets) = read_obj(obj_file, use_mmap=use_mmap)
+
+    assert vertices.tolist() == [[1, 2, 0], [3.5, -0.4, 0], [5, 6, 0]]
+    assert faces.tolist() == [1, 2, 3, 3, 2]
+    assert offsets.tolist() == [0, 3, 5]
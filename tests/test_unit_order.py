@@ -0,0 +1,98 @@
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this program.  If not, see <http://www.gnu.org/licenses/>.
+
+import sys
+from pathlib import Path
+
+import pytest
+import numpy as np
+
+PROJECT_PATH = Path(__file__).parent.resolve()
+
+sys.path.append(PROJECT_PATH)
+
+from geotk.order import order_paths, path_travel, enter_path
+
+
+
+def segment_set(path_list):
+    """Undirected segments of all paths, to compare drawn geometry."""
+
+    segments = []
+    for path in path_list:
+        path = np.asarray(path).tolist()
+        for a, b in zip(path, path[1:]):
+            segments.append(tuple(sorted([tuple(a), tuple(b)])))
+    return sorted(segments)
+
+
+
+def test_order_nearest():
+    path_list = [
+        [(10, 0), (11, 0)],
+        [(3, 0), (2, 0)],
+        [(5, 1), (6, 1), (6, 2), (5, 1)],
+    ]
+
+    (ordered, before, after) = order_paths(path_list, method="nearest")
+
+    assert [v.tolist() for v in ordered] == [
+        [[2, 0], [3, 0]],
+        [[5, 1], [6, 1], [6, 2], [5, 1]],
+        [[10, 0], [11, 0]],
+    ]
+    assert before == pytest.approx(path_travel(path_list))
+    assert after == pytest.approx(path_travel(ordered))
+    assert after < before
+
+
+
+def test_order_document():
+    path_list = [[(1, 1), (2, 2)], [], [(0, 0), (1, 0)]]
+    (ordered, before, after) = order_paths(path_list, method="document")
+    assert ordered == [path_list[0], path_list[2]]
+    assert before == after
+
+
+
+def test_enter_path():
+    closed = [(0, 0), (1, 0), (1, 1), (0, 0)]
+    assert enter_path(closed, 2).tolist() == [[1, 1], [0, 0], [1, 0], [1, 1]]
+    assert enter_path([(0, 0), (1, 0)], 1).tolist() == [[1, 0], [0, 0]]
+
+
+
+@pytest.mark.parametrize("method", ["nearest", "2opt"])
+def test_order_random(method):
+    rng = np.random.default_rng(0)
+    path_list = [
+        rng.uniform(0, 100, 2) + rng.uniform(-2, 2, (3, 2))
+        for _ in range(500)
+    ]
+
+    (ordered, before, after) = order_paths(path_list, method=method)
+
+    assert len(ordered) == len(path_list)
+    assert segment_set(ordered) == segment_set(path_list)
+    assert after < before / 4
+
+
+
+def test_order_2opt_improves():
+    rng = np.random.default_rng(1)
+    path_list = [rng.uniform(0, 100, (2, 2)) for _ in range(300)]
+
+    nearest = order_paths(path_list, method="nearest")[2]
+    two_opt = order_paths(path_list, method="2opt")[2]
+
+    assert two_opt <= nearest
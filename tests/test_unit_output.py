@@ -0,0 +1,80 @@
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this program.  If not, see <http://www.gnu.org/licenses/>.
+
+import io
+import sys
+from pathlib import Path
+
+import pytest
+import numpy as np
+
+PROJECT_PATH = Path(__file__).parent.resolve()
+
+sys.path.append(PROJECT_PATH)
+
+from geotk.common import format_float
+from geotk.output import ChunkWriter, format_floats, format_xy
+
+
+
+FLOAT_VALUES = [
+    0.0, -0.0, 5.0, -3.0, 1.5, -0.1, 1e-7, 123456789.123,
+    2.0 ** 53, 2.0 ** 53 + 2, 1e20, -1e300, 1 / 3,
+]
+
+
+
+def test_format_floats():
+    values = FLOAT_VALUES + np.random.default_rng(0).uniform(
+        -1e4, 1e4, 1000).tolist()
+
+    assert format_floats(values) == [format_float(v) for v in values]
+
+
+
+@pytest.mark.parametrize("precision, known", [
+    (0, ["0", "2", "-2", "100", "0"]),
+    (1, ["0", "1.5", "-2.2", "100", "0.1"]),
+    (3, ["0", "1.5", "-2.25", "100", "0.1"]),
+])
+def test_format_floats_precision(precision, known):
+    values = [-0.00001, 1.5, -2.25, 100, 0.1]
+    assert format_floats(values, precision=precision) == known
+
+
+
+@pytest.mark.parametrize("value, known", [
+    (-8.305621943094366e-06, "-0.000008305621943094366"),
+    (1e-7, "0.0000001"),
+    (1.5e16 + 0.5, "15000000000000000"),
+    (2.0 ** 53, "9007199254740992"),
+    (0.25, "0.25"),
+])
+def test_format_floats_fixed_point(value, known):
+    assert format_floats([value], fixed=True) == [known]
+
+
+
+def test_format_xy():
+    assert format_xy([(1, 2.5), (-0.0, 3)], sep=" Y") == ["1 Y2.5", "0 Y3"]
+    assert format_xy([]) == []
+
+
+
+def test_chunk_writer():
+    out = io.StringIO()
+    with ChunkWriter(out, chunk_size=3) as chunk:
+        for v in "abcdefg":
+            chunk.write(v)
+        assert out.getvalue() == "abcdef"
+    assert out.getvalue() == "abcdefg"
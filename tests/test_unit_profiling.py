@@ -0,0 +1,112 @@
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this program.  If not, see <http://www.gnu.org/licenses/>.
+
+import io
+import sys
+import json
+import time
+from pathlib import Path
+from argparse import Namespace
+
+import pytest
+
+
+PROJECT_PATH = Path(__file__).parent.resolve()
+
+sys.path.append(PROJECT_PATH)
+
+from geotk import profiling
+from geotk.svg import iter_svg_paths
+
+
+
+SVG_PATH = PROJECT_PATH / "cases" / "svg2kicad" / "linear-layers.svg"
+
+
+
+def test_disabled():
+    assert profiling.active() is None
+    assert profiling.stage("parse") is profiling.NULL_STAGE
+    with profiling.stage("parse"):
+        profiling.count("elements")
+        profiling.count_paths([[(0, 0), (1, 1)]])
+    assert profiling.active() is None
+
+
+
+def test_nested_stages():
+    out = io.StringIO()
+    with profiling.session("json", out=out) as profiler:
+        assert profiling.active() is profiler
+        with profiling.stage("outer"):
+            for _i in range(2):
+                with profiling.stage("inner"):
+                    time.sleep(0.01)
+        profiling.count_paths([[(0, 0), (1, 1), (2, 0)], [(0, 0)], []])
+    assert profiling.active() is None
+
+    results = json.loads(out.getvalue())
+    outer = results["stages"]["outer"]
+    inner = results["stages"]["inner"]
+    assert outer["calls"] == 1
+    assert inner["calls"] == 2
+    assert inner["self"] == pytest.approx(inner["total"])
+    assert outer["self"] == pytest.approx(outer["total"] - inner["total"])
+    assert results["counters"] == {
+        "paths": 3,
+        "segments": 2,
+        "vertices": 4,
+    }
+
+
+
+def test_svg_counters():
+    out = io.StringIO()
+    with profiling.session("text", out=out) as profiler:
+        with open(SVG_PATH) as fp:
+            paths = list(iter_svg_paths(fp))
+
+    counters = profiler.results()["counters"]
+    assert counters["paths"] == len(paths)
+    assert counters["vertices"] == sum(len(v) for v in paths)
+    assert set(profiler.stages) >= {"parse", "flatten", "transform"}
+    assert out.getvalue().startswith("Stage")
+
+
+
+@pytest.mark.parametrize("args, env, expected", [
+    (Namespace(profile=False, profile_format=None, cprofile=None),
+     None, None),
+    (Namespace(profile=True, profile_format=None, cprofile=None),
+     None, "Stage"),
+    (Namespace(profile=False, profile_format="json", cprofile=None),
+     None, "{"),
+    (Namespace(profile=False, profile_format=None, cprofile=None),
+     "json", "{"),
+    (Namespace(profile=False, profile_format=None, cprofile=None),
+     "0", None),
+])
+def test_session_from_args(args, env, expected, monkeypatch, capsys):
+    if env is None:
+        monkeypatch.delenv(profiling.PROFILE_ENV, raising=False)
+    else:
+        monkeypatch.setenv(profiling.PROFILE_ENV, env)
+
+    with profiling.session_from_args(args):
+        pass
+
+    err = capsys.readouterr().err
+    if expected is None:
+        assert err == ""
+    else:
+        assert err.startswith(expected)
@@ -11,24 +11,32 @@
 # You should have received a copy of the GNU General Public License
 # along with this program.  If not, see <http://www.gnu.org/licenses/>.
 
+import io
 import sys
+import time
 import shutil
 import logging
 from pathlib import Path
 from tempfile import NamedTemporaryFile
 
 import pytest
+import numpy as np
 
 PROJECT_PATH = Path(__file__).parent.resolve()
 
 sys.path.append(PROJECT_PATH)
 
-from geotk.svg import header, footer, linear_path_d, style, path_to_poly_list
+from geotk.svg import header, footer, linear_path_d, style, \
+    path_to_poly_list, svg2paths, iter_svg_paths, flatten_bezier, \
+    tokenize_path, bezier_powers, iterparse_paths, CHUNK_SIZE, JOBS_PENDING
+from geotk import profiling
 
 
 
 LOG = logging.getLogger("test_unit_svg")
 
+CASE_SVG_PATHS = sorted((PROJECT_PATH / "cases").glob("*/*.svg"))
+
 
 
 PATH_CASES = {
@@ -278,3 +286,165 @@ def test_poly_points(case_name):
                 result_item[0], result_item[1])
         LOG.error(path_text)
         raise
+
+
+
+TOKEN_CASES = {
+    "compact-decimal": (
+        "M1.5.5L-.5-1.5",
+        [("M", [1.5, 0.5]), ("L", [-0.5, -1.5])],
+    ),
+    "compact-exponent": (
+        "M1e-3-2l2E2,+3",
+        [("M", [0.001, -2]), ("l", [200, 3])],
+    ),
+    "implicit": (
+        "M 0 0 10 10 20,0z",
+        [("M", [0, 0, 10, 10, 20, 0]), ("z", [])],
+    ),
+    "arc-flags": (
+        "M0 10a10 10 0 0110-10",
+        [("M", [0, 10]), ("a", [10, 10, 0, 0, 1, 10, -10])],
+    ),
+}
+
+
+
+@pytest.mark.parametrize("case_name", TOKEN_CASES)
+def test_tokenize_path(case_name):
+    (text, known) = TOKEN_CASES[case_name]
+
+    result = [(command, values.tolist())
+              for command, values in tokenize_path(text)]
+
+    assert result == known
+
+
+
+def test_tokenize_path_error():
+    with pytest.raises(ValueError):
+        list(tokenize_path("M 0 0 L 1 # 2"))
+
+
+
+def test_bezier_powers():
+    t = np.arange(2 ** 17 + 1) / 2 ** 17
+    known = [
+        [pow(1 - v, 2) for v in t.tolist()],
+        [pow(1 - v, 3) for v in t.tolist()],
+        [pow(v, 2) for v in t.tolist()],
+        [pow(v, 3) for v in t.tolist()],
+    ]
+    assert [v.tolist() for v in bezier_powers(t)] == known
+
+
+
+def test_flatten_bezier_batch():
+    control_list = [
+        [(0, 5), (5, 10), (10, 0), (15, 5)],
+        [(0, 5), (0, 5), (15, 10), (15, 5)],
+        [(15, 5), (20, 10), (25, 0), (30, 5)],
+    ]
+    kwargs = {
+        "step_dist": 3,
+        "step_angle": 10,
+    }
+
+    (points, counts) = flatten_bezier(control_list, **kwargs)
+
+    assert counts.sum() == len(points)
+    offset = 0
+    for control, count in zip(control_list, counts):
+        (known, _counts) = flatten_bezier([control], **kwargs)
+        assert points[offset:offset + count].tolist() == known.tolist()
+        assert tuple(known[-1]) == control[-1]
+        offset += count
+
+
+
+@pytest.mark.parametrize("with_layers", [False, True])
+@pytest.mark.parametrize(
+    "svg_path", CASE_SVG_PATHS, ids=lambda v: f"{v.parent.name}-{v.stem}")
+def test_svg2paths_stream(svg_path, with_layers):
+    kwargs = {
+        "with_layers": with_layers,
+        "step_dist": 3,
+        "step_angle": 10,
+    }
+
+    with open(svg_path) as fp:
+        known = svg2paths(fp, **kwargs)
+    with open(svg_path) as fp:
+        result = svg2paths(fp, stream=True, **kwargs)
+
+    assert repr(result) == repr(known)
+
+
+
+@pytest.mark.parametrize(
+    "svg_path", CASE_SVG_PATHS, ids=lambda v: f"{v.parent.name}-{v.stem}")
+def test_svg2paths_simplify(svg_path):
+    kwargs = {
+        "step_dist": 1,
+        "step_angle": 5,
+    }
+
+    with open(svg_path) as fp:
+        full = svg2paths(fp, **kwargs)
+    with open(svg_path) as fp:
+        known = svg2paths(fp, simplify=0.1, **kwargs)
+    with open(svg_path) as fp:
+        result = svg2paths(fp, stream=True, simplify=0.1, **kwargs)
+
+    assert repr(result) == repr(known)
+    assert len(known) == len(full)
+    for path, full_path in zip(known, full):
+        assert len(path) <= len(full_path)
+        if len(full_path):
+            assert path[0].tolist() == full_path[0].tolist()
+            assert path[-1].tolist() == full_path[-1].tolist()
+
+
+
+@pytest.mark.parametrize(
+    "svg_path", CASE_SVG_PATHS, ids=lambda v: f"{v.parent.name}-{v.stem}")
+def test_iter_svg_paths(svg_path):
+    with open(svg_path) as fp:
+        known = svg2paths(fp, step_angle=10)
+    with open(svg_path) as fp:
+        result = iter_svg_paths(fp, step_angle=10)
+        assert not isinstance(result, list)
+        result = list(result)
+
+    assert repr(result) == repr(known)
+
+
+
+def test_iter_svg_paths_jobs():
+    for svg_path in CASE_SVG_PATHS:
+        with open(svg_path) as fp:
+            known = list(iter_svg_paths(fp, step_angle=10))
+        with open(svg_path) as fp:
+            result = list(iter_svg_paths(fp, step_angle=10, jobs=2))
+
+        assert repr(result) == repr(known)
+
+
+
+def test_iterparse_paths_jobs_pending():
+    """Elements are only read a few chunks ahead of the pool's results."""
+
+    jobs = 2
+    limit = (JOBS_PENDING * jobs + 1) * CHUNK_SIZE
+    svg_file = io.StringIO(
+        '<svg xmlns="http://www.w3.org/2000/svg">' +
+        '<path d="M 0,0 C 1,1 2,1 3,0"/>' * limit * 4 +
+        '</svg>')
+
+    with profiling.session("json", out=io.StringIO()) as profiler:
+        events = iterparse_paths(svg_file, step_angle=10, jobs=jobs)
+        next(events)
+        # Let the pool run ahead if it were reading the file itself.
+        time.sleep(0.2)
+        assert profiler.results()["counters"]["elements"] <= limit
+        assert len(list(events)) == limit * 4 - 1
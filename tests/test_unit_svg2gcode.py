@@ -0,0 +1,183 @@
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this program.  If not, see <http://www.gnu.org/licenses/>.
+
+import io
+import sys
+import logging
+from pathlib import Path
+
+import pytest
+
+PROJECT_PATH = Path(__file__).parent.resolve()
+
+sys.path.append(PROJECT_PATH)
+
+import jsonschema
+
+from geotk.svg2gcode import write_paths_gcode, depth_targets, plan_moves, \
+    GcodeConf, conf_validator
+from geotk.gcode import summarize_moves, analyze_gcode
+
+
+
+CONF = {
+    "unit": "mm",
+    "feedrate": 100,
+    "z-safety-direction": 1,
+    "z-safety-distance": 5,
+    "z-material-thickness": 2,
+    "z-layer-depth": 1,
+}
+
+PATHS = [
+    [(0, 0), (10, 0), (10, 10), (0, 0)],
+    [(20, 0), (30, 0)],
+    [(40, 0)],
+]
+
+LAYER_ORDER_CASES = [
+    {
+        "order": "layer-first",
+        "gcode": [
+            "G0 X0 Y0", "G1 Z1", "G1 X10 Y0", "G1 X10 Y10", "G1 X0 Y0",
+            "G1 Z7",
+            "G0 X20 Y0", "G1 Z1", "G1 X30 Y0", "G1 Z7",
+            "G0 X40 Y0", "G1 Z7",
+            "G0 X0 Y0", "G1 Z0", "G1 X10 Y0", "G1 X10 Y10", "G1 X0 Y0",
+            "G1 Z7",
+            "G0 X20 Y0", "G1 Z0", "G1 X30 Y0", "G1 Z7",
+            "G0 X40 Y0", "G1 Z7",
+        ],
+    },
+    {
+        "order": "path-first",
+        "gcode": [
+            "G0 X0 Y0",
+            "G1 Z1", "G1 X10 Y0", "G1 X10 Y10", "G1 X0 Y0",
+            "G1 Z0", "G1 X10 Y0", "G1 X10 Y10", "G1 X0 Y0",
+            "G1 Z7",
+            "G0 X20 Y0", "G1 Z1", "G1 X30 Y0", "G1 Z7",
+            "G0 X20 Y0", "G1 Z0", "G1 X30 Y0", "G1 Z7",
+            "G0 X40 Y0", "G1 Z7",
+        ],
+    },
+]
+
+
+
+def test_depth_targets():
+    assert depth_targets(CONF) == [1, 0]
+    assert depth_targets({**CONF, "z-layer-depth": 0.75}) == [1.25, 0.5, 0]
+    assert depth_targets({**CONF, "z-layer-depth": None}) == [2]
+
+
+
+@pytest.mark.parametrize("case", LAYER_ORDER_CASES)
+def test_layer_order(case):
+    out = io.StringIO()
+    write_paths_gcode(
+        out, iter(PATHS), {**CONF, "z-layer-order": case["order"]})
+
+    assert out.getvalue().splitlines() == [
+        "G90", "F100", "G0 Z7"] + case["gcode"]
+
+
+
+@pytest.mark.parametrize("case", LAYER_ORDER_CASES)
+def test_plan_moves(case):
+    conf = {**CONF, "z-layer-order": case["order"], "acceleration": 50}
+
+    out = io.StringIO()
+    write_paths_gcode(out, PATHS, conf)
+    out.seek(0)
+
+    assert summarize_moves(plan_moves(PATHS, conf), conf) == \
+        pytest.approx(analyze_gcode(out, conf))
+
+
+
+@pytest.mark.parametrize("level", [logging.WARNING, logging.INFO])
+@pytest.mark.parametrize("case", LAYER_ORDER_CASES)
+def test_summary(case, level, caplog):
+    """The estimate of both layer orders is only made for `INFO` logs."""
+
+    caplog.set_level(level, logger="svg2gcode")
+    conf = {**CONF, "z-layer-order": case["order"]}
+
+    out = io.StringIO()
+    summary = write_paths_gcode(out, iter(PATHS), conf, summary=True)
+
+    assert summary == pytest.approx(
+        summarize_moves(plan_moves(PATHS, conf), conf))
+    assert ("Estimated" in caplog.text) == (level == logging.INFO)
+    assert write_paths_gcode(io.StringIO(), PATHS, conf) is None
+
+
+
+def test_summary_layer_order():
+    conf = {**CONF, "rapid-feedrate": 1000}
+
+    # Cuts of 34.14 per pass, plunges and retracts of 6 and 7. Path-first
+    # steps the closed path down by 1 and retracts it once.
+    cut = 2 * (10 + 10 + 200 ** 0.5 + 10)
+    layer_first = summarize_moves(plan_moves(PATHS, conf), conf)
+    assert layer_first == pytest.approx({
+        "cut-length": cut + 2 * 2 * (6 + 7),
+        "rapid-length": 2 * (20 + 10) + 40,
+        "plunges": 4,
+        "retracts": 4,
+        "time": 60 * ((cut + 2 * 2 * (6 + 7)) / 100 +
+                      (2 * (20 + 10) + 40) / 1000),
+    })
+
+    conf["z-layer-order"] = "path-first"
+    path_first = summarize_moves(plan_moves(PATHS, conf), conf)
+    assert path_first == pytest.approx({
+        "cut-length": cut + 2 * 7 + 2 * (6 + 7),
+        "rapid-length": 20 + 10 + 10,
+        "plunges": 4,
+        "retracts": 3,
+        "time": 60 * ((cut + 2 * 7 + 2 * (6 + 7)) / 100 +
+                      (20 + 10 + 10) / 1000),
+    })
+
+
+
+def test_gcode_conf():
+    conf = GcodeConf.from_dict({
+        **CONF, "z-base-coordinate": -10, "x-offset": 3, "arcs": True})
+    assert conf.z_start == -8
+    assert conf.z_safe == -3
+    assert conf.z_list == (-9, -10)
+    assert (conf.x_offset, conf.y_offset) == (3, 0)
+    assert conf.arc_tolerance == 0.01
+    assert conf.layer_order == "layer-first"
+
+    with pytest.raises(AttributeError):
+        conf.feedrate = 1
+
+    with pytest.raises(jsonschema.ValidationError):
+        GcodeConf.from_dict({**CONF, "feedrate": 0})
+
+    assert conf_validator() is conf_validator()
+
+
+
+def test_gcode_conf_writer():
+    conf = GcodeConf.from_dict(CONF)
+    for order in ("layer-first", "path-first"):
+        known = io.StringIO()
+        write_paths_gcode(known, PATHS, {**CONF, "z-layer-order": order})
+        out = io.StringIO()
+        write_paths_gcode(out, PATHS, conf._replace(layer_order=order))
+        assert out.getvalue() == known.getvalue()